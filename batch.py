@@ -0,0 +1,208 @@
+"""
+Plan many configs in one go
+
+    $ python batch.py configs/ --jobs 8
+    $ python batch.py configs.jl --output-dir reports/nightly
+    $ cat configs.jl | python batch.py -
+
+A directory is scanned for `*.yaml` / `*.yml` files,
+otherwise each line of the (JSONL) input is a job like
+    {"name": "doctor_42", "config": <config in yaml string, or the same mapping in json>}
+
+Items, trade paths and the path return matrix are loaded once,
+the solving and report writing is spread over a process pool.
+A failed job is reported without stopping the others.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from items import ALL_ITEMS
+from planner import Planner, REPORT_PATH, get_static_path_matrix
+import renderers
+
+def _load_shared_data():
+    get_static_path_matrix()
+
+##########################
+# Jobs
+##########################
+def safe_name(name):
+    """
+    @return: `name` usable as a file name in the output directory, i.e. no path separators nor leading dots,
+             empty if nothing is left of it
+    """
+    return re.sub(r'[^\w\-.]+', '_', str(name)).lstrip('.')
+
+def iter_jobs(source):
+    """
+    Names are made safe as file names and unique, by suffixing the line number (or the extension) on a clash.
+    A line that is not a job is yielded as a failed job, named after its line number.
+
+    @yield: (name, config string, None), or (name, None, error message) for a malformed job
+    """
+    seen = set()
+
+    def unique(name, suffix):
+        while name in seen:
+            name = f"{name}_{suffix}"
+        seen.add(name)
+        return name
+
+    if os.path.isdir(source):
+        for filename in sorted(os.listdir(source)):
+            name, ext = os.path.splitext(filename)
+            if ext in ('.yaml', '.yml'):
+                with open(os.path.join(source, filename), 'r') as f:
+                    yield unique(safe_name(name) or 'job', ext[1:]), f.read(), None
+        return
+
+    f = sys.stdin if source == '-' else open(source, 'r')
+    try:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            default_name = f"job_{line_no}"
+            try:
+                job = json.loads(line)
+                name = safe_name(job.get('name', default_name)) or default_name
+                config = job['config']
+                if not isinstance(config, str):
+                    config = json.dumps(config, ensure_ascii=False) # json is valid yaml
+                error = None
+            except (ValueError, KeyError, TypeError, AttributeError) as e:
+                name, config = default_name, None
+                error = f"Line {line_no} is not a job: {type(e).__name__}: {e}"
+            yield unique(name, line_no), config, error
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+def run_job(name, config, output_dir, result_format=None):
+    """
+    @param: result_format: 'json' or 'npz' to also keep the plan for `renderers.py`, None not to
+    """
+    result = {'name': name, 'ok': False, 'error': None, 'output': None, 'result': None, 'days': None, 'timings': {}}
+    timings = result['timings']
+    beg = time.perf_counter()
+
+    def lap(phase):
+        nonlocal beg
+        now = time.perf_counter()
+        timings[phase] = round(now - beg, 6)
+        beg = now
+
+    try:
+        planner = Planner(ALL_ITEMS).set_to_config_string(config)
+        lap('parse')
+
+        planner.deduce()
+        lap('solve')
+
+        output = os.path.join(output_dir, f"{name}.txt")
+        planner.generate_report(output)
+        lap('report')
+
+        if result_format:
+            result['result'] = os.path.join(output_dir, f"{name}.{result_format}")
+            renderers.save(planner._scheme.to_dict(), result['result'])
+            lap('result')
+
+        # the `1d` consumed by all the recovery paths, as the report counts them
+        result['days'] = float(planner._scheme.get_consumed_items()[ALL_ITEMS.to_id('1d')])
+        result['output'] = output
+        result['ok'] = True
+    except Exception as e:
+        result['error'] = ''.join(traceback.format_exception_only(type(e), e)).strip()
+
+    timings['total'] = round(sum(timings.values()), 6)
+    return result
+
+def run_batch(jobs, output_dir, n_workers=None, on_result=None, result_format=None):
+    """
+    @param: jobs: iterable of (name, config string, error message), as from `iter_jobs`;
+                  the jobs with an error are reported failed without being run
+    @param: result_format: see `run_job`
+    @param: on_result: called with each result dict when its job finishes
+    @return: list of result dicts, in the order of `jobs`
+    """
+    os.makedirs(output_dir, exist_ok=True)
+
+    # load before forking, so that the workers share the data instead of loading their own
+    _load_shared_data()
+
+    def failed(name, error):
+        return {'name': name, 'ok': False, 'output': None, 'result': None, 'days': None, 'timings': {}, 'error': error}
+
+    jobs = list(jobs)
+    results = [None] * len(jobs)
+    with ProcessPoolExecutor(max_workers=n_workers, initializer=_load_shared_data) as executor:
+        futures = {}
+        for ind, (name, config, error) in enumerate(jobs):
+            if error is None:
+                futures[executor.submit(run_job, name, config, output_dir, result_format)] = ind
+            else:
+                results[ind] = failed(name, error)
+                if on_result:
+                    on_result(results[ind])
+
+        for future in as_completed(futures):
+            ind = futures[future]
+            try:
+                result = future.result()
+            except Exception as e: # e.g. a worker got killed
+                result = failed(jobs[ind][0], ''.join(traceback.format_exception_only(type(e), e)).strip())
+            results[ind] = result
+            if on_result:
+                on_result(result)
+
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Plan many configs with a process pool")
+    parser.add_argument('source', help="a directory of yaml configs, a JSONL file, or - for JSONL from stdin")
+    parser.add_argument('-j', '--jobs', type=int, default=None, help="number of worker processes, defaults to #cpu")
+    parser.add_argument(
+        '-o', '--output-dir',
+        default=os.path.join(REPORT_PATH, f"batch_{time.strftime('%Y%m%d%H%M%S')}"),
+        help="where the reports and summary.jl go",
+    )
+    parser.add_argument(
+        '--save-result', choices=['json', 'npz'],
+        help="also keep each plan in this format, to be rendered by renderers.py without solving again",
+    )
+    args = parser.parse_args(argv)
+
+    beg = time.perf_counter()
+
+    def on_result(result):
+        if result['ok']:
+            t = result['timings']
+            print(
+                f"[ OK ] {result['name']}: {result['days']:.2f} 天"
+                f" (parse {t['parse']:.3f}s, solve {t['solve']:.3f}s, report {t['report']:.3f}s)"
+            )
+        else:
+            print(f"[FAIL] {result['name']}: {result['error']}")
+
+    results = run_batch(iter_jobs(args.source), args.output_dir, args.jobs, on_result, args.save_result)
+
+    summary_path = os.path.join(args.output_dir, 'summary.jl')
+    with open(summary_path, 'w') as f:
+        for result in results:
+            f.write(json.dumps(result, ensure_ascii=False) + '\n')
+
+    n_failed = sum(not result['ok'] for result in results)
+    print(
+        f"{len(results)} jobs, {n_failed} failed, {time.perf_counter() - beg:.2f}s in total."
+        f" Summary: {summary_path}"
+    )
+    return 1 if n_failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,238 @@
+"""
+Times the hot spots of planning, on the shipped data and on generated larger scenarios
+
+    $ python bench.py
+    $ python bench.py --scenario shipped --scenario large --repeat 10 -o before.json
+    $ python bench.py --compare before.json
+
+Scenarios (`SCENARIOS`):
+* shipped: `config.example.yaml` over the crawler results in the repo
+* large / huge: the same, plus generated stages (copies of real ones with perturbed drop rates,
+  some capped per day) up to `n_paths` paths, and random upgrade plans of `n_officials` officials
+
+Each benchmark is run `--repeat` times after a warm up, the results (in ms) are written as JSON,
+which `--compare` reads back to print the ratios against an earlier run.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import sys
+import time
+
+import numpy as np
+import scipy
+
+import items
+from items import ALL_ITEMS, TradePath
+from officials import Officials
+from planner import Plan, Planner, REPORT_PATH
+from startup_budget import run_with_importtime
+from util import ROOT
+
+BENCH_VERSION = 1
+CONFIG_PATH = os.path.join(ROOT, 'config.example.yaml')
+
+SCENARIOS = {
+    'shipped': {'n_paths': 0, 'n_officials': 0},
+    'large': {'n_paths': 2000, 'n_officials': 200},
+    'huge': {'n_paths': 5000, 'n_officials': 500},
+}
+
+##########################
+# Scenarios
+##########################
+def generate_stages(rng, n):
+    """
+    @return: n stage paths, each a copy of a real one with its drop rates scaled by ~N(1, 0.3),
+             every 5th capped per day
+    """
+    stages = [path for path in items.TRADE_PATHS if '理智' in path.src]
+    paths = []
+    for ind in range(n):
+        base = stages[rng.integers(len(stages))]
+        dst = {item: cnt * rng.lognormal(0, 0.3) for item, cnt in base.dst.items()}
+        max_cnt_per_day = rng.uniform(1, 20) if ind % 5 == 0 else None
+        paths.append(TradePath(base.src, dst, f"SYN-{ind}", max_cnt_per_day=max_cnt_per_day))
+    return paths
+
+def generate_plans(rng, n):
+    """
+    @return: n upgrade plans of random officials, from scratch to a random reachable state
+    """
+    # the calculator needs at least one skill to look up the shared levels in
+    officials = sorted((o for o in Officials.get_all_officials() if o.n_skills), key=lambda o: o.name)
+    plans = []
+    while len(plans) < n:
+        official = officials[rng.integers(len(officials))]
+        max_elite = {3: 1, 4: 2, 5: 2, 6: 2}.get(official.stars, 0)
+        elite = int(rng.integers(max_elite + 1))
+        try:
+            level = int(rng.integers(1, official.get_level_cap(elite_level=elite, stars=official.stars) + 1))
+        except KeyError:
+            continue
+        skill_cap = 10 if elite == 2 else 7 if elite == 1 else 4
+        skills = [int(rng.integers(1, min(cap, skill_cap) + 1)) for cap in official.get_max_skill_levels()]
+
+        plan = Plan(
+            official.name,
+            {'elite_level': 0, 'level': 1, 'skill_level': 1},
+            {'elite_level': elite, 'level': level, 'skill_level': skills},
+        )
+        try:
+            plan.validate()
+        except ValueError:
+            continue
+        plans.append(plan)
+    return plans
+
+def build_planner(n_paths=0, n_officials=0, seed=0):
+    """
+    @param: n_paths: total number of paths, generated stages are added up to it
+    @param: n_officials: number of generated upgrade plans, on top of those of the config
+    """
+    rng = np.random.default_rng(seed)
+    planner = Planner(ALL_ITEMS).set_to_config(CONFIG_PATH)
+    planner.config['result_cache'] = False
+    if n_paths > planner.n_paths:
+        planner.add_trade_paths(*generate_stages(rng, n_paths - planner.n_paths))
+    if n_officials:
+        planner.add_plan(*generate_plans(rng, n_officials))
+        # hundreds of officials take longer than MAX_PLAN_DAYS
+        planner.cur_items['1d'] = 1e6
+    return planner
+
+##########################
+# Benchmarks
+##########################
+def time_it(func, repeat):
+    """
+    @return: timings in ms over `repeat` runs, after a warm up run
+    """
+    func()
+    laps = []
+    for _ in range(repeat):
+        beg = time.perf_counter()
+        func()
+        laps.append((time.perf_counter() - beg) * 1000)
+    return {
+        'min_ms': round(min(laps), 4),
+        'median_ms': round(float(np.median(laps)), 4),
+        'mean_ms': round(float(np.mean(laps)), 4),
+        'repeat': repeat,
+    }
+
+def bench_import(repeat):
+    """
+    `import planner` in a fresh interpreter, as measured by `python -X importtime`
+    """
+    run_with_importtime(['-c', 'import planner']) # warm up the bytecode
+    laps = [
+        run_with_importtime(['-c', 'import planner'])[2].get('planner', np.nan) / 1000
+        for _ in range(repeat)
+    ]
+    return {
+        'min_ms': round(min(laps), 4),
+        'median_ms': round(float(np.median(laps)), 4),
+        'mean_ms': round(float(np.mean(laps)), 4),
+        'repeat': repeat,
+    }
+
+def bench_scenario(planner, repeat):
+    results = {}
+
+    results['get_path_return_matrix'] = time_it(planner.get_path_return_matrix, repeat)
+    results['get_path_limit_matrixes'] = time_it(planner.get_path_limit_matrixes, repeat)
+
+    args = planner.get_linprog_args()
+    args.pop('path_return')
+    results['linprog'] = time_it(lambda: planner._linear_programming(**args), repeat)
+
+    def calculate():
+        for plan in planner.plans:
+            plan.get_required_vec()
+    results['official_upgrade_items_calculator'] = time_it(calculate, repeat)
+
+    planner.deduce()
+    scheme = planner._scheme
+    if scheme.path_cnt is None:
+        raise ValueError("The plan of the scenario is infeasible")
+
+    def print_report():
+        scheme._file = io.StringIO()
+        scheme.print_report()
+    results['print_report'] = time_it(print_report, repeat)
+    return results
+
+def run(scenarios, repeat, seed=0):
+    report = {
+        'version': BENCH_VERSION,
+        'meta': {
+            'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'scipy': scipy.__version__,
+            'platform': platform.platform(),
+            'seed': seed,
+        },
+        'import': bench_import(repeat),
+        'scenarios': {},
+    }
+    for name in scenarios:
+        planner = build_planner(seed=seed, **SCENARIOS[name])
+        report['scenarios'][name] = {
+            'n_paths': planner.n_paths,
+            'n_items': planner.n_items,
+            'n_plans': len(planner.plans),
+            'results': bench_scenario(planner, repeat),
+        }
+    return report
+
+def iter_rows(report):
+    """
+    @yield: (name of the benchmark, timings)
+    """
+    yield 'import planner', report['import']
+    for scenario, data in report['scenarios'].items():
+        for bench, timings in data['results'].items():
+            yield f"{scenario}/{bench}", timings
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the planner")
+    parser.add_argument(
+        '--scenario', action='append', choices=list(SCENARIOS),
+        help="can be given several times, defaults to all of them",
+    )
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0, help="of the generated scenarios")
+    parser.add_argument('-o', '--output', default=os.path.join(REPORT_PATH, f"bench_{time.strftime('%Y%m%d%H%M%S')}.json"))
+    parser.add_argument('--compare', help="an earlier result to compare with")
+    args = parser.parse_args(argv)
+    if args.repeat <= 0:
+        parser.error("--repeat should be positive")
+
+    base = None
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            base = dict(iter_rows(json.load(f)))
+
+    report = run(args.scenario or list(SCENARIOS), args.repeat, args.seed)
+
+    for name, data in report['scenarios'].items():
+        print(f"{name}: {data['n_paths']} paths, {data['n_items']} items, {data['n_plans']} plans")
+    print(f"{'benchmark':<48} {'min':>10} {'median':>10}" + (f" {'base':>10} {'ratio':>7}" if base else ''))
+    for name, timings in iter_rows(report):
+        line = f"{name:<48} {timings['min_ms']:10.3f} {timings['median_ms']:10.3f}"
+        if base is not None and name in base:
+            line += f" {base[name]['median_ms']:10.3f} {timings['median_ms'] / base[name]['median_ms']:7.2f}"
+        print(line)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results: {args.output}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
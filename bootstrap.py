@@ -0,0 +1,255 @@
+"""
+Confidence intervals of a plan, from how many samples each drop rate rests on
+
+    $ python bootstrap.py config.yaml
+    $ python bootstrap.py config.yaml -n 500 --jobs 8 --seed 42 --level 0.9
+
+Each drop rate of `droprates.jl` is quantity / times, estimated from `times` runs.
+A replicate redraws every rate from its observed counts
+(binomially if the item drops at most once a run on average, Poisson otherwise, as in `simulation.py`),
+and plans again with the redrawn rates.
+A stage whose run count swings widely over the replicates, or is used in some of them only,
+makes the plan fragile: it rests on a rate that is not known well enough.
+
+The LP is assembled once, a replicate only rewrites the drop entries of `A_ub`,
+and starts from the optimal basis of the previous replicate of the same worker.
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from items import ALL_ITEMS
+from planner import Planner
+from session import BasisError, WarmBasis
+from simulation import get_stage_drop_stats
+
+CHUNK_SIZE = 25
+
+class BootstrapResult:
+    def __init__(self, base, replicates, stage_tags, ap_cost, n_cut_short=0):
+        self.base = base                # x of the plan with the point estimates
+        self.replicates = replicates    # (N, P) x of each replicate, nan for infeasible or cut short ones
+        self.n_cut_short = n_cut_short  # replicates not solved to optimality within `求解时限`
+        self.stage_tags = stage_tags    # {index of the stage path: tag}
+        self.ap_cost = ap_cost          # (P,) 理智 per run of each path, 0 for the others
+
+    @property
+    def n_replicates(self):
+        return len(self.replicates)
+
+    @property
+    def n_infeasible(self):
+        return int(np.isnan(self.replicates[:, 0]).sum()) - self.n_cut_short
+
+    def get_total_ap(self):
+        """
+        @return: (base, (N,) of the replicates) 理智 spent on the stages
+        """
+        return self.base @ self.ap_cost, self.replicates @ self.ap_cost
+
+    def get_stage_runs(self):
+        """
+        Paths of the same stage (e.g. GT-6 of both the event and the rerun) are summed,
+        as the solver may split the runs between them arbitrarily
+
+        @return: {tag: (base, (N,) of the replicates)}
+        """
+        stages = {}
+        for ind, tag in self.stage_tags.items():
+            base, runs = stages.get(tag, (0.0, 0.0))
+            stages[tag] = (base + self.base[ind], runs + self.replicates[:, ind])
+        return stages
+
+def get_interval(values, level):
+    """
+    @return: (low, high) percentile interval of the finite `values` at confidence `level`
+    """
+    values = values[np.isfinite(values)]
+    if not len(values):
+        return np.nan, np.nan
+    alpha = (1 - level) / 2 * 100
+    low, high = np.percentile(values, [alpha, 100 - alpha])
+    return low, high
+
+##########################
+# Replicates
+##########################
+def build_model(planner: Planner):
+    """
+    The LP of the planner, with the positions of the drop entries in `A_ub.data`,
+    in plain arrays small enough to be sent to the workers
+    """
+    args = planner.get_linprog_args()
+    args.pop('path_return')
+    A = args['A_ub'].tocsc()
+    A.sort_indices()
+    args['A_ub'] = A
+
+    all_items = planner._all_items
+    stages = get_stage_drop_stats(planner._all_paths)
+
+    data_ind, quantity, times = [], [], []
+    ap_cost = np.zeros(A.shape[1])
+    for col, stats in stages.items():
+        ap_cost[col] = stats['ap_cost']
+        indices = A.indices[A.indptr[col]:A.indptr[col + 1]]
+        for item, (q, t) in stats['drops'].items():
+            if item not in all_items:
+                continue
+            pos = np.searchsorted(indices, all_items.to_id(item))
+            assert pos < len(indices) and indices[pos] == all_items.to_id(item)
+            data_ind.append(A.indptr[col] + pos)
+            quantity.append(q)
+            times.append(t)
+
+    return {
+        'args': args,
+        'data_ind': np.array(data_ind, dtype=np.int64),
+        'quantity': np.array(quantity, dtype=np.int64),
+        'times': np.array(times, dtype=np.int64),
+        'stage_tags': {col: planner._all_paths[col].tag for col in stages},
+        'ap_cost': ap_cost,
+        'solver': planner.get_solver(), # of the config, in the workers too
+    }
+
+def draw_rates(rng, quantity, times):
+    """
+    @return: drop rates per run, redrawn from the observed counts
+    """
+    coin = quantity <= times
+    counts = np.empty(len(quantity))
+    counts[coin] = rng.binomial(times[coin], quantity[coin] / times[coin])
+    counts[~coin] = rng.poisson(quantity[~coin])
+    return counts / times
+
+def _solve(solver, args, basis):
+    """
+    @param: solver: `solvers.Solver` of the planner
+    @return: (x or None, basis for the next replicate, whether the solver was cut short by its time limit);
+             a point found before the limit is not optimal, so neither used nor made a basis of
+    """
+    if basis is not None:
+        try:
+            new_basis = basis.refactor(args['A_ub'])
+            x = new_basis.resolve(args['b_ub'])
+        except BasisError:
+            x = None
+        if x is not None:
+            return x, new_basis, False
+
+    ret = solver.solve(**args)
+    if not ret.optimal:
+        return None, basis, ret.limited
+    x = ret.x
+    try:
+        basis = WarmBasis(x=x, **args)
+    except BasisError:
+        pass
+    return x, basis, False
+
+def run_chunk(model, seed, n_replicates):
+    """
+    @return: ((n_replicates, P) x of each replicate, nan for infeasible or cut short ones,
+              number of the ones cut short by the time limit)
+    """
+    rng = np.random.default_rng(seed)
+    A = model['args']['A_ub'].copy()
+    args = dict(model['args'], A_ub=A)
+
+    xs = np.full((n_replicates, A.shape[1]), np.nan)
+    basis = None
+    n_cut_short = 0
+    for ind in range(n_replicates):
+        # drops are negative entries of A_ub
+        A.data[model['data_ind']] = -draw_rates(rng, model['quantity'], model['times'])
+        x, basis, cut_short = _solve(model['solver'], args, basis)
+        n_cut_short += cut_short
+        if x is not None:
+            xs[ind] = x
+    return xs, n_cut_short
+
+def bootstrap(planner: Planner, n_replicates=200, seed=None, n_workers=None):
+    """
+    @param: seed: int or None (random), the same seed gives the same result whatever `n_workers` is
+    @param: n_workers: number of worker processes, defaults to #cpu; 1 runs in this process
+    @return: BootstrapResult
+    @raise: ValueError if the plan with the point estimates is infeasible
+    """
+    model = build_model(planner)
+    base_x = planner._linear_programming(**model['args'])
+    if base_x is None and planner.config['solver_time_limit'] is not None: # as `Planner.deduce`
+        base_x = planner._linear_programming(limited=False, **model['args'])
+    if base_x is None:
+        raise ValueError("The plan is infeasible")
+
+    sizes = [CHUNK_SIZE] * (n_replicates // CHUNK_SIZE)
+    if n_replicates % CHUNK_SIZE:
+        sizes.append(n_replicates % CHUNK_SIZE)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+
+    n_workers = min(n_workers or os.cpu_count() or 1, len(sizes))
+    if n_workers <= 1:
+        chunks = [run_chunk(model, s, size) for s, size in zip(seeds, sizes)]
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            chunks = list(executor.map(run_chunk, [model] * len(sizes), seeds, sizes))
+
+    return BootstrapResult(
+        base_x, np.concatenate([xs for xs, _ in chunks]), model['stage_tags'], model['ap_cost'],
+        sum(n for _, n in chunks),
+    )
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Confidence intervals of the plan of a config, by resampling the drop rates")
+    parser.add_argument('config', nargs='?', default='config.yaml')
+    parser.add_argument('-n', '--replicates', type=int, default=200, help="number of resampled plans")
+    parser.add_argument('-j', '--jobs', type=int, default=None, help="number of worker processes, defaults to #cpu")
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--level', type=float, default=0.95, help="confidence level of the intervals")
+    args = parser.parse_args(argv)
+    if args.replicates <= 0:
+        parser.error("--replicates should be positive")
+    if not 0 < args.level < 1:
+        parser.error("--level should be between 0 and 1")
+
+    planner = Planner(ALL_ITEMS).set_to_config(args.config)
+
+    beg = time.perf_counter()
+    try:
+        result = bootstrap(planner, args.replicates, args.seed, args.jobs)
+    except ValueError as e:
+        print(f"{args.config}: {e}")
+        return 1
+    elapsed = time.perf_counter() - beg
+
+    level = f"{args.level * 100:g}%"
+    print(f"重采样掉率 {result.n_replicates} 次，耗时 {elapsed:.2f}s")
+    if result.n_infeasible:
+        print(f" 其中 {result.n_infeasible} 次无解，未计入")
+    if result.n_cut_short:
+        print(f" 其中 {result.n_cut_short} 次在求解时限内未解出最优，未计入")
+
+    base_ap, ap = result.get_total_ap()
+    low, high = get_interval(ap, args.level)
+    print(f" 关卡消耗理智: {base_ap:.0f}，{level} 置信区间 [{low:.0f}, {high:.0f}]")
+
+    print(f" 关卡次数 (当前掉率 / {level} 置信区间 / 被使用的比例):")
+    stages = result.get_stage_runs()
+    feasible = np.isfinite(result.replicates[:, 0])
+    rows = []
+    for tag, (base, runs) in stages.items():
+        used = np.mean(runs[feasible] > 1e-6) if feasible.any() else 0.0
+        if base > 1e-6 or used > 0:
+            rows.append((tag, base, get_interval(runs, args.level), used))
+
+    for tag, base, (low, high), used in sorted(rows, key=lambda row: -row[1]):
+        fragile = " 不稳定" if 0.05 < used < 0.95 else ""
+        print(f"  {tag:>8}: {base:8.2f}  [{low:8.2f}, {high:8.2f}]  {used * 100:5.1f}%{fragile}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,135 @@
+"""
+Conditional, retried fetching shared by the crawlers
+
+* `ResponseCache`: the last answer of each url, to request it again with If-None-Match / If-Modified-Since
+* `fetch`: a GET retried with exponential backoff on connection errors, 429 and 5xx
+* `write_atomic` / `swap_link`: files and the links to the latest results are replaced, never rewritten in place
+"""
+import json
+import os
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+
+MAX_RETRIES = 4
+BACKOFF = 0.5 # seconds before the first retry, doubled on each
+TIMEOUT = 30
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+class CrawlError(Exception):
+    pass
+
+class ResponseCache:
+    """
+    The last answer of each url: validators in `index.json`, bodies in one file per url
+    """
+    INDEX = 'index.json'
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock() # of `index`, which the threads of a crawler update
+        try:
+            with open(os.path.join(directory, self.INDEX), 'r') as f:
+                self.index = json.load(f)
+        except (OSError, ValueError):
+            self.index = {}
+
+    def get_validators(self, url):
+        """
+        @return: headers of a conditional request for `url`
+        """
+        entry = self.index.get(url)
+        if entry is None or not os.path.exists(os.path.join(self.directory, entry['file'])):
+            return {}
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def get_body(self, url):
+        with open(os.path.join(self.directory, self.index[url]['file']), 'rb') as f:
+            return f.read()
+
+    def put(self, url, filename, body, etag, last_modified):
+        """
+        @return: whether the body differs from the kept one, only then is it rewritten
+        """
+        entry = self.index.get(url)
+        changed = True
+        if entry is not None and entry['file'] == filename:
+            try:
+                changed = self.get_body(url) != body
+            except OSError:
+                pass
+        if changed:
+            write_atomic(os.path.join(self.directory, filename), body)
+        with self._lock:
+            self.index[url] = {'file': filename, 'etag': etag, 'last_modified': last_modified}
+        return changed
+
+    def forget(self, url):
+        with self._lock:
+            entry = self.index.pop(url, None)
+        if entry is not None:
+            try:
+                os.remove(os.path.join(self.directory, entry['file']))
+            except OSError:
+                pass
+
+    def save(self):
+        with self._lock:
+            data = json.dumps(self.index, ensure_ascii=False, indent=1, sort_keys=True)
+        write_atomic(os.path.join(self.directory, self.INDEX), data.encode('utf-8'))
+
+def write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def swap_link(directory, link, filename):
+    """
+    Points `directory/link` to `filename` atomically, relative so that the repo can be moved
+    """
+    tmp_link = os.path.join(directory, f"{link}.{os.getpid()}.tmp")
+    os.symlink(filename, tmp_link)
+    os.replace(tmp_link, os.path.join(directory, link))
+
+def get_retry_delay(attempt, retry_after=None):
+    """
+    @return: seconds to wait before the `attempt`-th retry (from 0), the Retry-After of the server if any
+    """
+    if retry_after is not None:
+        try:
+            return min(float(retry_after), BACKOFF * 2 ** MAX_RETRIES)
+        except ValueError:
+            pass
+    return BACKOFF * 2 ** attempt * random.uniform(0.5, 1.5)
+
+def fetch(url, headers=None):
+    """
+    @return: (status, body or None if 304, response headers), retrying transient failures
+    """
+    request = urllib.request.Request(url, headers=headers or {})
+    for attempt in range(MAX_RETRIES + 1):
+        retry_after = None
+        try:
+            with urllib.request.urlopen(request, timeout=TIMEOUT) as response:
+                return response.status, response.read(), response.headers
+        except urllib.error.HTTPError as e:
+            if e.code == 304:
+                return 304, None, e.headers
+            if e.code not in RETRY_STATUS or attempt == MAX_RETRIES:
+                raise CrawlError(f"{url}: HTTP {e.code}") from None
+            retry_after = e.headers.get('Retry-After')
+        except (urllib.error.URLError, OSError) as e:
+            if attempt == MAX_RETRIES:
+                raise CrawlError(f"{url}: {e}") from None
+        time.sleep(get_retry_delay(attempt, retry_after))
@@ -0,0 +1,241 @@
+"""
+A local stand-in of the penguin-stats API, serving the stage results of a drop rate dataset
+
+    $ python mock_penguin_stats.py --port 8001
+    $ python penguin_statistic.py --base-url http://127.0.0.1:8001 --results-dir /tmp/droprates
+
+    $ python mock_penguin_stats.py --benchmark --latency 0.05 --mutate 5
+
+Serves the endpoints `penguin_statistic.py` crawls:
+* GET /PenguinStats/api/chapter/<chapter>/stage: {'stages': [stage]}, grouped by `stage.chapter`
+* GET /PenguinStats/api/result/stage/<id>/normal: the line of the stage in the dataset
+with an ETag and a Last-Modified, answering 304 to a matching If-None-Match / If-Modified-Since.
+`--latency` delays every answer, `--fail-rate` answers some with 503, to exercise the retries.
+
+`--benchmark` times a cold crawl, a refresh with nothing changed, and one with `--mutate` stages changed,
+against the mock in this process, into a temporary results directory.
+"""
+import argparse
+import email.utils
+import hashlib
+import json
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import penguin_statistic
+
+CHAPTER_PATH = re.compile(r'^/PenguinStats/api/chapter/(\d+)/stage$')
+STAGE_PATH = re.compile(r'^/PenguinStats/api/result/stage/(\d+)/normal$')
+
+class Resource:
+    def __init__(self, data):
+        self.set(data)
+
+    def set(self, data):
+        self.body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.etag = f'"{hashlib.sha1(self.body).hexdigest()}"'
+        # a whole second later than the previous version, as HTTP dates have no fraction
+        self.modified = max(int(time.time()), getattr(self, 'modified', 0) + 1)
+
+    def is_not_modified(self, headers):
+        if headers.get('If-None-Match') is not None:
+            return headers['If-None-Match'] == self.etag
+        if headers.get('If-Modified-Since') is not None:
+            try:
+                since = email.utils.parsedate_to_datetime(headers['If-Modified-Since']).timestamp()
+            except (TypeError, ValueError):
+                return False
+            return self.modified <= since
+        return False
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128 # the default of 5 drops the connections of a concurrent crawler
+
+class MockPenguinStats:
+    """
+    e.g.
+        mock = MockPenguinStats.from_dataset(path).start()
+        ... mock.url ...
+        mock.mutate(5)
+        mock.close()
+    """
+    def __init__(self, results, latency=0, fail_rate=0, validators=True, seed=0):
+        """
+        @param: results: stage results, as the lines of `droprates.jl`
+        @param: validators: whether to send ETag / Last-Modified at all
+        """
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.validators = validators
+        self.rng = random.Random(seed)
+        self.stats = {'requests': 0, 'not_modified': 0, 'failed': 0}
+        self._lock = threading.Lock()
+        self._server = None
+
+        self.results = {result['stage']['id']: result for result in results}
+        self.stages = {stage_id: Resource(result) for stage_id, result in self.results.items()}
+        self.chapters = {}
+        for chapter in penguin_statistic.CHAPTERS:
+            stages = [result['stage'] for result in results if result['stage']['chapter'] == chapter]
+            self.chapters[chapter] = Resource({'stages': stages})
+
+    @classmethod
+    def from_dataset(cls, path=os.path.join(penguin_statistic.RESULTS_DIR, penguin_statistic.DATASET_LINK), **kwargs):
+        with open(path, 'r') as f:
+            return cls([json.loads(line) for line in f], **kwargs)
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self, host='127.0.0.1', port=0):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                mock.handle(self)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = _Server((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def mutate(self, n):
+        """
+        Adds a few runs to the results of `n` random stages with drops
+        @return: ids of the changed stages
+        """
+        stage_ids = self.rng.sample(sorted(k for k, result in self.results.items() if result['drops']), n)
+        for stage_id in stage_ids:
+            result = self.results[stage_id]
+            runs = self.rng.randint(1, 50)
+            for drop in result['drops']:
+                drop['times'] += runs
+                drop['quantity'] += self.rng.randint(0, runs)
+            self.stages[stage_id].set(result)
+        return stage_ids
+
+    def get_resource(self, path):
+        match = CHAPTER_PATH.match(path)
+        if match:
+            return self.chapters.get(int(match.group(1)))
+        match = STAGE_PATH.match(path)
+        if match:
+            return self.stages.get(int(match.group(1)))
+        return None
+
+    def handle(self, request):
+        with self._lock:
+            self.stats['requests'] += 1
+            fail = self.rng.random() < self.fail_rate
+        if self.latency:
+            time.sleep(self.latency)
+
+        if fail:
+            with self._lock:
+                self.stats['failed'] += 1
+            return self._answer(request, 503, b'', {'Retry-After': '0'})
+
+        resource = self.get_resource(request.path)
+        if resource is None:
+            return self._answer(request, 404, b'')
+
+        headers = {}
+        if self.validators:
+            headers = {'ETag': resource.etag, 'Last-Modified': email.utils.formatdate(resource.modified, usegmt=True)}
+            if resource.is_not_modified(request.headers):
+                with self._lock:
+                    self.stats['not_modified'] += 1
+                return self._answer(request, 304, b'', headers)
+        self._answer(request, 200, resource.body, {'Content-Type': 'application/json; charset=utf-8', **headers})
+
+    def _answer(self, request, status, body, headers=None):
+        request.send_response(status)
+        for name, value in (headers or {}).items():
+            request.send_header(name, value)
+        if status != 304:
+            request.send_header('Content-Length', str(len(body)))
+        request.end_headers()
+        if body:
+            request.wfile.write(body)
+
+##########################
+# Benchmark
+##########################
+def benchmark(mock, n_mutate, concurrency):
+    results_dir = tempfile.mkdtemp(prefix='droprates_')
+    try:
+        print(f"{'crawl':<12} {'seconds':>8} {'requests':>9} {'304':>5} {'changed':>8}  dataset")
+        for name, n in (('cold', 0), ('unchanged', 0), (f"{n_mutate} changed", n_mutate)):
+            if n:
+                mock.mutate(n)
+            beg = time.perf_counter()
+            path, stats = penguin_statistic.refresh(mock.url, concurrency, results_dir)
+            elapsed = time.perf_counter() - beg
+            print(
+                f"{name:<12} {elapsed:8.3f} {stats['requests']:9d} {stats['not_modified']:5d} "
+                f"{stats['changed']:8d}  {'kept' if path is None else 'written'}"
+            )
+
+        # the dataset should be what the mock serves, in the order of the chapters
+        with open(os.path.join(results_dir, penguin_statistic.DATASET_LINK), 'r') as f:
+            crawled = [json.loads(line) for line in f]
+        if sorted(crawled, key=lambda result: result['stage']['id']) != [mock.results[k] for k in sorted(mock.results)]:
+            print("The crawled dataset differs from the served one", file=sys.stderr)
+            return 1
+    finally:
+        shutil.rmtree(results_dir, ignore_errors=True)
+    return 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve a drop rate dataset as the penguin-stats API")
+    parser.add_argument('dataset', nargs='?', default=os.path.join(penguin_statistic.RESULTS_DIR, penguin_statistic.DATASET_LINK))
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8001, help="0 for any free port")
+    parser.add_argument('--latency', type=float, default=0, help="seconds added to every answer")
+    parser.add_argument('--fail-rate', type=float, default=0, help="fraction of the answers that are 503")
+    parser.add_argument('--no-validators', action='store_true', help="send no ETag / Last-Modified")
+    parser.add_argument('--benchmark', action='store_true', help="time the crawler against the mock, then exit")
+    parser.add_argument('--mutate', type=int, default=5, help="stages changed before the last crawl of --benchmark")
+    parser.add_argument('-j', '--concurrency', type=int, default=8, help="of the crawler in --benchmark")
+    args = parser.parse_args(argv)
+
+    mock = MockPenguinStats.from_dataset(
+        args.dataset, latency=args.latency, fail_rate=args.fail_rate, validators=not args.no_validators,
+    )
+    if args.benchmark:
+        mock.start(args.host, 0)
+        try:
+            return benchmark(mock, args.mutate, args.concurrency)
+        finally:
+            mock.close()
+
+    mock.start(args.host, args.port)
+    print(f"Serving {len(mock.stages)} stages on {mock.url}", flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        mock.close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
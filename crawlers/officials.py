@@ -1,87 +1,327 @@
-import scrapy
+"""
+Crawler of the operators (干员) of the wiki, in two steps
+
+    $ python officials.py                   # crawl, parse the pages that changed, write the results
+    $ python officials.py --offline         # only parse, from the cached pages
+    $ python officials.py --offline --reparse   # e.g. after a fix of the parsers
+
+Crawl: the index and every operator page are requested conditionally, `--concurrency` at a time,
+into a page cache (`CACHE_DIR`) that only rewrites the pages whose content changed.
+The progress is saved as it goes (`STATE_FILE`), so an interrupted crawl resumes with the pages left,
+unless `--restart`.
+
+Parse: only the pages whose content differs from the one they were last parsed from
+(or all of them once `PARSER_VERSION` changes) are parsed, in a process pool.
+A page failing to parse is reported, and keeps its last good record until the parsers are fixed.
+A new `officials_<time>.jl` is written, and the link `officials.jl` swapped to it atomically,
+only if a record changed.
+"""
+import argparse
+import hashlib
+import json
+import os
 import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from urllib.parse import urljoin
+
+from parsel import Selector
+
+from fetching import CrawlError, ResponseCache, fetch, swap_link, write_atomic
+
+DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(DIR, 'results')
+CACHE_DIR = os.path.join(RESULTS_DIR, 'officials_cache')
+STATE_FILE = 'state.json'
+URLS_FILE = 'urls.json' # the pages of the last finished crawl
+PARSED_FILE = 'parsed.json'
+DATASET_LINK = 'officials.jl'
+
+INDEX_URL = r'http://wiki.joyme.com/arknights/%E5%B9%B2%E5%91%98%E6%95%B0%E6%8D%AE%E8%A1%A8'
+SAVE_EVERY = 20 # pages fetched between two saves of the progress
+
+PARSER_VERSION = 1 # bump it when the parsers change, to parse every page again
+
+# the sections of an operator page, found by their title, or at their usual place if none has it
+ELITE_SECTION = ('精英化', 6)
+SKILL_SECTION = ('技能升级', 7)
+
+class ParseError(Exception):
+    pass
+
+##########################
+# Parsers
+##########################
+def parse_index(html):
+    """
+    @return: urls of the operator pages
+    """
+    hrefs = Selector(text=html).xpath('//tr[@data-param1]/td[2]/a/@href').extract()
+    return [urljoin(INDEX_URL, href) for href in hrefs]
+
+def find_section(infos, section):
+    title, ind = section
+    for info in infos:
+        if any(title in text for text in info.xpath('.//th/text() | .//td/text()').extract()[:3]):
+            return info
+    if ind < len(infos):
+        return infos[ind]
+    raise ParseError(f"No section {title} among {len(infos)}")
+
+def parse_page(html):
+    """
+    @return: the record of an operator page
+    """
+    response = Selector(text=html)
+    basic_data = parse_basic_data(response.xpath('//div[contains(@class, "tj-bg")]'))
+
+    infos = response.xpath('//div[contains(@class, "tj-bgs")]')
+
+    elite_data = parse_elite_data(find_section(infos, ELITE_SECTION))
+    skill_upgrade_data = parse_skill_upgrade(find_section(infos, SKILL_SECTION))
 
-class OfficialSpidier(scrapy.Spider):
-    name = "officials"
-    start_urls = [
-        r'http://wiki.joyme.com/arknights/%E5%B9%B2%E5%91%98%E6%95%B0%E6%8D%AE%E8%A1%A8'
+    return {
+        **basic_data,
+        '精英化': elite_data,
+        '技能升级': skill_upgrade_data,
+    }
+
+def parse_basic_data(data):
+    eng_name, name = data[0].xpath('.//td/text()').extract()
+
+    keys = data[1].xpath('.//table//th/text()').extract()
+    vals = data[1].xpath('.//table//td/text()').extract()
+
+    keys = [key.strip() for key in keys if key.strip()]
+    vals = [val.strip() for val in vals if val.strip()]
+
+    return dict(zip(keys, vals), name=name.strip(), eng_name=eng_name.strip())
+
+def parse_skill_upgrade(data):
+    skill_upgrade = data.xpath('./table/tr/*/text()')
+    skill_upgrade = [
+        data.strip() for data in skill_upgrade.extract()
+        if '→' in data or re.match(r'[0-9]+(、[0-9]+)*', data)
     ]
 
-    def parse(self, response):
-        hrefs = response.xpath('//tr[@data-param1]/td[2]/a')
+    upgrade_title = skill_upgrade[::2]
+    upgrade_item_cnt = skill_upgrade[1::2]
+    upgrade_items = data.xpath('.//span[contains(@class, "itemhover")]/div/a/@title').extract()
+
+    upgrade_items_with_cnt = []
+    for cnt in upgrade_item_cnt:
+        cnt = cnt.split('、')
+        items = upgrade_items[:len(cnt)]
+        upgrade_items_with_cnt.append({
+            k: v for k, v in zip(items, cnt)
+        })
+        upgrade_items = upgrade_items[len(cnt):]
+
+    upgrade_data = {k: v for k, v in zip(upgrade_title, upgrade_items_with_cnt)}
+    return upgrade_data
+
+def parse_elite_data(data):
+    elites = {}
+
+    for elite_level in [1, 2]:
+        elite_data = data.xpath('.//tr[4]')
+        if elite_level > len(elite_data):
+            continue
+
+        elite_data = elite_data[elite_level - 1]
+        items = elite_data.xpath('.//a/text()').extract()
+        item_cnt = elite_data.xpath('./td/text()').extract()
+        item_cnt = [cnt.split('】')[1].strip() for cnt in item_cnt if '】' in cnt][1:]
+        item_cnt = [int(float(cnt.strip('w')) * 10000) if cnt.endswith('w') else int(cnt) for cnt in item_cnt]
+        items = dict(zip(items, item_cnt))
+
+        elites[elite_level] = items
+
+    return elites
+
+def _parse_page_file(path):
+    """
+    Runs in a worker process
+    @return: (record or None, error or None)
+    """
+    try:
+        with open(path, 'rb') as f:
+            html = f.read().decode('utf-8', errors='replace')
+        return parse_page(html), None
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}"
+
+##########################
+# Crawl
+##########################
+def _page_filename(url):
+    return f"page_{hashlib.sha1(url.encode()).hexdigest()[:16]}.html"
 
-        names = hrefs.xpath('./text()').extract()
-        hrefs = hrefs.xpath('./@href').extract()
+def _load_json(path, default):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
 
-        # yield dict(zip(names, hrefs))
+def _save_json(path, data):
+    write_atomic(path, json.dumps(data, ensure_ascii=False, indent=1).encode('utf-8'))
 
-        for url in hrefs:
-            yield scrapy.Request(response.urljoin(url), callback=self.parse_chara)
+def crawl(cache, concurrency=8, restart=False):
+    """
+    Fetches the pages of the operators into `cache`, resuming an unfinished crawl unless `restart`
+    @return: stats of the crawl
+    """
+    state_path = os.path.join(cache.directory, STATE_FILE)
+    state = None if restart else _load_json(state_path, None)
+    stats = {'resumed': state is not None, 'requests': 0, 'not_modified': 0, 'changed': 0, 'unchanged': 0}
 
-    def parse_chara(self, response):
-        basic_data = self.parse_basic_data(response.xpath('//div[contains(@class, "tj-bg")]'))
+    def get(url, filename):
+        status, body, headers = fetch(url, cache.get_validators(url))
+        if status == 304:
+            return 'not_modified'
+        changed = cache.put(url, filename, body, headers.get('ETag'), headers.get('Last-Modified'))
+        return 'changed' if changed else 'unchanged'
 
-        infos = response.xpath('//div[contains(@class, "tj-bgs")]')
+    if state is None:
+        stats[get(INDEX_URL, 'index.html')] += 1
+        stats['requests'] += 1
+        urls = parse_index(cache.get_body(INDEX_URL).decode('utf-8', errors='replace'))
+        state = {'started_at': time.strftime('%Y-%m-%d %H:%M:%S'), 'urls': urls, 'done': []}
+        _save_json(state_path, state)
 
-        elite_data = self.parse_elite_data(infos[6])
-        skill_upgrade_data = self.parse_skill_upgrade(infos[7])
+    done = set(state['done'])
+    pending = [url for url in state['urls'] if url not in done]
 
-        yield {
-            **basic_data,
-            '精英化': elite_data,
-            '技能升级': skill_upgrade_data,
-        }
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+    futures = {}
+    try:
+        for url in pending:
+            futures[executor.submit(get, url, _page_filename(url))] = url
+        for cnt, future in enumerate(as_completed(futures), 1):
+            stats[future.result()] += 1
+            stats['requests'] += 1
+            state['done'].append(futures[future])
+            if cnt % SAVE_EVERY == 0:
+                cache.save()
+                _save_json(state_path, state)
+    except BaseException:
+        # `shutdown(cancel_futures=True)` needs python 3.9
+        for future in futures:
+            future.cancel()
+        executor.shutdown(wait=True)
+        cache.save()
+        _save_json(state_path, state)
+        raise
+    executor.shutdown()
 
-    def parse_basic_data(self, data):
-        eng_name, name = data[0].xpath('.//td/text()').extract()
+    # pages no longer in the index
+    listed = set(state['urls'])
+    for url in list(cache.index):
+        if url != INDEX_URL and url not in listed:
+            cache.forget(url)
+    cache.save()
+    _save_json(os.path.join(cache.directory, URLS_FILE), state['urls'])
+    os.remove(state_path) # finished, the next crawl starts over
+    return stats
 
-        keys = data[1].xpath('.//table//th/text()').extract()
-        vals = data[1].xpath('.//table//td/text()').extract()
+##########################
+# Parse
+##########################
+def parse(cache, n_workers=None, reparse=False):
+    """
+    Parses the cached pages whose content changed since they were last parsed
+    @return: (records in the order of the index, whether any changed, {url: error})
+    """
+    urls = _load_json(os.path.join(cache.directory, URLS_FILE), None)
+    if urls is None:
+        raise CrawlError("No crawled pages yet, run a crawl first")
 
-        keys = [key.strip() for key in keys if key.strip()]
-        vals = [val.strip() for val in vals if val.strip()]
+    parsed_path = os.path.join(cache.directory, PARSED_FILE)
+    parsed = _load_json(parsed_path, {})
 
-        return dict(zip(keys, vals), name=name.strip(), eng_name=eng_name.strip())
+    todo = {}
+    for url in urls:
+        try:
+            with open(os.path.join(cache.directory, _page_filename(url)), 'rb') as f:
+                digest = hashlib.sha1(f.read()).hexdigest()
+        except OSError:
+            raise CrawlError(f"{url} is not cached, run a crawl first") from None
+        entry = parsed.get(url)
+        if reparse or entry is None or entry['sha1'] != digest or entry['version'] != PARSER_VERSION:
+            todo[url] = digest
 
-    def parse_skill_upgrade(self, data):
-        skill_upgrade = data.xpath('./table/tr/*/text()')
-        skill_upgrade = [
-            data.strip() for data in skill_upgrade.extract()
-            if '→' in data or re.match(r'[0-9]+(、[0-9]+)*', data)
-        ]
+    changed = False
+    if todo:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            paths = [os.path.join(cache.directory, _page_filename(url)) for url in todo]
+            for (url, digest), (record, error) in zip(todo.items(), executor.map(_parse_page_file, paths)):
+                previous = parsed.get(url, {}).get('record')
+                if record is None: # keep the last good record, until the parser is fixed
+                    record = previous
+                parsed[url] = {'sha1': digest, 'version': PARSER_VERSION, 'record': record, 'error': error}
+                changed |= record != previous
 
-        upgrade_title = skill_upgrade[::2]
-        upgrade_item_cnt = skill_upgrade[1::2]
-        upgrade_items = data.xpath('.//span[contains(@class, "itemhover")]/div/a/@title').extract()
+    removed = set(parsed) - set(urls)
+    for url in removed:
+        del parsed[url]
+    _save_json(parsed_path, parsed)
 
-        upgrade_items_with_cnt = []
-        for cnt in upgrade_item_cnt:
-            cnt = cnt.split('、')
-            items = upgrade_items[:len(cnt)]
-            upgrade_items_with_cnt.append({
-                k: v for k, v in zip(items, cnt)
-            })
-            upgrade_items = upgrade_items[len(cnt):]
+    records = [parsed[url]['record'] for url in urls if parsed[url]['record'] is not None]
+    errors = {url: parsed[url]['error'] for url in urls if parsed[url]['error'] is not None}
+    return records, changed or bool(removed), errors
 
-        upgrade_data = {k: v for k, v in zip(upgrade_title, upgrade_items_with_cnt)}
-        return upgrade_data
+def write_dataset(records, results_dir=RESULTS_DIR):
+    filename = f"officials_{time.strftime('%y%m%d_%H%M%S')}.jl"
+    path = os.path.join(results_dir, filename)
+    data = ''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in records)
+    write_atomic(path, data.encode('utf-8'))
+    swap_link(results_dir, DATASET_LINK, filename)
+    return path
 
-    def parse_elite_data(self, data):
-        elites = {}
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Update the data of the operators from the wiki")
+    parser.add_argument('--offline', action='store_true', help="parse the cached pages only, no request")
+    parser.add_argument('--reparse', action='store_true', help="parse every page, not only the changed ones")
+    parser.add_argument('--restart', action='store_true', help="start the crawl over instead of resuming it")
+    parser.add_argument('-j', '--concurrency', type=int, default=8, help="requests in flight")
+    parser.add_argument('-w', '--workers', type=int, default=None, help="parsing processes, defaults to #cpu")
+    parser.add_argument('--results-dir', default=RESULTS_DIR)
+    args = parser.parse_args(argv)
+    if args.concurrency <= 0:
+        parser.error("--concurrency should be positive")
 
-        for elite_level in [1, 2]:
-            elite_data = data.xpath('.//tr[4]')
-            if elite_level > len(elite_data):
-                continue
+    cache = ResponseCache(os.path.join(args.results_dir, os.path.basename(CACHE_DIR)))
+    try:
+        if not args.offline:
+            beg = time.perf_counter()
+            stats = crawl(cache, args.concurrency, args.restart)
+            print(
+                f"{'Resumed' if stats['resumed'] else 'Crawled'}: {stats['requests']} requests "
+                f"in {time.perf_counter() - beg:.2f}s, {stats['not_modified']} not modified, "
+                f"{stats['unchanged']} unchanged, {stats['changed']} changed"
+            )
 
-            elite_data = elite_data[elite_level - 1]
-            items = elite_data.xpath('.//a/text()').extract()
-            item_cnt = elite_data.xpath('./td/text()').extract()
-            item_cnt = [cnt.split('】')[1].strip() for cnt in item_cnt if '】' in cnt][1:]
-            item_cnt = [int(float(cnt.strip('w')) * 10000) if cnt.endswith('w') else int(cnt) for cnt in item_cnt]
-            items = dict(zip(items, item_cnt))
+        beg = time.perf_counter()
+        records, changed, errors = parse(cache, args.workers, args.reparse)
+    except CrawlError as e:
+        print(f"Crawl failed, the official data is kept as it is: {e}", file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        print("Interrupted, run again to resume", file=sys.stderr)
+        return 1
+    print(f"Parsed: {len(records)} operators in {time.perf_counter() - beg:.2f}s")
 
-            elites[elite_level] = items
+    for url, error in errors.items():
+        print(f"Failed to parse {url}: {error}", file=sys.stderr)
 
-        return elites
+    link = os.path.join(args.results_dir, DATASET_LINK)
+    if not changed and os.path.exists(link):
+        print("Official data unchanged")
+    else:
+        print(f"Official data updated: {write_dataset(records, args.results_dir)}")
+    return 1 if errors else 0
 
+if __name__ == '__main__':
+    sys.exit(main())
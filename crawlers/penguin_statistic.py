@@ -1,20 +1,172 @@
-import scrapy
+"""
+Incremental crawler of the drop rates of penguin-stats
+
+    $ python penguin_statistic.py
+    $ python penguin_statistic.py --base-url http://127.0.0.1:8001 --concurrency 16
+
+Every chapter and stage result is requested conditionally (If-None-Match / If-Modified-Since),
+with the validators and the body of its last answer kept under `CACHE_DIR/<host>`:
+* 304 Not Modified: the kept body is reused, nothing is rewritten
+* 200: the body is rewritten only if it differs from the kept one
+Requests run `--concurrency` at a time, and are retried with exponential backoff
+on connection errors, 429 and 5xx.
+
+Only when the stage results differ from the current dataset is a new `droprates_<time>.jl` written,
+in the order of the chapters, with its columnar copy `droprates_<time>.drops` (see `dropset.py`),
+and the link `droprates.jl` swapped to it atomically.
+A failed crawl leaves the current dataset as it is, the answers it got stay in the cache
+(with their validators), and are compared against the dataset on the next crawl.
+"""
+import argparse
 import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from fetching import CrawlError, ResponseCache, fetch, swap_link, write_atomic
+
+DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(DIR)) # of the planner
+import dropset
+
+RESULTS_DIR = os.path.join(DIR, 'results')
+CACHE_DIRNAME = 'penguin_cache' # a directory per host under it
+CACHE_DIR = os.path.join(RESULTS_DIR, CACHE_DIRNAME)
+DATASET_LINK = 'droprates.jl'
+
+BASE_URL = 'https://penguin-stats.io'
+CHAPTERS = [0, 1, 2, 3, 4, 5]
+CHAPTER_URL = '{base}/PenguinStats/api/chapter/{chapter}/stage'
+STAGE_URL = '{base}/PenguinStats/api/result/stage/{stage}/normal'
+
+##########################
+# Crawling
+##########################
+class Crawler:
+    def __init__(self, base_url=BASE_URL, concurrency=8, cache_dir=CACHE_DIR):
+        self.base_url = base_url.rstrip('/')
+        self.concurrency = concurrency
+        self.cache = ResponseCache(os.path.join(cache_dir, urlsplit(self.base_url).netloc.replace(':', '_')))
+        self.stats = {'requests': 0, 'not_modified': 0, 'changed': 0, 'unchanged': 0}
+        self._lock = threading.Lock() # of the stats, `get` runs in the threads of the pool
+
+    def get(self, url, filename):
+        """
+        @return: (parsed body, whether it changed since the last crawl)
+        """
+        status, body, headers = fetch(url, {'Accept': 'application/json', **self.cache.get_validators(url)})
+        if status == 304:
+            changed = False
+            body = self.cache.get_body(url)
+        else:
+            changed = self.cache.put(url, filename, body, headers.get('ETag'), headers.get('Last-Modified'))
+
+        with self._lock:
+            self.stats['requests'] += 1
+            self.stats['not_modified' if status == 304 else 'changed' if changed else 'unchanged'] += 1
+        return json.loads(body), changed
+
+    def crawl(self):
+        """
+        The cache is saved even if the crawl fails, so that it always holds the validators of its bodies
+        @return: stage results in the order of the chapters
+        """
+        try:
+            with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+                chapter_urls = [CHAPTER_URL.format(base=self.base_url, chapter=ind) for ind in CHAPTERS]
+                chapters = list(executor.map(
+                    lambda url, ind: self.get(url, f"chapter_{ind}.json"), chapter_urls, CHAPTERS,
+                ))
+
+                stage_ids = [stage['id'] for data, _ in chapters for stage in data['stages']]
+                stage_urls = [STAGE_URL.format(base=self.base_url, stage=stage_id) for stage_id in stage_ids]
+                stages = list(executor.map(
+                    lambda url, stage_id: self.get(url, f"stage_{stage_id}.json"), stage_urls, stage_ids,
+                ))
+
+            # stages no longer listed
+            listed = set(stage_urls)
+            removed = [
+                url for url, entry in self.cache.index.items()
+                if entry['file'].startswith('stage_') and url not in listed
+            ]
+            for url in removed:
+                self.cache.forget(url)
+        finally:
+            self.cache.save()
+
+        return [data for data, _ in stages]
+
+##########################
+# Dataset
+##########################
+def write_dataset(results, results_dir=RESULTS_DIR):
+    """
+    Writes the stage results as json lines, then points `DATASET_LINK` to them atomically
+    @return: path of the new dataset
+    """
+    filename = f"droprates_{time.strftime('%y%m%d_%H%M%S')}.jl"
+    path = os.path.join(results_dir, filename)
+    data = ''.join(json.dumps(result, ensure_ascii=False) + '\n' for result in results)
+    write_atomic(path, data.encode('utf-8'))
+    dropset.convert(path)
+    swap_link(results_dir, DATASET_LINK, filename)
+    return path
+
+def read_dataset(path):
+    """
+    @return: stage results of the dataset, None if there is none
+    """
+    try:
+        with open(path, 'r') as f:
+            return [json.loads(line) for line in f if line.strip()]
+    except (OSError, ValueError):
+        return None
+
+def refresh(base_url=BASE_URL, concurrency=8, results_dir=RESULTS_DIR, force=False):
+    """
+    @param: force: write a new dataset even if nothing changed
+    @return: (path of the new dataset or None if unchanged, crawler stats)
+    """
+    crawler = Crawler(base_url, concurrency, os.path.join(results_dir, CACHE_DIRNAME))
+    results = crawler.crawl()
+    link = os.path.join(results_dir, DATASET_LINK)
+    # against the dataset rather than the cache, which may be ahead of it after a failed crawl
+    if not force and results == read_dataset(link):
+        if dropset.open_for(link) is None: # made before the columnar format
+            dropset.convert(link)
+        return None, crawler.stats
+    return write_dataset(results, results_dir), crawler.stats
 
-class DropRateSpidier(scrapy.Spider):
-    name = "droprate"
-    start_urls = [
-        rf"https://penguin-stats.io/PenguinStats/api/chapter/{ind}/stage"
-        for ind in [0, 1, 2, 3, 4, 5]
-    ]
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Update the drop rates from penguin-stats")
+    parser.add_argument('--base-url', default=BASE_URL, help="e.g. of mock_penguin_stats.py")
+    parser.add_argument('-j', '--concurrency', type=int, default=8, help="requests in flight")
+    parser.add_argument('--results-dir', default=RESULTS_DIR)
+    parser.add_argument('--force', action='store_true', help="write a new dataset even if nothing changed")
+    args = parser.parse_args(argv)
+    if args.concurrency <= 0:
+        parser.error("--concurrency should be positive")
 
-    def parse(self, response):
-        data = json.loads(response.body_as_unicode())['stages']
+    beg = time.perf_counter()
+    try:
+        path, stats = refresh(args.base_url, args.concurrency, args.results_dir, force=args.force)
+    except CrawlError as e:
+        print(f"Crawl failed, the drop rates are kept as they are: {e}", file=sys.stderr)
+        return 1
 
-        for chapter_data in data:
-            api_url = rf"https://penguin-stats.io/PenguinStats/api/result/stage/{chapter_data['id']}/normal"
-            yield scrapy.Request(api_url, callback=self.parse_chapter)
+    print(
+        f"{stats['requests']} requests in {time.perf_counter() - beg:.2f}s: "
+        f"{stats['not_modified']} not modified, {stats['unchanged']} unchanged, {stats['changed']} changed"
+    )
+    if path is None:
+        print("Droprate unchanged")
+    else:
+        print(f"Droprate updated: {path}")
+    return 0
 
-    def parse_chapter(self, response):
-        data = json.loads(response.body_as_unicode())
-        yield data
+if __name__ == '__main__':
+    sys.exit(main())
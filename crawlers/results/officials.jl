@@ -1 +1 @@
-/Users/gigaflower/Code/games/arknights/crawlers/results/officials_190606_152305.jl
\ No newline at end of file
+officials_190606_152305.jl
\ No newline at end of file
@@ -1,10 +1,6 @@
-FIELNAME=results/droprates_`date "+%y%m%d_%H%M%S"`.jl
-scrapy runspider penguin_statistic.py -o $FIELNAME.jl -s FEED_EXPORT_ENCODING='utf-8'
+# incremental: only the changed stages are downloaded, and results/droprates.jl is swapped atomically
+# to a new droprates_<time>.jl only if any changed, e.g. `bash run_droprate.bash --base-url http://127.0.0.1:8001`
+python penguin_statistic.py "$@"
 
-rm results/droprates.jl 2>/dev/null
-ln -s `realpath $FIELNAME` `realpath results/droprates.jl`
-
-echo "Droprate updated: $FIELNAME"
-
-# for test
-# scrapy shell url
\ No newline at end of file
+# for test, against a local stand-in of the api
+# python mock_penguin_stats.py --benchmark
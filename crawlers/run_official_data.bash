@@ -1,10 +1,6 @@
-FIELNAME=results/officials_`date "+%y%m%d_%H%M%S"`.jl
-scrapy runspider officials.py -o $FIELNAME -s FEED_EXPORT_ENCODING='utf-8'
+# incremental and resumable: the pages are cached under results/officials_cache, only the changed ones
+# are parsed, and results/officials.jl is swapped atomically to a new officials_<time>.jl if any record changed
+python officials.py "$@"
 
-rm results/officials.jl 2>/dev/null
-ln -s `realpath $FIELNAME` `realpath results/officials.jl`
-
-echo "Official data updated: $FIELNAME"
-
-# for test
-# scrapy shell url
\ No newline at end of file
+# for test, parsing the cached pages again without any request
+# python officials.py --offline --reparse
@@ -0,0 +1,230 @@
+"""
+Columnar binary format of the drop rates, memory-mapped instead of parsed
+
+    $ python dropset.py                                 # converts crawlers/results/droprates.jl
+    $ python dropset.py droprates_190606_152332.jl -o /tmp/droprates.drops
+
+A `.drops` file holds the stage results of a `droprates_<time>.jl` as flat arrays:
+* stage table: `stage_id`, `stage_code`, `stage_ap_cost`
+* item table: `item_id`, `item_name`
+* drops, CSR by stage: `drop_indptr` (n_stages + 1), then `drop_item` (row of the item table),
+  `drop_quantity` and `drop_times` for each drop
+
+Layout: `MAGIC`, the length of the header (uint32 LE), the header (JSON: the dtype, shape and offset
+of every array), then the arrays, each aligned to `ALIGN` bytes. Opening one is a `mmap` and a
+`np.frombuffer` per array, nothing is parsed nor copied until it is read.
+
+The crawler writes `droprates_<time>.drops` next to each `droprates_<time>.jl`, `items.py` reads it
+in place of the JSON lines when it is there and made from them as they are now (same content hash,
+see `util.get_digest`), and parses the JSON lines otherwise; nothing is written while planning.
+"""
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+
+import numpy as np
+
+from util import ROOT, get_digest
+
+MAGIC = b'ARKDROP1'
+ALIGN = 64
+SUFFIX = '.drops'
+DEFAULT_SOURCE = os.path.join(ROOT, 'crawlers', 'results', 'droprates.jl')
+
+ARRAY_NAMES = (
+    'stage_id', 'stage_code', 'stage_ap_cost',
+    'item_id', 'item_name',
+    'drop_indptr', 'drop_item', 'drop_quantity', 'drop_times',
+)
+
+def get_path(source):
+    """
+    @return: path of the `.drops` made from the JSON lines `source`, beside the file it links to
+    """
+    return os.path.splitext(os.path.realpath(source))[0] + SUFFIX
+
+##########################
+# Writing
+##########################
+def _str_array(values):
+    # fixed width, so that it maps as is
+    return np.array(values, dtype=f"<U{max(map(len, values), default=1) or 1}")
+
+def build_arrays(results):
+    """
+    @param: results: stage results of penguin-stats, as the lines of `droprates.jl`
+    @return: {name: array}, see `ARRAY_NAMES`
+    """
+    item_rows = {} # penguin id -> row of the item table
+    item_ids, item_names = [], []
+    stage_ids, stage_codes, ap_costs = [], [], []
+    indptr, drop_items, quantities, times = [0], [], [], []
+
+    for result in results:
+        stage = result['stage']
+        stage_ids.append(int(stage['id']))
+        stage_codes.append(stage['code'])
+        ap_costs.append(int(stage['apCost']))
+
+        for drop in result['drops']:
+            item = drop['item']
+            row = item_rows.get(item['id'])
+            if row is None:
+                row = item_rows[item['id']] = len(item_ids)
+                item_ids.append(int(item['id']))
+                item_names.append(item['name'])
+            drop_items.append(row)
+            quantities.append(int(drop['quantity']))
+            times.append(int(drop['times']))
+        indptr.append(len(drop_items))
+
+    return {
+        'stage_id': np.array(stage_ids, dtype='<i4'),
+        'stage_code': _str_array(stage_codes),
+        'stage_ap_cost': np.array(ap_costs, dtype='<i4'),
+        'item_id': np.array(item_ids, dtype='<i4'),
+        'item_name': _str_array(item_names),
+        'drop_indptr': np.array(indptr, dtype='<i8'),
+        'drop_item': np.array(drop_items, dtype='<i4'),
+        'drop_quantity': np.array(quantities, dtype='<i8'),
+        'drop_times': np.array(times, dtype='<i8'),
+    }
+
+def _align(offset):
+    return -(-offset // ALIGN) * ALIGN
+
+def write(path, arrays, source=None):
+    """
+    Writes then renames, so that a concurrent reader never sees a partial file
+    @param: source: content hash of the JSON lines the arrays are made from, checked on reading
+    """
+    # the offsets depend on the length of the header, which depends on the offsets:
+    # lay the arrays out after a generous bound of it
+    specs = {name: [arrays[name].dtype.str, list(arrays[name].shape), 0] for name in ARRAY_NAMES}
+    header = {'arrays': specs, 'source': source}
+    offset = _align(len(MAGIC) + 4 + len(json.dumps(header)) + 32 * len(ARRAY_NAMES))
+    for name in ARRAY_NAMES:
+        specs[name][2] = offset
+        offset = _align(offset + arrays[name].nbytes)
+    header_bytes = json.dumps(header).encode('utf-8')
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC + struct.pack('<I', len(header_bytes)) + header_bytes)
+        for name in ARRAY_NAMES:
+            f.seek(specs[name][2])
+            f.write(np.ascontiguousarray(arrays[name]).tobytes())
+        f.truncate(offset)
+    os.replace(tmp_path, path)
+
+def convert(source, path=None):
+    """
+    @param: source: JSON lines of the stage results
+    @return: path of the `.drops` written, `get_path(source)` by default
+    """
+    path = path or get_path(source)
+    with open(source, 'rb') as f:
+        content = f.read()
+    arrays = build_arrays(json.loads(line) for line in content.decode('utf-8').splitlines() if line.strip())
+    write(path, arrays, source=hashlib.sha1(content).hexdigest())
+    return path
+
+##########################
+# Reading
+##########################
+class DropSet:
+    """
+    The arrays of a `.drops`, as read-only views of the mapped file
+    """
+    def __init__(self, arrays, source=None):
+        self.source = source # content hash of the JSON lines
+        for name in ARRAY_NAMES:
+            setattr(self, name, arrays[name])
+
+    @classmethod
+    def open(cls, path):
+        with open(path, 'rb') as f:
+            try:
+                buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError: # empty file
+                raise ValueError(f"Not a drop dataset: {path}") from None
+        if buf[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"Not a drop dataset: {path}")
+        header_len, = struct.unpack_from('<I', buf, len(MAGIC))
+        beg = len(MAGIC) + 4
+        header = json.loads(buf[beg:beg + header_len])
+
+        arrays = {}
+        for name in ARRAY_NAMES:
+            dtype, shape, offset = header['arrays'][name]
+            dtype = np.dtype(dtype)
+            count = int(np.prod(shape))
+            arrays[name] = np.frombuffer(buf, dtype=dtype, count=count, offset=offset).reshape(shape)
+        return cls(arrays, header.get('source'))
+
+    @property
+    def n_stages(self):
+        return len(self.stage_id)
+
+    def get_drops(self, ind):
+        """
+        @return: {item name: (quantity, times)} of the `ind`-th stage
+        """
+        beg, end = self.drop_indptr[ind], self.drop_indptr[ind + 1]
+        names = self.item_name[self.drop_item[beg:end]].tolist()
+        return dict(zip(names, zip(self.drop_quantity[beg:end].tolist(), self.drop_times[beg:end].tolist())))
+
+    def to_stats(self, excluded=()):
+        """
+        @param: excluded: names of the items left out
+        @return: list of stages as {'code': str, 'ap_cost': int, 'drops': {item: (quantity, times)}},
+                 the same as `items.parse_drops`
+        """
+        item_names = self.item_name.tolist()
+        drop_items = self.drop_item.tolist()
+        quantities = self.drop_quantity.tolist()
+        times = self.drop_times.tolist()
+        indptr = self.drop_indptr.tolist()
+
+        stages = []
+        for ind, (code, ap_cost) in enumerate(zip(self.stage_code.tolist(), self.stage_ap_cost.tolist())):
+            drops = {}
+            for k in range(indptr[ind], indptr[ind + 1]):
+                name = item_names[drop_items[k]]
+                if name not in excluded:
+                    drops[name] = (quantities[k], times[k])
+            stages.append({'code': code, 'ap_cost': ap_cost, 'drops': drops})
+        return stages
+
+def open_for(source):
+    """
+    @return: the DropSet made from the JSON lines `source`, or None if there is none or it is stale
+    """
+    try:
+        dropset = DropSet.open(get_path(source))
+        if dropset.source != get_digest(source):
+            return None
+    except (OSError, ValueError):
+        return None
+    return dropset
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert the drop rates to the columnar format")
+    parser.add_argument('source', nargs='?', default=DEFAULT_SOURCE, help="JSON lines of the crawler")
+    parser.add_argument('-o', '--output', help=f"defaults to the source with `{SUFFIX}`")
+    args = parser.parse_args(argv)
+
+    path = convert(args.source, args.output)
+    dropset = DropSet.open(path)
+    print(
+        f"{dropset.n_stages} stages, {len(dropset.item_id)} items, {len(dropset.drop_item)} drops: "
+        f"{os.path.getsize(path)} bytes ({os.path.getsize(args.source)} as JSON lines) -> {path}"
+    )
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,286 @@
+"""
+Integer run counts on top of the LP relaxation
+
+    min c @ x
+    s.t. A_ub @ x <= b_ub
+         lb <= x <= ub
+         x[i] is an integer if rank[i] > 0
+
+1. the LP relaxation gives the lower bound
+2. a guided dive rounds it into a feasible plan: the fractional variables are fixed one at a time
+   (higher ranks first), towards whichever of floor / ceil keeps the LP better
+3. surplus left by the rounding is given back, by decreasing counts while the constraints still hold
+4. a best-first branch and bound improves the plan and the bound, until the gap is closed or time is up
+"""
+import heapq
+import itertools
+import time
+
+import numpy as np
+
+import solvers
+
+INT_TOL = 1e-6
+
+class IntegerSolution:
+    def __init__(self, x, objective, bound, n_lps, optimal, marginals=None):
+        self.x = x                  # None if no integer solution is found
+        self.objective = objective  # c @ x, inf if no integer solution is found
+        self.bound = bound          # lower bound of the objective of any integer solution
+        self.n_lps = n_lps          # number of LPs solved
+        self.optimal = optimal      # whether the gap is closed
+        self.marginals = marginals  # marginals of A_ub in the LP relaxation
+
+    @property
+    def gap(self):
+        """
+        relative optimality gap, (objective - bound) / |objective|
+        """
+        if self.x is None:
+            return np.inf
+        return max(self.objective - self.bound, 0.0) / max(abs(self.objective), 1e-9)
+
+class _Solver:
+    def __init__(self, c, A_ub, b_ub, lb, ub, rank, deadline, solver):
+        self.c, self.A_ub, self.b_ub = c, A_ub.tocsc(), b_ub
+        self.solver = solver
+        self.lb, self.ub = lb, ub
+        self.rank = rank
+        self.integral = rank > 0
+        self.deadline = deadline
+
+        # pseudo costs: objective degradation per unit of rounding down / up, observed when branching
+        self.pc_sum = np.zeros((2, len(c)))
+        self.pc_cnt = np.zeros((2, len(c)))
+
+        self.n_lps = 0
+        self.x = None
+        self.objective = np.inf
+
+    def timeout(self):
+        return time.perf_counter() >= self.deadline
+
+    def relax(self, lb, ub):
+        """
+        @return: (objective, x, marginals of A_ub) of the LP relaxation,
+                 or None if infeasible (or not solved to optimality, its bound being unknown)
+        """
+        self.n_lps += 1
+        ret = self.solver.solve(self.c, self.A_ub, self.b_ub, np.column_stack([lb, ub]))
+        if not ret.optimal:
+            return None
+        return float(self.c @ ret.x), ret.x, ret.marginals
+
+    def fractional(self, x, mask=None):
+        """
+        @return: indexes of the integral (or `mask`ed) variables with fractional values
+        """
+        ind = np.flatnonzero(self.integral if mask is None else mask)
+        return ind[np.abs(x[ind] - np.round(x[ind])) > INT_TOL]
+
+    def branch(self, node, var):
+        """
+        @yield: (direction, child node) for direction 0 (x[var] <= floor) and 1 (x[var] >= ceil),
+                child node is None if infeasible
+        """
+        obj, x, _, lb, ub = node
+        frac = x[var] - np.floor(x[var])
+        for direction in 0, 1:
+            child_lb, child_ub = lb.copy(), ub.copy()
+            if direction == 0:
+                child_ub[var] = np.floor(x[var])
+            else:
+                child_lb[var] = np.ceil(x[var])
+
+            ret = self.relax(child_lb, child_ub)
+            if ret is None:
+                yield direction, None
+                continue
+
+            self.pc_sum[direction, var] += (ret[0] - obj) / (frac if direction == 0 else 1 - frac)
+            self.pc_cnt[direction, var] += 1
+            yield direction, (*ret, child_lb, child_ub)
+
+    ##########################
+    # Primal Heuristics
+    ##########################
+    def offer(self, x):
+        """
+        Fixes the integral variables of x to integers and re-solves for the others,
+        keeps the result if it beats the incumbent
+        @return: the LP solved, or None if infeasible
+        """
+        fixed = np.round(x[self.integral])
+        lb, ub = self.lb.copy(), self.ub.copy()
+        lb[self.integral] = ub[self.integral] = fixed
+
+        ret = self.relax(lb, ub)
+        if ret is not None and ret[0] < self.objective:
+            self.objective, self.x = ret[0], ret[1]
+            self.x[self.integral] = fixed
+        return ret
+
+    def dive(self, node):
+        """
+        Rounds one variable at a time down to a first plan, or `round_up` once past the deadline
+        """
+        for rank in sorted(set(self.rank[self.integral]), reverse=True):
+            in_rank = self.rank == rank
+            while True:
+                frac = self.fractional(node[1], in_rank)
+                if not len(frac):
+                    break
+                if self.timeout():
+                    return self.round_up(node)
+
+                # the most decided one first
+                x = node[1]
+                dist = np.abs(x[frac] - np.round(x[frac]))
+                var = frac[np.argmin(dist)]
+
+                children = [child for _, child in self.branch(node, var) if child is not None]
+                if not children:
+                    return
+                node = min(children, key=lambda child: child[0])
+                if node[0] >= self.objective:
+                    return
+
+            # keep this rank fixed, while rounding the lower ones
+            obj, x, marginals, lb, ub = node
+            lb, ub = lb.copy(), ub.copy()
+            lb[in_rank] = ub[in_rank] = np.round(x[in_rank])
+            node = (obj, x, marginals, lb, ub)
+
+        self.give_back(self.offer(node[1]))
+
+    def round_up(self, node):
+        """
+        A quick first plan: rounds the integral variables up, rank by rank,
+        re-solving the lower ranks in between (an LP per rank)
+        """
+        obj, x, marginals, lb, ub = node
+        lb, ub = lb.copy(), ub.copy()
+        for rank in sorted(set(self.rank[self.integral]), reverse=True):
+            in_rank = self.rank == rank
+            lb[in_rank] = ub[in_rank] = np.clip(np.ceil(x[in_rank] - INT_TOL), lb[in_rank], ub[in_rank])
+            ret = self.relax(lb, ub)
+            if ret is None:
+                return
+            x = ret[1]
+        self.give_back(self.offer(x))
+
+    def give_back(self, ret):
+        """
+        Decreases the integral counts one by one, as long as the constraints still hold,
+        the ones freeing the most valuable resources (by the marginals) first
+        """
+        if ret is None or self.x is None:
+            return
+        _, _, marginals = ret
+        x = self.x.copy()
+        slack = self.b_ub - self.A_ub @ x
+
+        while True:
+            cands = np.flatnonzero(self.integral & (x - 1 >= self.lb - INT_TOL))
+            if not len(cands):
+                break
+            value = -(marginals @ self.A_ub[:, cands]) # resources freed by one unit less
+            moved = False
+            for var in cands[np.argsort(-value)]:
+                col = self.A_ub[:, var].toarray().ravel()
+                if (slack + col >= -INT_TOL * (1 + abs(self.b_ub))).all():
+                    slack += col
+                    x[var] -= 1
+                    moved = True
+            if not moved:
+                break
+
+        if (x != self.x).any():
+            self.offer(x)
+
+    ##########################
+    # Branch and Bound
+    ##########################
+    def pick_branch_var(self, x):
+        frac = self.fractional(x)
+        f = x[frac] - np.floor(x[frac])
+
+        # unobserved pseudo costs default to the average of the observed ones
+        pc = []
+        for direction in 0, 1:
+            cnt = self.pc_cnt[direction, frac]
+            avg = self.pc_sum[direction].sum() / self.pc_cnt[direction].sum() if self.pc_cnt[direction].any() else 1.0
+            pc.append(np.where(cnt > 0, self.pc_sum[direction, frac] / np.maximum(cnt, 1), avg))
+
+        score = np.maximum(pc[0] * f, 1e-6) * np.maximum(pc[1] * (1 - f), 1e-6)
+        return frac[np.argmax(score)]
+
+    def solve(self, rel_gap):
+        ret = self.relax(self.lb, self.ub)
+        if ret is None:
+            return IntegerSolution(None, np.inf, np.inf, self.n_lps, optimal=True)
+
+        root = (*ret, self.lb, self.ub)
+        if not len(self.fractional(root[1])):
+            self.offer(root[1])
+        else:
+            self.dive(root)
+
+        def closed(bound):
+            return self.x is not None and self.objective - bound <= rel_gap * max(abs(self.objective), 1e-9)
+
+        counter = itertools.count()
+        heap = [(root[0], next(counter), root)]
+        bound = root[0]
+        while heap:
+            bound = heap[0][0]
+            if closed(bound) or self.timeout():
+                break
+
+            _, _, node = heapq.heappop(heap)
+            if not len(self.fractional(node[1])):
+                self.offer(node[1])
+                continue
+
+            for _, child in self.branch(node, self.pick_branch_var(node[1])):
+                if child is None or child[0] >= self.objective:
+                    continue
+                if not len(self.fractional(child[1])):
+                    self.offer(child[1])
+                else:
+                    heapq.heappush(heap, (child[0], next(counter), child))
+        else:
+            bound = self.objective # the whole tree is explored
+
+        bound = min(bound, self.objective)
+        return IntegerSolution(
+            self.x, self.objective, bound, self.n_lps, optimal=closed(bound), marginals=root[2],
+        )
+
+def solve(c, A_ub, b_ub, bounds, integral, time_limit=2.0, rel_gap=1e-4, solver=None):
+    """
+    @param: bounds: (lb, ub) for all variables, or a list of (lb, ub) pairs; None for unbounded
+    @param: integral: rank of the variables, 0 for continuous ones, the others are integral
+                      and rounded in decreasing order of the rank; a boolean mask also works
+    @param: time_limit: in seconds, the best integer solution found so far is returned after it,
+                        if the first one is still being searched for, the rest of it is rounded up at once
+                        (x is None if even that is infeasible)
+    @param: rel_gap: stops once (objective - bound) <= rel_gap * |objective|
+    @param: solver: `solvers.Solver` of the LP relaxations, HiGHS by default
+    @return: IntegerSolution
+    """
+    n = len(c)
+    if isinstance(bounds, tuple):
+        bounds = [bounds] * n
+    lb = np.array([0.0 if l is None else l for l, u in bounds], dtype=float)
+    ub = np.array([np.inf if u is None else u for l, u in bounds], dtype=float)
+
+    rank = np.asarray(integral, dtype=int)
+    # integral variables can only take integer values within the bounds
+    lb[rank > 0] = np.ceil(lb[rank > 0] - INT_TOL)
+    ub[rank > 0] = np.floor(ub[rank > 0] + INT_TOL)
+
+    solver = _Solver(
+        c, A_ub, b_ub, lb, ub, rank, time.perf_counter() + time_limit, solver or solvers.get_solver(),
+    )
+    return solver.solve(rel_gap)
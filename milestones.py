@@ -0,0 +1,91 @@
+"""
+The day each upgrade target is done, when they are done in the order of `提升目标`
+
+    $ python milestones.py config.yaml
+    $ python milestones.py config.yaml --csv milestones.csv
+
+The planner pools all the targets, so its plan only tells when everything is done.
+Here the k-th milestone is the fewest days to finish the first k targets (after the `目标道具`, if any),
+i.e. one LP per prefix of the list.
+
+Each prefix only adds the items of one more target to the right-hand side, so the LP is assembled once
+(`session.PlanningSession`), and each milestone starts from the optimal basis of the previous one,
+falling back to a full solve only when that basis is no longer feasible.
+
+The milestones are those of the LP: with `整数规划` on, they are its relaxation (a little fewer days
+than the whole runs take). `预处理` makes no difference, the presolved LP has the same optimum.
+"""
+import argparse
+import copy
+import csv
+import sys
+import time
+
+from planner import Audit, Planner
+from session import PlanningSession
+
+class Milestones:
+    def __init__(self, planner: Planner):
+        """
+        @param: planner: set to a config, left as it is
+        """
+        self.plans = list(planner.plans)
+
+        # assembled with the targets of the config alone, the plans are added one by one
+        planner = copy.copy(planner)
+        planner.plans = []
+        planner.target_items = Audit({}, planner._all_items)
+        planner.add_target_items(planner.config.get_target_items())
+        self.session = PlanningSession(planner)
+
+    def run(self):
+        """
+        @yield: (plan, days to finish it and all the ones before, nan if infeasible),
+                the plan is None for the `目标道具` of the config
+        """
+        if any(self.session.planner.config.get_target_items().values()):
+            yield None, self.session.solve_days()
+        for plan in self.plans:
+            self.session.add_plan(plan)
+            yield plan, self.session.solve_days()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Days to finish each upgrade target, in the order of the config")
+    parser.add_argument('config', nargs='?', default='config.yaml')
+    parser.add_argument('--csv', help="also write the results to this csv file")
+    args = parser.parse_args(argv)
+
+    beg = time.perf_counter()
+    planner = Planner().set_to_config(args.config)
+    if planner.config['integer_mode']:
+        print("注意：里程碑按线性规划求解，不受 整数规划 影响，天数可能略少于整数方案", file=sys.stderr)
+    milestones = Milestones(planner)
+    results = list(milestones.run())
+    elapsed = time.perf_counter() - beg
+
+    print("    完成天数     新增  提升目标")
+    last_days = 0
+    for ind, (plan, days) in enumerate(results, 1):
+        desc = "目标道具" if plan is None else plan.get_desc()
+        if days != days: # nan
+            print(f"{ind:>2}    无法完成           {desc}")
+            continue
+        print(f"{ind:>2} {days:8.2f} {days - last_days:+8.2f}  {desc}")
+        last_days = days
+    session = milestones.session
+    print(
+        f"{len(results)} 个里程碑，{session.n_warm_solves} 个由上一个的最优基直接得出，"
+        f"{session.n_cold_solves} 个重新求解，共 {elapsed:.2f}s"
+    )
+
+    if args.csv:
+        with open(args.csv, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['official', 'days'])
+            for plan, days in results:
+                writer.writerow(['' if plan is None else plan.official.name, days])
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
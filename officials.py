@@ -1,5 +1,9 @@
 import copy
-from dataclasses import dataclass
+
+from items import ALL_ITEMS
+from util import lazy_import
+
+np = lazy_import('numpy')
 
 def _acc(arr):
     ret = [0, 0] # 0/1 级时拥有经验 = 0；2 级时拥有经验 = arr[0]
@@ -7,12 +11,7 @@ def _acc(arr):
         ret.append(ret[-1] + val)
     return ret
 
-@dataclass
 class Official:
-    elite_level: int = 0
-    level: int = 1
-    skill_levels: int = (1, 1, 1)
-
     name = ''
     eng_name = ''
     stars = 0
@@ -126,6 +125,7 @@ class Official:
                 name = realname
                 break
 
+        register_officials()
         if name in Official._registry:
             return Official._registry[name]
 
@@ -159,6 +159,17 @@ class Official:
                 ret += lv_map[elv][self.level]
         return ret
 
+    def __init__(self, elite_level=0, level=1, skill_levels=(1, 1, 1)):
+        self.elite_level = elite_level
+        self.level = level
+        self.skill_levels = skill_levels
+
+    def __repr__(self):
+        return (
+            f"{type(self).__name__}(elite_level={self.elite_level},"
+            f" level={self.level}, skill_levels={self.skill_levels})"
+        )
+
     def __init_subclass__(subcls, name=None):
         subcls.name = name or subcls.__name__
         Official._registry[subcls.name] = subcls
@@ -172,6 +183,93 @@ class Official:
                 raise ValueError(f"Can not set {k} to {v}")
             self.__dict__[k] = v
 
+    @classmethod
+    def get_max_skill_levels(cls):
+        """
+        @return: list of the max reachable level of each skill
+        """
+        max_levels = []
+        for skill_ind in range(1, cls.n_skills + 1):
+            lv = 1
+            while lv < 10:
+                try:
+                    cls.get_skill_levelup_item(skill_level=lv, skill_ind=skill_ind)
+                except (IndexError, KeyError, ValueError):
+                    break
+                lv += 1
+            max_levels.append(lv)
+        return max_levels
+
+    @classmethod
+    def get_cost_tables(cls):
+        """
+        Cumulative upgrade costs, computed once per official,
+        so that the cost between any two states is a couple of subtractions
+
+        money and exp are kept in raw units, items are vectors over `ALL_ITEMS`
+            elite[e], elite_money[e]: to reach elite level `e` from elite 0
+            level_money[e][lv], level_exp[e][lv]: to reach level `lv` of elite `e` from elite 0 level 1
+            skill[k][lv]: to reach level `lv` of the k-th (0-base) skill from level 1
+        """
+        if '_cost_tables' in cls.__dict__: # not inherited from the base class
+            return cls._cost_tables
+
+        n_items = len(ALL_ITEMS)
+
+        def to_vec(items):
+            vec = np.zeros(n_items)
+            money = 0
+            for item, cnt in items.items():
+                if item == '龙门币':
+                    money += cnt
+                elif item in ALL_ITEMS:
+                    vec[ALL_ITEMS.to_id(item)] += cnt
+                else:
+                    raise ValueError(f"Invalid item: {repr(item)}")
+            return vec, money
+
+        # elite
+        elite = np.zeros((3, n_items))
+        elite_money = np.zeros(3)
+        for e, items in ((1, cls.get_elite_1_item()), (2, cls.get_elite_2_item())):
+            vec, money = to_vec(items)
+            elite[e] = elite[e-1] + vec
+            elite_money[e] = elite_money[e-1] + money
+
+        # level, as plain lists since they are looked up one scalar at a time
+        level_money, level_exp = [], []
+        base_money, base_exp = 0, 0
+        for e in 0, 1, 2:
+            level_money.append([money + base_money for money in cls.MONEY_REQUIRED[e]])
+            level_exp.append([exp + base_exp for exp in cls.EXP_REQUIRED[e]])
+            try:
+                lv_cap = cls.get_level_cap(elite_level=e, stars=cls.stars)
+            except KeyError: # can not be promoted any further
+                break
+            base_money += cls.MONEY_REQUIRED[e][lv_cap]
+            base_exp += cls.EXP_REQUIRED[e][lv_cap]
+
+        # skill
+        max_skill_levels = cls.get_max_skill_levels()
+        skill = np.zeros((max(cls.n_skills, 1), 11, n_items))
+        for k, max_lv in enumerate(max_skill_levels):
+            for lv in range(1, max_lv):
+                vec, _ = to_vec(cls.get_skill_levelup_item(skill_level=lv, skill_ind=k+1))
+                skill[k, lv+1] = skill[k, lv] + vec
+
+        cls._cost_tables = {
+            'elite': elite,
+            'elite_money': elite_money,
+            'level_money': level_money,
+            'level_exp': level_exp,
+            'skill': skill,
+            # valid indexes are below these
+            'n_elite': len(level_money),
+            'n_level': [len(lv_map) for lv_map in level_money],
+            'n_skill_level': [max_lv + 1 for max_lv in max_skill_levels],
+        }
+        return cls._cost_tables
+
 
 class official_upgrade_items_calculator:
     def __init__(self, official_cls):
@@ -186,58 +284,112 @@ class official_upgrade_items_calculator:
         return self
 
     def to(self, elite_level, level, skill_level):
+        """
+        @return: dict of the required items
+        """
+        vec = self.to_vec(elite_level, level, skill_level)
+        money_id, exp_id = self._unit_ids
+        return {
+            **{
+                ALL_ITEMS.to_name(ind): vec[ind]
+                for ind in np.flatnonzero(vec)
+                if ind not in (money_id, exp_id)
+            },
+            '1k龙门币': vec[money_id],
+            '1k经验值': vec[exp_id],
+        }
+
+    def to_vec(self, elite_level, level, skill_level):
+        """
+        @return: vector of the required items over `ALL_ITEMS`
+        """
         if isinstance(skill_level, int):
             skill_level = [skill_level] * self.official.n_skills
         self.end.update(elite_level=elite_level, level=level, skill_levels=skill_level)
         return self._calculate()
 
+    def validate(self, elite_level, level, skill_level):
+        """
+        Checks a state against the official's data in pure python, without building the cost tables
+        """
+        off = self.official
+        if elite_level not in (0, 1, 2):
+            raise ValueError(f"{off.name}: invalid elite level {elite_level}")
+        for e in range(elite_level):
+            try:
+                off.get_level_cap(elite_level=e, stars=off.stars)
+            except KeyError:
+                raise ValueError(f"{off.name}: can not reach elite level {elite_level}") from None
+        if not 1 <= level < len(off.EXP_REQUIRED[elite_level]):
+            raise ValueError(f"{off.name}: invalid level {level} at elite level {elite_level}")
+
+        if isinstance(skill_level, int):
+            skill_level = [skill_level] * off.n_skills
+        max_levels = off.get_max_skill_levels()
+        if len(skill_level) > len(max_levels):
+            raise ValueError(f"{off.name} has only {len(max_levels)} skills")
+        for lv, max_lv in zip(skill_level, max_levels):
+            if not 1 <= lv <= max_lv:
+                raise ValueError(f"{off.name}: invalid skill level {lv}, should be within 1 ~ {max_lv}")
+        return self
+
+    @property
+    def _unit_ids(self):
+        return ALL_ITEMS.to_id('1k龙门币'), ALL_ITEMS.to_id('1k经验值')
+
     def _calculate(self):
-        result = {'龙门币': 0, '经验值': 0}
-        def update_result(data_dict):
-            for k, v in data_dict.items():
-                if k in result:
-                    result[k] += v
-                else:
-                    result[k] = v
+        tables = self.official.get_cost_tables()
+        name = self.official.name
+
+        def check_level(elite_level, level):
+            if not 0 <= elite_level < tables['n_elite'] or not 0 <= level < tables['n_level'][elite_level]:
+                raise ValueError(f"{name}: unreachable level {level} at elite level {elite_level}")
+
+        def skill_cost(k, lv_beg, lv_end):
+            if lv_end <= lv_beg:
+                return 0
+            if k >= len(tables['n_skill_level']):
+                raise ValueError(f"{name} has only {self.official.n_skills} skills")
+            if not 0 < lv_beg < lv_end < tables['n_skill_level'][k]:
+                raise ValueError(f"{name}: unreachable skill level {lv_end}")
+            return tables['skill'][k, lv_end] - tables['skill'][k, lv_beg]
 
         # elite_level
-        vbeg, vend = [getattr(off, 'elite_level') for off in (self.beg, self.end)]
-        if vbeg < 1 <= vend:
-            update_result(self.beg.get_elite_1_item())
-        if vbeg < 2 <= vend:
-            update_result(self.beg.get_elite_2_item())
+        vbeg, vend = self.beg.elite_level, self.end.elite_level
+        for v in vbeg, vend:
+            check_level(v, 0)
+        vend = max(vbeg, vend)
+        result = tables['elite'][vend] - tables['elite'][vbeg]
+        money = tables['elite_money'][vend] - tables['elite_money'][vbeg]
 
         # level
         cap = lambda val: 0 if val < 0 else val
 
-        update_result({
-           '龙门币': cap(self.end.get_cur_level_money() - self.beg.get_cur_level_money()),
-           '经验值': cap(self.end.get_cur_level_exp() - self.beg.get_cur_level_exp()),
-        })
+        beg, end = (self.beg.elite_level, self.beg.level), (self.end.elite_level, self.end.level)
+        check_level(*beg)
+        check_level(*end)
+        money += cap(tables['level_money'][end[0]][end[1]] - tables['level_money'][beg[0]][beg[1]])
+        exp = cap(tables['level_exp'][end[0]][end[1]] - tables['level_exp'][beg[0]][beg[1]])
 
         # skill level
-        vbeg, vend = [getattr(off, 'skill_levels') for off in (self.beg, self.end)]
-        gsli = self.official.get_skill_levelup_item
+        # NOTE: levels below 7 are shared by all skills, they are looked up in the first skill
+        vbeg, vend = self.beg.skill_levels, self.end.skill_levels
 
         if max(vbeg) <= 7:
             if max(vend) <= 7:
-                for lv in range(vbeg[0], vend[0]):
-                    update_result(gsli(skill_level=lv))
+                result += skill_cost(0, vbeg[0], vend[0])
             else:
-                for lv in range(vbeg[0], 7):
-                    update_result(gsli(skill_level=lv))
-
+                result += skill_cost(0, vbeg[0], 7)
                 for ind, ve in enumerate(vend):
-                    for lv in range(7, ve):
-                        update_result(gsli(skill_level=lv, skill_ind=ind+1))
+                    result += skill_cost(ind, 7, ve)
         else:
             for ind, (vb, ve) in enumerate(zip(vbeg, vend)):
-                for lv in range(vb, ve):
-                    update_result(gsli(skill_level=lv, skill_ind=ind+1))
+                result += skill_cost(ind, vb, ve)
 
         # covert unit
-        result['1k龙门币'] = result.pop('龙门币') / 1000
-        result['1k经验值'] = result.pop('经验值') / 1000
+        money_id, exp_id = self._unit_ids
+        result[money_id] += money / 1000
+        result[exp_id] += exp / 1000
 
         return result
 
@@ -251,6 +403,11 @@ class Officials:
     def get_official(official_name):
         return Official.get_official_by_name(official_name)
 
+    @staticmethod
+    def get_all_officials():
+        register_officials()
+        return list(Official._registry.values())
+
 ##########################
 # Demo officials
 ##########################
@@ -301,11 +458,15 @@ class Demo初雪(Official):
 
 
 import json
-import os
 import re
-from util import ROOT
 
-def register_official(data):
+import snapshot
+
+def parse_official(data):
+    """
+    @param: data: a line of the crawler result
+    @return: the class attributes of the official
+    """
     skill_names = []
     for skill_levelup_title in data['技能升级']:
         if re.match(r'(.*) [0-9]+→[0-9]+', skill_levelup_title):
@@ -331,27 +492,36 @@ def register_official(data):
             items = {k: int(v.strip(',')) for k, v in items.items()}
             _skill_levelup_items[-1].append(items)
 
-    class new_official(Official, name=data['name']):
-        name = data['name']
-        eng_name = data['eng_name']
-        stars = int(data['星级'])
-        elite_1_items = data['精英化'].get('1', {})
-        elite_2_items = data['精英化'].get('2', {})
-        n_skills = len(skill_names)
-        skill_levelup_items = _skill_levelup_items
+    return {
+        'name': data['name'],
+        'eng_name': data['eng_name'],
+        'stars': int(data['星级']),
+        'elite_1_items': data['精英化'].get('1', {}),
+        'elite_2_items': data['精英化'].get('2', {}),
+        'n_skills': len(skill_names),
+        'skill_levelup_items': _skill_levelup_items,
+    }
 
-    return new_official
+def parse_officials(path=snapshot.OFFICIAL_PATH):
+    with open(path, "r") as f:
+        return [parse_official(json.loads(line)) for line in f]
 
-def register_officials():
-    # CRAWLER_PATH = os.path.join(ROOT, "crawlers/results/officials.jl")
-    CRAWLER_PATH = "crawlers/results/officials.jl"
+def register_official(attrs):
+    return type(attrs['name'], (Official, ), dict(attrs), name=attrs['name'])
 
-    with open(CRAWLER_PATH, "r") as f:
-        for line in f:
-            data = json.loads(line)
-            register_official(data)
+_registered = False
 
-register_officials()
+def register_officials():
+    """
+    Registers the officials from the crawler results, on first use instead of on import
+    """
+    global _registered
+    if _registered:
+        return
+    _registered = True
+
+    for attrs in snapshot.load('officials', parse_officials, [snapshot.OFFICIAL_PATH]):
+        register_official(attrs)
 
 if __name__ == '__main__':
     print(Officials.get_required_items_for('初雪').since(
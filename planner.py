@@ -1,35 +1,158 @@
+from array import array
+import argparse
+import copy
 import os
 import time
 import sys
 import re
-from collections import defaultdict
-from dataclasses import dataclass
 
-import numpy as np
-import scipy.optimize
-import yaml
-
-from items import ALL_ITEMS, TRADE_PATHS, TradePath
+import items
+from items import ALL_ITEMS, TradePath
 from officials import Officials
-from util import ROOT
+from util import ROOT, lazy_import
+import profiling
+import snapshot
+
+# heavy modules are only imported once a plan is actually solved
+np = lazy_import('numpy')
+sparse = lazy_import('scipy.sparse')
+integer_programming = lazy_import('integer_programming')
+presolve = lazy_import('presolve')
+renderers = lazy_import('renderers')
+result_cache = lazy_import('result_cache')
+solvers = lazy_import('solvers')
+yaml = lazy_import('yaml')
 
 REPORT_PATH = os.path.join(ROOT, 'reports')
 
-class Audit(dict):
+class Audit:
+    """
+    Counts of items, stored as a float64 vector aligned with `all_items`,
+    behind a dict-like interface. Items with a zero count are treated as absent.
+
+    NOTE: as before, `update` (and `+=`) adds to the counts instead of overwriting them
+    """
     def __init__(self, items: dict, all_items: list):
-        super().__init__(items)
         self._all_items = all_items
+        self._name_to_id = getattr(all_items, 'name_to_id', None) \
+            or {name: ind for ind, name in enumerate(all_items)}
+        self._vec = np.zeros(len(all_items))
+        self.update(items)
+
+    @classmethod
+    def from_vec(cls, vec, all_items: list):
+        audit = cls({}, all_items)
+        audit._vec[:] = vec
+        return audit
+
+    def _to_id(self, item):
+        try:
+            return self._name_to_id[item]
+        except KeyError:
+            raise ValueError(f"Invalid item: {repr(item)}") from None
+
+    def _as_vec(self, other):
+        if isinstance(other, Audit):
+            if other._all_items is not self._all_items:
+                raise ValueError("Audits over different item collections")
+            return other._vec
+        if isinstance(other, dict):
+            return Audit(other, self._all_items)._vec
+
+        vec = np.asarray(other, dtype=float)
+        if vec.shape != self._vec.shape:
+            raise ValueError(f"Expected a vector of shape {self._vec.shape}, got {vec.shape}")
+        return vec
 
+    ##########################
+    # Vector access
+    ##########################
     def to_vec(self):
-        return np.array([self.get(k, 0.0) for k in self._all_items])
+        """
+        @return: the underlying vector (not a copy), indexed like `all_items`
+        """
+        return self._vec
+
+    def copy(self):
+        return Audit.from_vec(self._vec, self._all_items)
+
+    def __add__(self, other):
+        return Audit.from_vec(self._vec + self._as_vec(other), self._all_items)
+
+    def __sub__(self, other):
+        return Audit.from_vec(self._vec - self._as_vec(other), self._all_items)
+
+    def __iadd__(self, other):
+        self._vec += self._as_vec(other)
+        return self
+
+    def __isub__(self, other):
+        self._vec -= self._as_vec(other)
+        return self
+
+    ##########################
+    # Dict-like access
+    ##########################
+    def __getitem__(self, item):
+        return self._vec[self._to_id(item)]
+
+    def __setitem__(self, item, cnt):
+        self._vec[self._to_id(item)] = cnt
+
+    def __delitem__(self, item):
+        self._vec[self._to_id(item)] = 0.0
+
+    def __contains__(self, item):
+        ind = self._name_to_id.get(item)
+        return ind is not None and self._vec[ind] != 0
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return int(np.count_nonzero(self._vec))
+
+    def __eq__(self, other):
+        try:
+            return bool((self._vec == self._as_vec(other)).all())
+        except ValueError:
+            return NotImplemented
 
-    def update(self, items: dict):
-        for k, v in items.items():
-            if k not in self._all_items:
-                raise ValueError(f"Invalid item: {repr(k)}")
+    def __repr__(self):
+        return f"Audit({self.to_dict()})"
 
-            self.setdefault(k, 0.0)
-            self[k] += v
+    def get(self, item, default=None):
+        ind = self._name_to_id.get(item)
+        if ind is None or self._vec[ind] == 0:
+            return default
+        return self._vec[ind]
+
+    def setdefault(self, item, default=0.0):
+        if item not in self:
+            self[item] = default
+        return self[item]
+
+    def keys(self):
+        return [self._all_items[ind] for ind in np.flatnonzero(self._vec)]
+
+    def values(self):
+        return self._vec[self._vec != 0].tolist()
+
+    def items(self):
+        return [(self._all_items[ind], float(self._vec[ind])) for ind in np.flatnonzero(self._vec)]
+
+    def to_dict(self):
+        return dict(self.items())
+
+    def clear(self):
+        self._vec[:] = 0.0
+
+    def update(self, items):
+        if isinstance(items, dict):
+            for k, v in items.items():
+                self._vec[self._to_id(k)] += v
+        else:
+            self._vec += self._as_vec(items)
 
 class Plan:
     def __init__(self, official_name, since, to):
@@ -63,6 +186,23 @@ class Plan:
             .to(**self.to)
         )
 
+    def get_required_vec(self):
+        """
+        @return: the required items as a vector over `ALL_ITEMS`
+        """
+        return (
+            Officials
+            .get_required_items_for(self.official.name)
+            .since(**self.since)
+            .to_vec(**self.to)
+        )
+
+    def validate(self):
+        calculator = Officials.get_required_items_for(self.official.name)
+        calculator.validate(**self.since)
+        calculator.validate(**self.to)
+        return self
+
     def get_desc(self, with_required_items=False):
         ch_space = '\u3000'
 
@@ -108,20 +248,40 @@ class PlannerConfig(dict):
 
         'display_plan_item_requirement': False,
         'display_path_item_change': False,
+
+        'integer_mode': False,
+        'integer_time_limit': 2.0,
+
+        'display_item_value': False,
+        'display_path_efficiency': False,
+
+        'presolve': False,
+        'result_cache': True,
+
+        'solver': 'highs',
+        'solver_time_limit': None,
     }
 
+    # backends of `solvers.BACKENDS`, listed here so that parsing a config does not import scipy
+    SOLVERS = ('highs', 'highs-ds', 'highs-ipm', 'mps', 'auto')
+
     REG_ELITE_LV = r'^(精[一二])?\s*([1-9]([0-9]+)?)\s*级$'
 
     def __init__(self):
-        super().__init__(self.default)
+        # deep copy, or the `plans` list would be shared among all configs
+        super().__init__(copy.deepcopy(self.default))
 
+    @profiling.spanned('load_config')
     def update_with_file(self, file):
         with open(file, 'r') as f:
             self.update_with_string(f.read())
         return self
 
+    @profiling.spanned('parse_config')
     def update_with_string(self, string):
-        config = yaml.load(string, Loader=yaml.FullLoader)
+        # the libyaml loader, when available, is much faster than the pure python one
+        with profiling.span('yaml'):
+            config = yaml.load(string, Loader=getattr(yaml, 'CSafeLoader', yaml.SafeLoader))
 
         # set config
         config_basic = config.get('规划设置', {})
@@ -129,10 +289,18 @@ class PlannerConfig(dict):
             'ap_recovery_per_day': '每日回体',
             'infra_money_per_day': '每日基建龙门币',
             'infra_midexpbook_per_day': '每日基建中级作战录像',
+            'integer_time_limit': '整数规划时限',
+            'solver_time_limit': '求解时限',
         }.items():
             if yaml_key in config_basic:
                 self[config_key] = float(config_basic.get(yaml_key))
 
+        if '求解器' in config_basic:
+            solver = str(config_basic['求解器'])
+            if solver not in self.SOLVERS:
+                raise ValueError(f"Unrecognized value for 求解器: {solver}, valid: {'/'.join(self.SOLVERS)}")
+            self['solver'] = solver
+
         if '禁用规划路径' in config_basic:
             dps = config_basic.get('禁用规划路径') or ''
             self['disabled_path_keywords'] = dps.split()
@@ -145,6 +313,11 @@ class PlannerConfig(dict):
         for config_key, yaml_key in {
             'display_plan_item_requirement': '显示提升目标消耗',
             'display_path_item_change': '显示路径材料变化',
+            'integer_mode': '整数规划',
+            'display_item_value': '显示材料价值',
+            'display_path_efficiency': '显示路径效率',
+            'presolve': '预处理',
+            'result_cache': '缓存结果',
         }.items():
             if yaml_key in config_basic:
                 if config_basic[yaml_key] == '是':
@@ -158,11 +331,11 @@ class PlannerConfig(dict):
                     )
 
         # load cur item
-        self['cur_items'] = self.parse_item_dict(config.get('持有道具', {}))
+        self['cur_items'] = self.parse_item_dict(config.get('持有道具') or {})
         self['cur_items']['1d'] = self['MAX_PLAN_DAYS']
 
         # load target items
-        self['target_items'] = self.parse_item_dict(config.get('目标道具', {}))
+        self['target_items'] = self.parse_item_dict(config.get('目标道具') or {})
 
         # load plans
         for plan in config['提升目标']:
@@ -225,20 +398,20 @@ class PlannerConfig(dict):
             '理智': self['ap_recovery_per_day'],
             '1k龙门币': self['infra_money_per_day'] / 1000,
             '中级作战记录': self['infra_midexpbook_per_day']
-        }, "自然恢复 1 天")
+        }, items.DAILY_RECOVERY_TAG)
 
     def get_tradepaths(self):
-        if self['disabled_path_keywords']:
-            dps = self['disabled_path_keywords']
-            paths = [
-                path for path in TRADE_PATHS
-                if all(dp not in path.tag for dp in dps)
-            ]
-        else:
-            paths = list(TRADE_PATHS)
-
-        paths.append(self.get_tradepath_for_daily_recovery())
-        return paths
+        """
+        The static paths, with the daily recovery of the config in place of the default one,
+        at the same index: the order of the columns decides which of the equally good plans the solver gives
+        """
+        dps = self['disabled_path_keywords'] or ()
+        recovery = self.get_tradepath_for_daily_recovery()
+        return [
+            recovery if path.tag == items.DAILY_RECOVERY_TAG else path
+            for path in items.TRADE_PATHS
+            if path.tag == items.DAILY_RECOVERY_TAG or all(dp not in path.tag for dp in dps)
+        ]
 
     def get_cur_items(self):
         return self['cur_items']
@@ -250,8 +423,8 @@ class PlannerConfig(dict):
         return self['plans']
 
 class Planner:
-    def __init__(self, all_items = ALL_ITEMS, all_paths = TRADE_PATHS):
-        self._all_paths = list(TRADE_PATHS)
+    def __init__(self, all_items = ALL_ITEMS, all_paths = None):
+        self._all_paths = list(items.TRADE_PATHS if all_paths is None else all_paths)
         self._all_items = all_items
 
         self.cur_items = Audit({}, self._all_items)
@@ -292,7 +465,7 @@ class Planner:
     def add_plan(self, *plans):
         self.plans.extend(plans)
         for plan in plans:
-            self.add_target_items(plan.get_required_items())
+            self.target_items += plan.get_required_vec()
         return self
 
     def set_to_config(self, config):
@@ -305,6 +478,7 @@ class Planner:
         self._update_according_to_config()
         return self
 
+    @profiling.spanned('apply_config')
     def _update_according_to_config(self):
         self._all_paths = self.config.get_tradepaths()
 
@@ -315,127 +489,262 @@ class Planner:
 
         self.target_items.clear()
         self.add_target_items(self.config.get_target_items())
-        for plan in self.plans:
-            self.add_target_items(plan.get_required_items())
+        with profiling.span('aggregate_targets'):
+            for plan in self.plans:
+                self.target_items += plan.get_required_vec()
 
     ##########################
     # Core Logic
     ##########################
-    def _linear_programming(self, c, A_ub, b_ub):
+    @profiling.spanned('linprog')
+    def _linear_programming(self, c, A_ub, b_ub, bounds=(0, None), with_duals=False, with_status=False, limited=True):
         """
         Minimize c @ x
         s.t. A_ub @x <= b_ub
+             lb <= x <= ub
 
         @param: c: N-d vector
-        @param: A_ub: M x N matrix
+        @param: A_ub: M x N sparse matrix
         @param: b_ub: M-d vector
-        @return: x: N-d vector
+        @param: bounds: (lb, ub) for all, or a list of N (lb, ub) pairs
+        @param: with_duals: also return the marginals of `A_ub`, i.e. d(c @ x) / d(b_ub)
+        @param: with_status: also return whether x is optimal, a feasible x found before
+                             the time limit is then returned rather than None
+        @param: limited: within `求解时限`, if set
+        @return: x: N-d vector (None if there is no optimal one),
+                 followed by marginals: M-d vector if `with_duals`, and optimal: bool if `with_status`
         """
-        # optim_ret = scipy.optimize.linprog(method='simplex', c=c, A_ub=A_ub, b_ub=b_ub, options={'tol':1e-3})
-        optim_ret = scipy.optimize.linprog(c=c, A_ub=A_ub, b_ub=b_ub)
-        return optim_ret.x
-
-    def _integer_linear_programming(self, c, A_ub, b_ub):
-        """too slow, discarded"""
-        # problem = pulp.LpProblem("<min_purchase>", pulp.LpMinimize)
-        # path_cnt = pulp.LpVariable.dicts("path_cnt", range(P), 0, 10, pulp.LpInteger)
-        # overflow = pulp.LpVariable.dicts("overflow", range(M), 0, 1000)
+        ret = self.get_solver(limited).solve(c, A_ub, b_ub, bounds)
+        x = ret.x if ret.optimal or with_status else None
+        if not (with_duals or with_status):
+            return x
+        return (x, *([ret.marginals] if with_duals else []), *([ret.optimal] if with_status else []))
 
-        # problem += pulp.lpDot(overflow.values(), overflow_punishment)
-
-        # for m_ind in range(M):
-        #     problem += pulp.lpDot(
-        #         path_cnt.values(),
-        #         path_gain[m_ind]
-        #     ) == material_target[m_ind] + overflow[m_ind]
+    def get_solver(self, limited=True):
+        """
+        @param: limited: within `求解时限`, if set
+        @return: the `solvers.Solver` of `求解器` and `求解时限`, e.g. for solving in other processes
+        """
+        time_limit = self.config['solver_time_limit'] if limited else None
+        return solvers.get_solver(self.config['solver'], time_limit=time_limit)
 
-        # problem.solve()
+    @profiling.spanned('integer_programming')
+    def _integer_linear_programming(self, c, A_ub, b_ub, bounds=(0, None), integral=None, limited=True):
+        """
+        The same as `_linear_programming`, but the paths of positive `integral` rank
+        are repeated a whole number of times, every LP solved by the backend of `求解器`
 
-        # for i in range(P):
-        #     if path_cnt[i].varValue > 0:
-        #         print(f"{path_cnt[i].varValue}: {self._all_paths[i]}")
+        @return: integer_programming.IntegerSolution
+        """
+        return integer_programming.solve(
+            c, A_ub, b_ub, bounds, integral,
+            time_limit=self.config['integer_time_limit'], solver=self.get_solver(limited),
+        )
 
-        # for m in range(M):
-        #     if overflow[m].varValue > 0:
-        #         print(f"Item {ITEMS.to_name(m)} overflow: {overflow[m].varValue}")
+    def get_integral_rank(self):
+        """
+        Stages and crafts are repeated a whole number of times, the others (e.g. the daily recovery,
+        the tasks and the shops, whose stocks are averaged per day anyway) are not.
+        Crafts rank higher, so they are rounded before the stages feeding them.
+        """
+        return np.array([
+            2 if path.tag == '加工站' else 1 if '理智' in path.src else 0
+            for path in self._all_paths
+        ], dtype=int)
 
-    def get_path_return_matrix(self):
+    @profiling.spanned('path_return_matrix')
+    def get_path_return_matrix(self, paths=None):
         """
         mat[i][j] means the gain of i-th item by executing the j-th path once
         positive the we gain the item, negative if the item is consumed
+
+        returned as a sparse (csc) matrix
+        @param: paths: defaults to all paths of the planner
         """
-        mat = np.zeros((self.n_items, self.n_paths))
+        if paths is None:
+            paths = self._all_paths
 
-        for p_ind, path in enumerate(self._all_paths):
-            for item, cost in path.src.items():
-                i_ind = self._all_items.to_id(item)
-                mat[i_ind][p_ind] -= cost
+        if self._all_items is ALL_ITEMS:
+            return get_static_path_matrix().get_matrix(self, paths)
+        return self.build_path_return_matrix(paths)
+
+    def build_path_return_matrix(self, paths):
+        """
+        the same as `get_path_return_matrix`, but built from scratch
+        duplicated entries are summed up
+        """
+        rows, cols, vals = array('H'), array('l'), array('d')
 
-            for item, gain in path.dst.items():
-                i_ind = self._all_items.to_id(item)
-                mat[i_ind][p_ind] += gain
+        for p_ind, path in enumerate(paths):
+            if self._all_items is ALL_ITEMS:
+                rows.extend(path.ids)
+            else:
+                rows.extend(self._all_items.to_id(ALL_ITEMS.to_name(ind)) for ind in path.ids)
+            cols.extend([p_ind] * len(path.ids))
+            vals.extend(path.returns)
 
-        return mat
+        return sparse.csc_matrix(
+            (np.asarray(vals), (np.asarray(rows), np.asarray(cols))),
+            shape=(self.n_items, len(paths)),
+        )
 
-    def get_path_limit_matrixes(self):
-        pl_A, pl_b = [], []
-        path_limits = {'A_ub': pl_A, 'b_ub': pl_b}
+    @profiling.spanned('path_limit_matrixes')
+    def get_path_limit_matrixes(self, path_return=None):
+        """
+        `max_cnt` caps become variable bounds,
+        `max_cnt_per_day` caps become rows of `A_ub`: cnt - max_cnt_per_day * days <= 0,
+        the days being the `1d` consumed by all the paths (i.e. the daily recoveries)
 
-        ind_for_1day = self._all_items.to_id('1d')
-        zero_vec = [0] * self.n_paths
+        @param: path_return: from `get_path_return_matrix`, built if not given
+        """
+        rows, cols, vals, pl_b = [], [], [], []
+        bounds = [(0, None)] * self.n_paths
 
-        def onehot(ind):
-            vec = zero_vec[:]
-            vec[ind] = 1
-            return vec
+        if path_return is None:
+            path_return = self.get_path_return_matrix()
+        day_use = sparse.csr_matrix(path_return[self._all_items.to_id('1d')]).minimum(0)
+        day_cols, day_vals = day_use.indices.tolist(), day_use.data.tolist() # -1d per run
 
         for p_ind, path in enumerate(self._all_paths):
             if path.max_cnt:
-                pl_A.append(onehot(p_ind))
-                pl_b.append(path.max_cnt)
+                bounds[p_ind] = (0, path.max_cnt)
             if path.max_cnt_per_day:
-                pl_A.append(onehot(p_ind))
-                pl_A[-1][ind_for_1day] = -path.max_cnt_per_day
+                row = len(pl_b)
+                rows += [row] * (1 + len(day_cols))
+                cols += [p_ind, *day_cols]
+                vals += [1, *(path.max_cnt_per_day * val for val in day_vals)]
                 pl_b.append(0)
 
-        return path_limits
+        pl_A = sparse.csr_matrix((vals, (rows, cols)), shape=(len(pl_b), self.n_paths))
+        return {'A_ub': pl_A, 'b_ub': np.array(pl_b, dtype=float), 'bounds': bounds}
 
-    def deduce(self):
-        # minimize 理智 = sum( apcost of a path * repeated time of the path )
-        # s.t. sum( gain of a path * repeated time of the path ) >= target - cur
+    @profiling.spanned('assemble')
+    def get_linprog_args(self):
+        """
+        minimize 理智 = sum( apcost of a path * repeated time of the path )
+        s.t. sum( gain of a path * repeated time of the path ) >= target - cur
 
+        @return: dict of `c`, `A_ub`, `b_ub`, `bounds` for `_linear_programming`,
+                 and the `path_return` matrix for the report
+        """
         P, I = self.n_paths, self.n_items
 
         path_return = self.get_path_return_matrix()
-        target_items = self.target_items.to_vec() - self.cur_items.to_vec()
+        target_items = (self.target_items - self.cur_items).to_vec()
 
         assert path_return.shape == (I, P)
         assert target_items.shape == (I, )
 
         # add constraints for daily limit & max limit
-        path_limits = self.get_path_limit_matrixes()
+        path_limits = self.get_path_limit_matrixes(path_return)
 
         # construct path weights s.t.
         # argmin path_weight @ path_cnt
         # = argmax timecost @ path_return @ path_cnt
         # = argmax timecost @ item_obtained
-        # = argmax timecost @ item_obtained
         # = argmax 0.1 * obtained item '1d'
         timecost = np.zeros(target_items.size)
         timecost[self._all_items.to_id('1d')] = 10
-        path_weight = -(timecost @ path_return)
+        path_weight = -(path_return.T @ timecost)
 
         # construct linprog parameters
-        A_ub = np.vstack([-path_return, path_limits['A_ub']]) # shape: (I+alpha, P)
+        A_ub = sparse.vstack([-path_return, path_limits['A_ub']], format='csr') # shape: (I+alpha, P)
         b_ub = np.hstack([-target_items, path_limits['b_ub']]) # shape: (I+alpha, )
 
-        path_cnt = self._linear_programming(c=path_weight, A_ub=A_ub, b_ub=b_ub)
+        return {
+            'c': path_weight,
+            'A_ub': A_ub,
+            'b_ub': b_ub,
+            'bounds': path_limits['bounds'],
+            'path_return': path_return,
+        }
+
+    @profiling.spanned('deduce')
+    def deduce(self):
+        # the same problem solved before, see `result_cache.py`
+        cache = result_cache.get_default() if self.config['result_cache'] else None
+        if cache is not None:
+            with profiling.span('cache_lookup'):
+                key = cache.get_key(self)
+                solution = cache.get(key)
+            if solution is not None:
+                self._scheme = Scheme(self, path_return=self.get_path_return_matrix(), **solution)
+                return
+
+        args = self.get_linprog_args()
+        path_return = args.pop('path_return')
+
+        solve_args, presolved = args, None
+        if self.config['presolve']:
+            with profiling.span('presolve'):
+                presolved = presolve.presolve(dominance=not self.config['integer_mode'], **args)
+            solve_args = presolved.args
+
+        integral = None
+        if self.config['integer_mode']:
+            integral = self.get_integral_rank()
+            if presolved is not None:
+                integral = presolved.reduce_cols(integral)
+
+        def solve(limited):
+            if integral is not None:
+                solution = self._integer_linear_programming(integral=integral, limited=limited, **solve_args)
+                return solution, solution.x, solution.marginals, True
+            return (None, *self._linear_programming(
+                with_duals=True, with_status=True, limited=limited, **solve_args,
+            ))
+
+        solution, path_cnt, marginals, lp_optimal = solve(limited=True)
+        # nothing feasible found within `求解时限`: solved again without it,
+        # so that no plan only ever means the targets can not be reached
+        if path_cnt is None and self.config['solver_time_limit'] is not None:
+            print(f"求解时限 {self.config['solver_time_limit']}s 内未找到可行方案，不限时重新求解", file=sys.stderr)
+            solution, path_cnt, marginals, lp_optimal = solve(limited=False)
+
+        if presolved is not None:
+            path_cnt, marginals = presolved.expand_x(path_cnt), presolved.expand_marginals(marginals)
+
+        self._scheme = Scheme(
+            self, path_cnt, path_return, integer_solution=solution,
+            duals=self.get_duals(args, marginals), presolved=presolved, lp_optimal=lp_optimal,
+        )
+        # a plan cut short by the time limit is not the answer to the problem
+        if cache is not None and path_cnt is not None and lp_optimal:
+            with profiling.span('cache_store'):
+                cache.put(key, result_cache.pack_solution(self._scheme))
+
+    @profiling.spanned('duals')
+    def get_duals(self, linprog_args, marginals):
+        """
+        Prices everything in 理智 from the duals of the solve, no extra solving needed
+
+        @param: linprog_args: from `get_linprog_args`
+        @param: marginals: of `A_ub`, as returned by `_linear_programming`
+        @return: dict of
+            item_values: I-d vector, 理智 saved by having one more of each item
+            path_reduced_costs: P-d vector, 理智 lost by executing each path once more,
+                0 for the paths in use, > 0 for the ones not worth it
+        """
+        if marginals is None:
+            return None
+
+        # marginals are in units of the objective (0.1 day),
+        # converted by the price of 理智 itself, or by the daily recovery if it is free
+        unit = -marginals[self._all_items.to_id('理智')]
+        if unit <= 0:
+            unit = 10 / self.config['ap_recovery_per_day']
+
+        item_values = -marginals[:self.n_items] / unit
+        reduced_costs = (linprog_args['c'] - linprog_args['A_ub'].T @ marginals) / unit
+        for vec in item_values, reduced_costs:
+            vec[abs(vec) < 1e-7] = 0.0 # solver noise, or it would print as -0.00
 
-        self._scheme = Scheme(self, path_cnt, path_return)
+        return {'item_values': item_values, 'path_reduced_costs': reduced_costs}
 
     ##########################
     # Result Reporter
     ##########################
+    @profiling.spanned('report')
     def generate_report(self, file=None):
         if file is None:
             file = self.config['output_path']
@@ -451,23 +760,66 @@ class Planner:
         self.generate_report(sys.stdout)
         return self
 
-@dataclass
-class Scheme:
-    planner: Planner
-    path_cnt: np.array
-    path_return: np.array
+class StaticPathMatrix:
+    """
+    Path return matrix of the static `TRADE_PATHS`, compiled into the snapshot.
+    Planners pick their columns from it, only the paths unknown to it
+    (e.g. the daily recovery from the config) are built on the fly.
+    """
+    def __init__(self, paths, mat):
+        self._paths = list(paths) # keep them alive, so that the ids stay valid
+        self._index = {id(path): ind for ind, path in enumerate(self._paths)}
+        self._mat = mat
+
+    def get_matrix(self, planner, paths):
+        known = [self._index.get(id(path)) for path in paths]
+        known_inds = [ind for ind in known if ind is not None]
+        extra_paths = [path for path, ind in zip(paths, known) if ind is None]
+
+        mat = self._mat[:, known_inds]
+        if extra_paths:
+            extra = planner.build_path_return_matrix(extra_paths)
+            mat = sparse.hstack([mat, extra], format='csc')
+
+        # columns are now ordered as [known..., extra...], put them back in place
+        order = np.argsort([ind is None for ind in known], kind='stable')
+        return mat[:, np.argsort(order)]
+
+_STATIC_PATH_MATRIX = None
+
+def get_static_path_matrix():
+    global _STATIC_PATH_MATRIX
+    if _STATIC_PATH_MATRIX is None:
+        mat = snapshot.load(
+            'path_return',
+            lambda: Planner(ALL_ITEMS).build_path_return_matrix(items.TRADE_PATHS),
+            [snapshot.DROPRATE_PATH, os.path.join(ROOT, 'items.py'), os.path.join(ROOT, 'events.py')],
+        )
+        _STATIC_PATH_MATRIX = StaticPathMatrix(items.TRADE_PATHS, mat)
+    return _STATIC_PATH_MATRIX
 
+class Scheme:
+    def __init__(self, planner: Planner, path_cnt: 'np.ndarray', path_return: 'sparse.spmatrix',
+                 integer_solution=None, duals=None, presolved=None, lp_optimal=True):
+        self.planner = planner
+        self.path_cnt = path_cnt
+        self.path_return = path_return
+        self.integer_solution = integer_solution
+        self.duals = duals
+        self.presolved = presolved
+        self.lp_optimal = lp_optimal # False if the LP was cut short by `求解时限`
+
+    # dense (C-ordered) copies keep the summation order, thus the report, stable
     def get_obtained_items(self):
-        path_gain = self.path_return.copy()
-        path_gain[path_gain < 0] = 0
+        path_gain = self.path_return.maximum(0).toarray(order='C')
         return path_gain @ self.path_cnt
 
     def get_consumed_items(self):
-        path_cons = self.path_return.copy()
-        path_cons[path_cons > 0] = 0
+        path_cons = self.path_return.minimum(0).toarray(order='C')
         return -path_cons @ self.path_cnt
 
-    def get_desc_for_path(self, path):
+    @staticmethod
+    def get_desc_for_path(path):
         d = lambda dict: list(dict)[0]
 
         if path.tag == '喂经验':
@@ -483,111 +835,64 @@ class Scheme:
 
         return path.tag
 
-    def get_item_detail_for_path(self, path, path_cnt):
-        detail = {'gain': '', 'cost': ''}
-        items = defaultdict(lambda: 0.0)
-
-        for item, amount in path.src.items():
-            items[item] -= amount * path_cnt
-
-        for item, amount in path.dst.items():
-            items[item] += amount * path_cnt
-
-        for item, amount in items.items():
-            if amount > 0.1:
-                detail['gain'] += f" {item}({amount:.2f})"
-            elif amount < -0.1:
-                detail['cost'] += f" {item}({-amount:.2f})"
-        for key in 'gain', 'cost':
-            if not detail[key]:
-                detail[key] = '无'
-        return detail
+    @profiling.spanned('to_dict')
+    def to_dict(self):
+        """
+        The plan in a structured form of plain lists and numbers, which `renderers` read from
+        (and which `renderers.save` / `renderers.load` keep as JSON or a NumPy archive)
+        """
+        planner = self.planner
+        all_items = planner._all_items
+        config = planner.config
+
+        ids, returns, indptr = [], [], [0]
+        for path in planner._all_paths:
+            if all_items is ALL_ITEMS:
+                ids.extend(path.ids)
+            else:
+                ids.extend(all_items.to_id(ALL_ITEMS.to_name(ind)) for ind in path.ids)
+            returns.extend(path.returns)
+            indptr.append(len(ids))
+
+        solution = self.integer_solution
+        return {
+            'version': renderers.RESULT_VERSION,
+            'config': {key: copy.copy(config[key]) for key in renderers.CONFIG_KEYS},
+            'items': list(all_items),
+            'cur_items': planner.cur_items.to_vec().tolist(),
+            'target_items': planner.target_items.to_vec().tolist(),
+            'obtained_items': self.get_obtained_items().tolist(),
+            'consumed_items': self.get_consumed_items().tolist(),
+            'plans': [
+                {'desc': plan.get_desc(), 'detail': plan.get_desc(with_required_items=True)}
+                for plan in planner.plans
+            ],
+            # items of all paths in the layout of `TradePath`, concatenated:
+            # those of path j are at [indptr[j], indptr[j + 1]), the first n_src[j] of them are used up
+            'paths': {
+                'desc': [self.get_desc_for_path(path) for path in planner._all_paths],
+                'n_src': [path.n_src for path in planner._all_paths],
+                'indptr': indptr,
+                'ids': ids,
+                'returns': returns,
+            },
+            'path_cnt': np.asarray(self.path_cnt, dtype=float).tolist(),
+            'integer_solution': None if solution is None else {
+                'optimal': bool(solution.optimal),
+                'n_lps': solution.n_lps,
+                'gap': float(solution.gap),
+            },
+            'lp_optimal': bool(self.lp_optimal),
+            'presolve': None if self.presolved is None else self.presolved.get_summary(),
+            'duals': None if self.duals is None else {
+                key: vec.tolist() for key, vec in self.duals.items()
+            },
+        }
 
     def print_report(self):
-        def section(title):
-            self.print("=" * 20)
-            self.print(title)
-            self.print("=" * 20)
-
-        def gap():
-            self.print()
-
-        obtained_items = self.get_obtained_items()
-        consumed_items = self.get_consumed_items()
-        cur_items = self.planner.cur_items.to_vec()
-        target_items = self.planner.target_items.to_vec()
-
-        all_items = self.planner._all_items
-        config = self.planner.config
-
-        section("结论")
-        days = consumed_items[all_items.to_id('1d')]
-        ap = int(days * config['ap_recovery_per_day']) + 1
-        self.print(f" 为完成目标，至少需要 {ap} 理智，共需 {days:.2f} 天的自然恢复")
-
-        gap()
-        section("设置")
-        self.print(f" 刀客塔每日自然回体为 {config['ap_recovery_per_day']}")
-        self.print(
-            f" 刀客塔的基建每日可供应 {config['infra_money_per_day']} 龙门币"
-            f"和 {config['infra_midexpbook_per_day']} 中级作战录像"
-        )
-        if config['disabled_path_keywords']:
-            self.print(f" 本次规划中禁用了包含以下关键字的路径: {','.join(self.planner.config['disabled_path_keywords'])}")
-        else:
-            self.print(f" 本次规划中没有禁用任何路径")
-
-        gap()
-        section("提升目标")
-        for plan in self.planner.plans:
-            self.print(f" {plan.get_desc()}")
-
-        if self.planner.config['display_plan_item_requirement']:
-            gap()
-            section("提升目标（详细报告）")
-            for plan in self.planner.plans:
-                self.print(f" {plan.get_desc(with_required_items=True)}")
-
-        gap()
-        section("材料清单\n(结余 = 持有 + 获得 - 消耗 - 需求)")
-        self.print("需求    持有     获得      消耗      结余     材料名")
-        for t_cnt, c_cnt, obt_cnt, con_cnt, item in zip(
-                target_items, 
-                cur_items,
-                obtained_items,
-                consumed_items,
-                all_items
-            ):
-            if item in ('理智', '1d'):
-                continue
-            if t_cnt > 0 or obt_cnt > 0.1 or con_cnt > 0.1:
-                overflow = c_cnt + obt_cnt - con_cnt - t_cnt
-                self.print(f"{int(t_cnt):5d} {int(c_cnt):5d} {obt_cnt:9.2f} {con_cnt:9.2f} {overflow:9.2f} {item}")
-
-        gap()
-        section("规划路径")
-        self.print("重复次数   操作")
-        for p_cnt, path in zip(self.path_cnt, self.planner._all_paths):
-            if p_cnt > 0.1:
-                path_desc = self.get_desc_for_path(path)
-                self.print(f"{p_cnt:8.2f}  {path_desc}")
-
-        if self.planner.config['display_path_item_change']:
-            gap()
-            section("规划路径（详细报告）")
-            self.print("重复次数   操作")
-            for p_cnt, path in zip(self.path_cnt, self.planner._all_paths):
-                if p_cnt < 0.1:
-                    continue
-                path_desc = self.get_desc_for_path(path)
-                path_detail = self.get_item_detail_for_path(path, p_cnt)
-                self.print(f"{p_cnt:<8.2f}  {path_desc}")
-                self.print(f"  - 获得： {path_detail['gain']}")
-                self.print(f"  - 消耗： {path_detail['cost']}")
-
-    def print(self, *args, **kwargs):
-        kwargs['file'] = self._file
-        print(*args, **kwargs)
+        result = self.to_dict()
+        with profiling.span('render'):
+            renderers.render_text(result, self._file)
 
     def print_to_file(self, filename, mode):
         class ctx_manager:
@@ -604,7 +909,86 @@ class Scheme:
                     self._file = sys.stdout
         return ctx_manager()
 
+def check_config(config_file):
+    """
+    Parses the config and validates the items and plans, without solving anything
+    """
+    config = PlannerConfig().update_with_file(config_file)
+    ALL_ITEMS.validate(config.get_cur_items())
+    ALL_ITEMS.validate(config.get_target_items())
+    for plan in config.get_plans():
+        plan.validate()
+    return config
+
+def run_command(args):
+    if args.command == 'officials':
+        for official in sorted(Officials.get_all_officials(), key=lambda o: (-o.stars, o.name)):
+            print(f"{official.stars}★ {official.name:　<8}{official.eng_name}")
+
+    elif args.command == 'check':
+        try:
+            config = check_config(args.config)
+        except (OSError, KeyError, ValueError, NameError) as e:
+            print(f"{args.config}: {type(e).__name__}: {e}")
+            return 1
+        print(f"{args.config}: OK, {len(config.get_plans())} 个提升目标")
+
+    else:
+        planner = Planner(ALL_ITEMS).set_to_config(args.config)
+        if args.integer:
+            planner.config['integer_mode'] = True
+        if args.no_cache:
+            planner.config['result_cache'] = False
+        if args.solver:
+            planner.config['solver'] = args.solver
+        planner.generate_report()
+        if args.save_result:
+            renderers.save(planner._scheme.to_dict(), args.save_result)
+
+    return 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="明日方舟规划师")
+    parser.add_argument(
+        'command', nargs='?', default='plan', choices=['plan', 'check', 'officials'],
+        help="plan: generate the report (default); check: only validate the config; officials: list all officials",
+    )
+    parser.add_argument('config', nargs='?', default='config.yaml')
+    parser.add_argument('--integer', action='store_true', help="repeat stages and crafts a whole number of times")
+    parser.add_argument('--solver', choices=PlannerConfig.SOLVERS, help="LP backend, see solvers.py")
+    parser.add_argument('--no-cache', action='store_true', help="solve again even if the same plan was solved before")
+    parser.add_argument('--save-result', help="also keep the plan as .json or .npz, to be rendered by renderers.py")
+    parser.add_argument('--timing', action='store_true', help="print the time spent in each phase")
+    parser.add_argument('--profile', help="dump cProfile stats of the command to this file")
+    parser.add_argument('--trace', help="write the phases as a Chrome trace (JSON) to this file")
+    args = parser.parse_args(argv)
+
+    if not (args.timing or args.profile or args.trace):
+        return run_command(args)
+
+    profiler = None
+    if args.profile:
+        import cProfile
+        profiler = cProfile.Profile()
+
+    with profiling.recording() as recorder:
+        if profiler is not None:
+            profiler.enable()
+        try:
+            ret = run_command(args)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+
+    if args.timing:
+        recorder.print_breakdown()
+    if profiler is not None:
+        profiler.dump_stats(args.profile)
+        print(f"cProfile: {args.profile} (python -m pstats {args.profile})")
+    if args.trace:
+        recorder.dump_chrome_trace(args.trace)
+        print(f"Chrome trace: {args.trace} (chrome://tracing or https://ui.perfetto.dev)")
+    return ret
+
 if __name__ == '__main__':
-    P = Planner(ALL_ITEMS)
-    P.set_to_config('config.yaml')
-    P.generate_report()
+    sys.exit(main())
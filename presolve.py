@@ -0,0 +1,152 @@
+"""
+Shrinks the planner LP before solving it
+
+    min c @ x
+    s.t. A_ub @ x <= b_ub
+         lb <= x <= ub
+
+A positive entry of A_ub means the path (column) uses up the row, e.g. consumes the item,
+a negative entry means the path supplies the row, e.g. produces the item.
+
+1. reachability: only the rows short of supply (b_ub < 0, i.e. the targets) are needed at first,
+   then the paths supplying a needed row, and the rows used up by those paths, and so on.
+   The other paths are never worth executing, and the other rows always hold.
+2. dominance: among the unlimited paths using up a single row (e.g. stages, consuming only 理智),
+   a path supplying no more of anything per unit used than another one is dropped,
+   paths supplying exactly the same per unit (e.g. the paired stages) are merged into the first one.
+
+The objective is unchanged, and the solution of the smaller LP is mapped back with `expand_x`.
+"""
+import numpy as np
+import scipy.sparse
+
+TOL = 1e-12
+
+class Presolved:
+    def __init__(self, n_rows, n_cols, rows, cols, args, n_dominated, n_merged):
+        self.n_rows, self.n_cols = n_rows, n_cols
+        self.rows = rows    # indexes of the kept rows
+        self.cols = cols    # indexes of the kept columns
+        self.args = args    # `c`, `A_ub`, `b_ub`, `bounds` of the smaller LP
+        self.n_dominated = n_dominated
+        self.n_merged = n_merged
+
+    def expand_x(self, x):
+        """
+        @return: x of the original LP, dropped paths are not executed
+        """
+        if x is None:
+            return None
+        full = np.zeros(self.n_cols)
+        full[self.cols] = x
+        return full
+
+    def expand_marginals(self, marginals):
+        """
+        @return: marginals of the original `A_ub`, dropped rows are not binding
+        """
+        if marginals is None:
+            return None
+        full = np.zeros(self.n_rows)
+        full[self.rows] = marginals
+        return full
+
+    def reduce_cols(self, vec):
+        return np.asarray(vec)[self.cols]
+
+    def get_summary(self):
+        return {
+            'rows': (self.n_rows, len(self.rows)),
+            'cols': (self.n_cols, len(self.cols)),
+            'unreachable_cols': self.n_cols - len(self.cols) - self.n_dominated - self.n_merged,
+            'dominated_cols': self.n_dominated,
+            'merged_cols': self.n_merged,
+        }
+
+def _reachable(c, A_pos, A_neg_T, b_ub, lb, cols):
+    """
+    @param: cols: boolean mask of the candidate columns
+    @return: (rows, cols) boolean masks of the needed rows and columns
+    """
+    rows = b_ub < 0
+    keep = cols & ((c < 0) | (lb > 0)) # worth executing by themselves
+    while True:
+        supplying = cols & ((A_neg_T @ rows.astype(float)) > 0)
+        new_keep = keep | supplying
+        new_rows = rows | ((A_pos @ new_keep.astype(float)) > 0)
+        if (new_keep == keep).all() and (new_rows == rows).all():
+            return rows, keep
+        keep, rows = new_keep, new_rows
+
+def _dominated(c, A, rows, cols, lb, ub):
+    """
+    @return: (dominated, merged) boolean masks of the columns
+    """
+    n_cols = A.shape[1]
+    dominated = np.zeros(n_cols, dtype=bool)
+    merged = np.zeros(n_cols, dtype=bool)
+
+    sub = A[rows].tocsc()
+    n_used = np.asarray((sub > 0).sum(axis=0)).ravel()
+    cands = np.flatnonzero(cols & (n_used == 1) & (lb == 0))
+    if not len(cands):
+        return dominated, merged
+
+    dense = sub[:, cands].toarray()
+    used = np.argmax(dense > 0, axis=0)
+    amount = dense[used, np.arange(len(cands))]
+
+    # supply and cost per unit of the row used up
+    supply = np.maximum(-dense, 0) / amount
+    cost = c[cands] / amount
+    unlimited = np.isinf(ub[cands])
+
+    for used_row in np.unique(used):
+        group = np.flatnonzero(used == used_row)
+        S, C = supply[:, group], cost[group]
+
+        # ge[k, j]: k supplies no less of anything than j, costs no more, and is unlimited
+        ge = (S[:, :, None] >= S[:, None, :] - TOL).all(axis=0) & (C[:, None] <= C[None, :] + TOL)
+        ge &= unlimited[group][:, None]
+        np.fill_diagonal(ge, False)
+        same = ge & ge.T
+
+        # merged into the first one of the identical ones
+        dominated[cands[group]] = (ge & ~same).any(axis=0)
+        merged[cands[group]] = ~dominated[cands[group]] & np.triu(same, 1).any(axis=0)
+
+    return dominated, merged
+
+def presolve(c, A_ub, b_ub, bounds, dominance=True):
+    """
+    @param: dominance: also drop the dominated paths and merge the identical ones,
+                       turn it off for integer programs, whose runs can not be traded fractionally
+    @return: Presolved
+    """
+    n_rows, n_cols = A_ub.shape
+    if isinstance(bounds, tuple):
+        bounds = [bounds] * n_cols
+    lb = np.array([0.0 if l is None else l for l, u in bounds], dtype=float)
+    ub = np.array([np.inf if u is None else u for l, u in bounds], dtype=float)
+
+    A = scipy.sparse.csr_matrix(A_ub)
+    A_pos = (A > 0).astype(float)
+    A_neg_T = (A < 0).astype(float).T.tocsr()
+
+    rows, cols = _reachable(c, A_pos, A_neg_T, b_ub, lb, np.ones(n_cols, dtype=bool))
+
+    n_dominated = n_merged = 0
+    if dominance:
+        dominated, merged = _dominated(c, A, rows, cols, lb, ub)
+        n_dominated, n_merged = int(dominated.sum()), int(merged.sum())
+        # rows needed only by the dropped paths go as well
+        rows, cols = _reachable(c, A_pos, A_neg_T, b_ub, lb, cols & ~dominated & ~merged)
+
+    rows, cols = np.flatnonzero(rows), np.flatnonzero(cols)
+    args = {
+        'c': c[cols],
+        'A_ub': A[rows][:, cols],
+        'b_ub': b_ub[rows],
+        'bounds': [bounds[ind] for ind in cols],
+    }
+    return Presolved(n_rows, n_cols, rows, cols, args, n_dominated, n_merged)
@@ -0,0 +1,139 @@
+"""
+Named spans around the phases of planning, recorded only while a `Recorder` is active
+
+    with profiling.span('solve'):
+        ...
+
+    @profiling.spanned('assemble')
+    def get_linprog_args(self):
+        ...
+
+    with profiling.recording() as recorder:
+        planner.generate_report()
+    recorder.print_breakdown()
+    recorder.dump_chrome_trace('trace.json')    # for chrome://tracing or https://ui.perfetto.dev
+
+When nothing is recording, a span costs a global lookup and a no-op context manager.
+Spans nest: a span opened inside another is recorded under the path `outer/inner`.
+Kept free of heavy imports, as `planner` imports it on startup.
+"""
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+
+_recorder = None
+
+class Recorder:
+    def __init__(self):
+        self.spans = [] # (path, begin ns, end ns, thread id)
+        self.beg = time.perf_counter_ns()
+        self.end = None
+        self._stack = []
+
+    def get_breakdown(self):
+        """
+        @return: list of (path, count, total seconds), in the order the spans were first opened
+        """
+        stats = {}
+        for path, beg, end, _ in sorted(self.spans, key=lambda s: s[1]):
+            cnt, total = stats.get(path, (0, 0))
+            stats[path] = (cnt + 1, total + end - beg)
+        return [(path, cnt, total / 1e9) for path, (cnt, total) in stats.items()]
+
+    def print_breakdown(self, file=None):
+        wall = ((self.end or time.perf_counter_ns()) - self.beg) / 1e9
+        print(f"阶段耗时（共 {wall * 1000:.1f}ms）:", file=file)
+        print("      ms       %  次数  阶段", file=file)
+        for path, cnt, total in self.get_breakdown():
+            *parents, name = path.split('/')
+            print(
+                f"{total * 1000:8.2f} {total / wall:7.1%} {cnt:5d}  {'  ' * len(parents)}{name}",
+                file=file,
+            )
+
+    def to_chrome_trace(self):
+        """
+        @return: the spans in the Chrome trace event format, as complete ('X') events in us
+        """
+        pid = os.getpid()
+        return {
+            'traceEvents': [
+                {
+                    'name': path.split('/')[-1], 'cat': 'planner', 'ph': 'X',
+                    'ts': (beg - self.beg) / 1000, 'dur': (end - beg) / 1000,
+                    'pid': pid, 'tid': tid, 'args': {'path': path},
+                }
+                for path, beg, end, tid in self.spans
+            ],
+            'displayTimeUnit': 'ms',
+        }
+
+    def dump_chrome_trace(self, filename):
+        with open(filename, 'w') as f:
+            json.dump(self.to_chrome_trace(), f)
+
+class _Span:
+    __slots__ = ('recorder', 'name', 'beg')
+
+    def __init__(self, recorder, name):
+        self.recorder = recorder
+        self.name = name
+
+    def __enter__(self):
+        self.recorder._stack.append(self.name)
+        self.beg = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter_ns()
+        stack = self.recorder._stack
+        self.recorder.spans.append(('/'.join(stack), self.beg, end, threading.get_ident()))
+        stack.pop()
+        return False
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+def span(name):
+    if _recorder is None:
+        return _NULL_SPAN
+    return _Span(_recorder, name)
+
+def spanned(name):
+    """
+    Decorator recording each call of the function as a span
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _recorder is None:
+                return func(*args, **kwargs)
+            with _Span(_recorder, name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+@contextlib.contextmanager
+def recording():
+    """
+    Records the spans of the block, which should all be opened from the same thread
+    """
+    global _recorder
+    recorder, previous = Recorder(), _recorder
+    _recorder = recorder
+    try:
+        yield recorder
+    finally:
+        recorder.end = time.perf_counter_ns()
+        _recorder = previous
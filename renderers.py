@@ -0,0 +1,302 @@
+"""
+Renders a plan from its structured form (`Scheme.to_dict`), which can be kept and rendered later
+
+    $ python planner.py plan config.yaml --save-result plan.npz
+    $ python renderers.py plan.npz --format csv -o plan.csv
+    $ python renderers.py plan.json               # the text report to stdout
+
+A result is kept as JSON (`.json`), or as a NumPy archive (`.npz`) of its vectors,
+with everything else in a JSON string under `meta`. Both load back into the same dict.
+"""
+import argparse
+import csv
+import json
+import sys
+
+import numpy as np
+
+RESULT_VERSION = 1
+
+# config the reports depend on
+CONFIG_KEYS = (
+    'ap_recovery_per_day', 'infra_money_per_day', 'infra_midexpbook_per_day', 'disabled_path_keywords',
+    'display_plan_item_requirement', 'display_path_item_change', 'display_item_value', 'display_path_efficiency',
+)
+
+# kept as arrays in a `.npz`, `a.b` for result['a']['b']
+ARRAY_KEYS = (
+    'cur_items', 'target_items', 'obtained_items', 'consumed_items', 'path_cnt',
+    'paths.n_src', 'paths.indptr', 'paths.ids', 'paths.returns',
+    'duals.item_values', 'duals.path_reduced_costs',
+)
+
+##########################
+# Storage
+##########################
+def save(result, path):
+    """
+    @param: path: `.npz` for a NumPy archive, JSON otherwise
+    """
+    if not path.endswith('.npz'):
+        with open(path, 'w') as f:
+            json.dump(result, f, ensure_ascii=False)
+        return
+
+    meta = json.loads(json.dumps(result)) # a deep copy
+    arrays = {}
+    for key in ARRAY_KEYS:
+        *parents, name = key.split('.')
+        d = meta
+        for parent in parents:
+            d = d.get(parent) or {}
+        if name in d:
+            arrays[key] = np.asarray(d.pop(name))
+    np.savez_compressed(path, meta=np.array(json.dumps(meta, ensure_ascii=False)), **arrays)
+
+def load(path):
+    """
+    @return: the result dict, as returned by `Scheme.to_dict`
+    @raise: ValueError if it is of another version
+    """
+    if path.endswith('.npz'):
+        with np.load(path, allow_pickle=False) as archive:
+            result = json.loads(str(archive['meta']))
+            for key in ARRAY_KEYS:
+                if key in archive:
+                    *parents, name = key.split('.')
+                    d = result
+                    for parent in parents:
+                        d = d[parent]
+                    d[name] = archive[key].tolist()
+    else:
+        with open(path, 'r') as f:
+            result = json.load(f)
+
+    if result.get('version') != RESULT_VERSION:
+        raise ValueError(f"Unsupported result version: {result.get('version')}")
+    return result
+
+##########################
+# Helpers
+##########################
+def iter_path_items(result, p_ind):
+    """
+    @yield: (item, return) of the path, negative for the items used up
+    """
+    paths = result['paths']
+    items = result['items']
+    for ind in range(paths['indptr'][p_ind], paths['indptr'][p_ind + 1]):
+        yield items[paths['ids'][ind]], paths['returns'][ind]
+
+def get_item_detail_for_path(result, p_ind, path_cnt):
+    detail = {'gain': '', 'cost': ''}
+    items = {}
+
+    for item, ret in iter_path_items(result, p_ind):
+        items[item] = items.get(item, 0.0) + ret * path_cnt
+
+    for item, amount in items.items():
+        if amount > 0.1:
+            detail['gain'] += f" {item}({amount:.2f})"
+        elif amount < -0.1:
+            detail['cost'] += f" {item}({-amount:.2f})"
+    for key in 'gain', 'cost':
+        if not detail[key]:
+            detail[key] = '无'
+    return detail
+
+def get_ap_cost(result, p_ind):
+    """
+    @return: 理智 used up by one run of the path, None if it uses none
+    """
+    n_src = result['paths']['n_src'][p_ind]
+    for ind, (item, ret) in enumerate(iter_path_items(result, p_ind)):
+        if ind < n_src and item == '理智':
+            return -ret
+    return None
+
+##########################
+# Renderers
+##########################
+def render_text(result, file=None):
+    """
+    The report of `planner.py`
+    """
+    def out(*args):
+        print(*args, file=file)
+
+    def section(title):
+        out("=" * 20)
+        out(title)
+        out("=" * 20)
+
+    def gap():
+        out()
+
+    items = result['items']
+    config = result['config']
+    paths = result['paths']
+    obtained_items = result['obtained_items']
+    consumed_items = result['consumed_items']
+    duals = result['duals']
+
+    section("结论")
+    days = consumed_items[items.index('1d')]
+    ap = int(days * config['ap_recovery_per_day']) + 1
+    out(f" 为完成目标，至少需要 {ap} 理智，共需 {days:.2f} 天的自然恢复")
+
+    if not result.get('lp_optimal', True):
+        out(" 本方案为线性规划达到求解时限时找到的可行方案，未证明最优")
+
+    solution = result['integer_solution']
+    if solution is not None:
+        status = "已证明最优" if solution['optimal'] else "达到时限"
+        out(
+            f" 整数规划（{status}）：关卡与加工站的次数均为整数，"
+            f"共求解 {solution['n_lps']} 个线性规划，与最优解相差不超过 {solution['gap']:.2%}"
+        )
+
+    gap()
+    section("设置")
+    out(f" 刀客塔每日自然回体为 {config['ap_recovery_per_day']}")
+    out(
+        f" 刀客塔的基建每日可供应 {config['infra_money_per_day']} 龙门币"
+        f"和 {config['infra_midexpbook_per_day']} 中级作战录像"
+    )
+    if config['disabled_path_keywords']:
+        out(f" 本次规划中禁用了包含以下关键字的路径: {','.join(config['disabled_path_keywords'])}")
+    else:
+        out(f" 本次规划中没有禁用任何路径")
+    summary = result['presolve']
+    if summary is not None:
+        out(
+            f" 预处理后，约束从 {summary['rows'][0]} 条减少到 {summary['rows'][1]} 条，"
+            f"路径从 {summary['cols'][0]} 条减少到 {summary['cols'][1]} 条"
+            f"（与目标无关 {summary['unreachable_cols']} 条，被其它关卡支配 {summary['dominated_cols']} 条，"
+            f"掉落相同而合并 {summary['merged_cols']} 条）"
+        )
+
+    gap()
+    section("提升目标")
+    for plan in result['plans']:
+        out(f" {plan['desc']}")
+
+    if config['display_plan_item_requirement']:
+        gap()
+        section("提升目标（详细报告）")
+        for plan in result['plans']:
+            out(f" {plan['detail']}")
+
+    gap()
+    section("材料清单\n(结余 = 持有 + 获得 - 消耗 - 需求)")
+    out("需求    持有     获得      消耗      结余     材料名")
+    for t_cnt, c_cnt, obt_cnt, con_cnt, item in zip(
+            result['target_items'],
+            result['cur_items'],
+            obtained_items,
+            consumed_items,
+            items
+        ):
+        if item in ('理智', '1d'):
+            continue
+        if t_cnt > 0 or obt_cnt > 0.1 or con_cnt > 0.1:
+            overflow = c_cnt + obt_cnt - con_cnt - t_cnt
+            out(f"{int(t_cnt):5d} {int(c_cnt):5d} {obt_cnt:9.2f} {con_cnt:9.2f} {overflow:9.2f} {item}")
+
+    gap()
+    section("规划路径")
+    out("重复次数   操作")
+    for p_cnt, path_desc in zip(result['path_cnt'], paths['desc']):
+        if p_cnt > 0.1:
+            out(f"{p_cnt:8.2f}  {path_desc}")
+
+    if config['display_path_item_change']:
+        gap()
+        section("规划路径（详细报告）")
+        out("重复次数   操作")
+        for p_ind, (p_cnt, path_desc) in enumerate(zip(result['path_cnt'], paths['desc'])):
+            if p_cnt < 0.1:
+                continue
+            path_detail = get_item_detail_for_path(result, p_ind, p_cnt)
+            out(f"{p_cnt:<8.2f}  {path_desc}")
+            out(f"  - 获得： {path_detail['gain']}")
+            out(f"  - 消耗： {path_detail['cost']}")
+
+    relaxed = "（整数规划的线性松弛）" if solution is not None else ""
+    if config['display_item_value'] and duals is not None:
+        gap()
+        section(f"材料价值{relaxed}\n(多持有一个该材料可以节省的理智)")
+        out(" 理智价值   材料名")
+        for value, item in zip(duals['item_values'], items):
+            if item in ('理智', '1d') or abs(value) < 1e-6:
+                continue
+            out(f"{value:9.2f}   {item}")
+
+    if config['display_path_efficiency'] and duals is not None:
+        gap()
+        section(
+            f"路径效率{relaxed}\n"
+            "(差距 = 每执行一次比最优方案亏损的理智，效率 = 关卡掉落的理智价值 / 关卡消耗的理智)"
+        )
+        out("   差距     效率   操作")
+        reduced_costs = duals['path_reduced_costs']
+        for p_ind in np.argsort(reduced_costs, kind='stable'):
+            ap_cost = get_ap_cost(result, p_ind)
+            efficiency = f"{1 - reduced_costs[p_ind] / ap_cost:7.2%}" if ap_cost else " " * 7
+            out(f"{reduced_costs[p_ind]:8.2f}  {efficiency}  {paths['desc'][p_ind]}")
+
+def render_csv(result, file=None):
+    """
+    One row per item in the report, then one per path executed,
+    with the item value / the path reduced cost if the duals are known
+    """
+    writer = csv.writer(file or sys.stdout)
+    writer.writerow(['kind', 'name', 'count', 'target', 'current', 'obtained', 'consumed', 'overflow', 'value'])
+
+    duals = result['duals']
+    for ind, item in enumerate(result['items']):
+        t_cnt, c_cnt = result['target_items'][ind], result['cur_items'][ind]
+        obt_cnt, con_cnt = result['obtained_items'][ind], result['consumed_items'][ind]
+        if item in ('理智', '1d') or not (t_cnt > 0 or obt_cnt > 0.1 or con_cnt > 0.1):
+            continue
+        value = '' if duals is None else duals['item_values'][ind]
+        writer.writerow(['item', item, '', t_cnt, c_cnt, obt_cnt, con_cnt, c_cnt + obt_cnt - con_cnt - t_cnt, value])
+
+    for p_ind, (p_cnt, path_desc) in enumerate(zip(result['path_cnt'], result['paths']['desc'])):
+        if p_cnt <= 0:
+            continue
+        value = '' if duals is None else duals['path_reduced_costs'][p_ind]
+        writer.writerow(['path', path_desc, p_cnt, '', '', '', '', '', value])
+
+def render_json(result, file=None):
+    json.dump(result, file or sys.stdout, ensure_ascii=False)
+    (file or sys.stdout).write('\n')
+
+RENDERERS = {
+    'text': render_text,
+    'csv': render_csv,
+    'json': render_json,
+}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render a saved plan")
+    parser.add_argument('result', help="a result saved as .json or .npz")
+    parser.add_argument('-f', '--format', choices=list(RENDERERS), default='text')
+    parser.add_argument('-o', '--output', help="defaults to stdout")
+    args = parser.parse_args(argv)
+
+    try:
+        result = load(args.result)
+    except (OSError, ValueError) as e:
+        print(f"{args.result}: {e}")
+        return 1
+
+    if args.output:
+        with open(args.output, 'w', newline='' if args.format == 'csv' else None) as f:
+            RENDERERS[args.format](result, f)
+    else:
+        RENDERERS[args.format](result, sys.stdout)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,159 @@
+"""
+On-disk cache of solved plans, so that a repeated config skips the LP entirely
+
+The key is the content hash of the problem:
+* the active trade paths (after `disabled_path_keywords`, with the daily recovery of the config)
+* the current and the target item vectors
+* the settings the solve depends on (`SOLVE_CONFIG_KEYS`)
+prefixed by the content hash of the crawler results (`snapshot.get_source_hash`),
+so that every entry goes stale once they change.
+Stale entries are removed on the next write, and the least recently used ones
+once the cache grows over `max_bytes`.
+
+Only the solution is kept (`Scheme` is rebuilt around the planner asking for it),
+so the display settings and the output path do not matter.
+"""
+import copy
+import hashlib
+import os
+import pickle
+
+import snapshot
+from util import ROOT
+
+RESULT_CACHE_VERSION = 1 # bump it when the solution of the same problem may change, e.g. a solver fix
+RESULT_CACHE_DIR = os.path.join(ROOT, 'cache', 'results')
+MAX_CACHE_BYTES = 64 * 1024 * 1024
+
+# settings the solution depends on, besides the paths and the items
+SOLVE_CONFIG_KEYS = ('integer_mode', 'integer_time_limit', 'presolve', 'solver', 'solver_time_limit')
+
+def get_snapshot_hash():
+    return snapshot.get_source_hash(snapshot.DROPRATE_PATH, snapshot.OFFICIAL_PATH)
+
+def get_problem_hash(planner):
+    sha = hashlib.sha1(f"result-cache-v{RESULT_CACHE_VERSION}".encode())
+    sha.update('\0'.join(planner._all_items).encode())
+    for path in planner._all_paths:
+        sha.update(repr((path.tag, path.n_src, path.max_cnt, path.max_cnt_per_day)).encode())
+        sha.update(path.ids.tobytes())
+        sha.update(path.returns.tobytes())
+    sha.update(planner.cur_items.to_vec().tobytes())
+    sha.update(planner.target_items.to_vec().tobytes())
+    sha.update(repr([planner.config[key] for key in SOLVE_CONFIG_KEYS]).encode())
+    return sha.hexdigest()
+
+class ResultCache:
+    def __init__(self, directory=RESULT_CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.n_hits = 0
+        self.n_misses = 0
+
+    def get_key(self, planner):
+        return f"{get_snapshot_hash()}_{get_problem_hash(planner)}"
+
+    def _get_path(self, key):
+        return os.path.join(self.directory, f"{key}.pickle")
+
+    def get(self, key):
+        """
+        @return: the solution kept under `key`, or None
+        """
+        path = self._get_path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+            os.utime(path) # the modification time orders the eviction
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+            self.n_misses += 1
+            return None
+        self.n_hits += 1
+        return value
+
+    def put(self, key, value):
+        path = self._get_path(key)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+
+            # write then rename, so that a concurrent reader never sees a partial file
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+
+            self._evict(key)
+        except OSError:
+            pass # e.g. read-only checkout, the cache is only an optimization
+
+    def _evict(self, key):
+        """
+        Removes the entries of other crawler results, then the least recently used ones
+        until the cache fits in `max_bytes`, the entry just written stays
+        """
+        snapshot_hash = key.split('_')[0]
+        entries = []
+        for filename in os.listdir(self.directory):
+            if not filename.endswith('.pickle'):
+                continue
+            path = os.path.join(self.directory, filename)
+            try:
+                if not filename.startswith(f"{snapshot_hash}_"):
+                    os.remove(path)
+                    continue
+                stat = os.stat(path)
+            except OSError: # removed by another process meanwhile
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        current = self._get_path(key)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == current:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+    def clear(self):
+        try:
+            filenames = os.listdir(self.directory)
+        except OSError:
+            return
+        for filename in filenames:
+            if filename.endswith('.pickle'):
+                try:
+                    os.remove(os.path.join(self.directory, filename))
+                except OSError:
+                    pass
+
+def pack_solution(scheme):
+    """
+    @return: what is kept of a `Scheme`, keyword arguments to rebuild it
+    """
+    presolved = scheme.presolved
+    if presolved is not None:
+        # only the summary is reported, the reduced LP is not worth keeping
+        presolved = copy.copy(presolved)
+        presolved.args = None
+    return {
+        'path_cnt': scheme.path_cnt,
+        'integer_solution': scheme.integer_solution,
+        'duals': scheme.duals,
+        'presolved': presolved,
+    }
+
+_default = None
+
+def get_default():
+    """
+    @return: the ResultCache under `RESULT_CACHE_DIR`, shared in this process
+    """
+    global _default
+    if _default is None:
+        _default = ResultCache()
+    return _default
@@ -0,0 +1,331 @@
+"""
+What to do on each day (or week) of the plan, with the resets of the tasks and the shops on the calendar
+
+    $ python schedule.py config.yaml
+    $ python schedule.py config.yaml --period week --horizon 180 --start 2026-11-01 --csv schedule.csv
+
+The planner pools the whole plan: time is the pseudo-item `1d`, and a daily cap only bounds the total
+of a path by the total of the days. Here time is indexed: one block of path counts per period,
+linked by the items carried over from one period to the next.
+* every period brings its days of `1d`, which are not carried over: the daily recovery happens or is lost
+* a capped path (the tasks, the monthly shops) gets its cap at each of its resets (`TradePath.reset`):
+  every day, every Monday (周常任务) or every 1st of the month (每月签到, the 资质凭证 and 高级凭证 shops),
+  and the periods between two resets share it; a week or month already begun at the start
+  only gets the share of its cap for the days left in it (`--full-first-reset` for the whole cap,
+  e.g. when nothing was bought from the shop yet this month)
+* the stock of an event shop (`max_cnt`) is for the whole horizon
+* an item can only be consumed once it is held: the items held at the end of every period are >= 0,
+  and the targets are held at the end of the last period
+
+The fewest periods is searched from the days of the pooled plan, one LP per number of periods:
+the calendar can take longer (an item is needed before it can be made) as well as shorter
+(a month has a whole cap of 30 days' worth, even when it has fewer days left in the horizon).
+Among the schedules of that many periods, the one spending the least 理智 (the earlier the better) is kept.
+The 理智 is carried over with no cap, as in the planner.
+
+Every LP is assembled as Kronecker products of the path return matrix, so it stays sparse:
+a 120-day horizon is a few 10k variables, solved by the backend of `求解器` in about a second.
+"""
+import argparse
+import csv
+import datetime
+import math
+import sys
+import time
+
+import numpy as np
+import scipy.sparse
+
+import presolve
+from items import RESET_DAYS
+from planner import Planner, Scheme
+
+# among the schedules of the fewest periods: of the 理智 spent, per period from the start,
+# so that the stages are done the earliest
+EARLY_WEIGHT = 1e-4
+# of every run, per period to the end, so that nothing is done for nothing
+# and the rest (e.g. the crafts, which cost no 理智) is done when needed, not scattered over the days
+LATE_WEIGHT = 1e-5
+
+def is_reset(day: datetime.date, reset):
+    return reset == 'day' or (reset == 'week' and day.weekday() == 0) or (reset == 'month' and day.day == 1)
+
+def get_first_share(start, reset):
+    """
+    @return: share of the cap left at `start`, if the days since the last reset used up their share of it:
+             the days to the next reset over `RESET_DAYS`, 1 on a reset day
+    """
+    days = 1
+    while days < RESET_DAYS[reset] and not is_reset(start + datetime.timedelta(days=days), reset):
+        days += 1
+    return days / RESET_DAYS[reset]
+
+def get_windows(n_periods, period_days, start, reset, full_first_reset=False):
+    """
+    Groups the periods by the resets of `reset` ('day', 'week' or 'month'):
+    a window starts at each period with a reset in it, the start of the schedule counting as one,
+    for the share of the cap left at it (`get_first_share`), or the whole of it if `full_first_reset`
+
+    @return: list of (periods, resets in them)
+    """
+    first_share = 1 if full_first_reset or is_reset(start, reset) else get_first_share(start, reset)
+    windows = []
+    for t in range(n_periods):
+        first = t * period_days
+        n_resets = sum(
+            first_share if day == 0 else is_reset(start + datetime.timedelta(days=day), reset)
+            for day in range(first, first + period_days)
+        )
+        if n_resets or not windows:
+            windows.append(([t], n_resets))
+        else:
+            windows[-1][0].append(t)
+    return windows
+
+class Schedule:
+    def __init__(self, planner: Planner, period_days=1, start=None, full_first_reset=False):
+        self.planner = planner
+        self.period_days = period_days
+        self.start = start or datetime.date.today()
+        self.full_first_reset = full_first_reset
+        self.n_lps = 0
+
+        all_items = planner._all_items
+        R = planner.get_path_return_matrix().tocsc()
+        cur = planner.cur_items.to_vec()
+        target = planner.target_items.to_vec()
+        day_id = all_items.to_id('1d')
+
+        # the pooled LP, of which only the reachability presolve holds period by period:
+        # a path needing an item nothing makes is never run, while a path dominated in the pool
+        # (its caps scaled by the days of the whole plan) may still be worth it once the caps are per reset
+        args = planner.get_linprog_args()
+        del args['path_return']
+        self.pooled_args, self.cols = args, np.arange(planner.n_paths)
+        if planner.config['presolve']:
+            presolved = presolve.presolve(dominance=False, **args)
+            self.pooled_args, self.cols = presolved.args, presolved.cols
+        R = R[:, self.cols].tocsr()
+        self.paths = [planner._all_paths[j] for j in self.cols]
+
+        # only the items something consumes or is targeted need to be held,
+        # the others can only pile up
+        consumed = np.asarray(R.minimum(0).sum(axis=1)).ravel() < 0
+        keep = np.flatnonzero(consumed | (target > 0))
+        self.day_row = int(np.searchsorted(keep, day_id))
+        assert keep[self.day_row] == day_id
+
+        self.R = R[keep].tocsc()
+        self.cur = cur[keep].astype(float)
+        self.cur[self.day_row] = 0 # the days are brought by each period instead
+        self.target = target[keep].astype(float)
+        self.target[self.day_row] = 0
+        self.carried = np.ones(len(keep))
+        self.carried[self.day_row] = 0
+
+        ap_row = np.asarray(R[all_items.to_id('理智')].todense()).ravel()
+        self.ap_cost = np.maximum(-ap_row, 0)
+
+    @property
+    def n_paths(self):
+        return self.R.shape[1]
+
+    @property
+    def n_items(self):
+        return self.R.shape[0]
+
+    def get_pooled_days(self):
+        """
+        @return: days of the pooled plan of the planner, nan if infeasible
+        """
+        x = self.planner._linear_programming(**self.pooled_args)
+        self.n_lps += 1
+        if x is None:
+            return math.nan
+        return float((-self.R[self.day_row] @ x)[0])
+
+    def assemble(self, n_periods):
+        """
+        Variables: the counts of the paths x[t, p], then the items held s[t, i] at the end of each period
+
+        s[t] <= s[t-1] + R @ x[t] (+ `cur` for t = 0, + the days of the period for `1d`, not carried over)
+        sum of x[t, p] over a window <= cap of p * resets in the window, for each capped path p
+        sum of x[t, p] over all periods <= stock of p, for each path of an event shop
+        s[last] >= target
+
+        @return: dict of `c`, `A_ub`, `b_ub`, `bounds` for `Planner._linear_programming`
+        """
+        T, P, I = n_periods, self.n_paths, self.n_items
+        eye_T = scipy.sparse.identity(T, format='csr')
+
+        # items carried over, as an inequality: throwing items away never helps
+        prev = scipy.sparse.eye(T, k=-1, format='csr')
+        A_items = scipy.sparse.hstack([
+            scipy.sparse.kron(eye_T, -self.R),
+            scipy.sparse.identity(T * I) - scipy.sparse.kron(prev, scipy.sparse.diags(self.carried)),
+        ])
+        income = np.zeros((T, I))
+        income[0] += self.cur
+        income[:, self.day_row] = self.period_days
+        b_items = income.ravel()
+
+        rows, cols, b_caps = [], [], []
+        for p, path in enumerate(self.paths):
+            if path.max_cnt_per_day:
+                cap = path.max_cnt_per_day * RESET_DAYS[path.reset]
+                windows = get_windows(T, self.period_days, self.start, path.reset, self.full_first_reset)
+                for periods, n_resets in windows:
+                    rows += [len(b_caps)] * len(periods)
+                    cols += [t * P + p for t in periods]
+                    b_caps.append(cap * n_resets)
+            if path.max_cnt:
+                rows += [len(b_caps)] * T
+                cols += [t * P + p for t in range(T)]
+                b_caps.append(path.max_cnt)
+        A_caps = scipy.sparse.csr_matrix(
+            (np.ones(len(rows)), (rows, cols)), shape=(len(b_caps), T * (P + I)),
+        )
+
+        lb = np.zeros(T * (P + I))
+        lb[-I:] = self.target
+        ub = np.full(T * (P + I), np.inf)
+
+        early = 1 + EARLY_WEIGHT * np.arange(T)
+        late = LATE_WEIGHT * np.arange(T, 0, -1)
+        c_x = np.outer(early, self.ap_cost) + late[:, None]
+        c = np.concatenate([c_x.ravel(), np.zeros(T * I)])
+
+        return {
+            'c': c,
+            'A_ub': scipy.sparse.vstack([A_items, A_caps], format='csr'),
+            'b_ub': np.concatenate([b_items, b_caps]),
+            'bounds': np.column_stack([lb, ub]),
+        }
+
+    def solve(self, n_periods):
+        """
+        @return: path counts as a (periods x paths) array, or None if the targets cannot be held by then
+        """
+        args = self.assemble(n_periods)
+        x = self.planner._linear_programming(**args)
+        self.n_lps += 1
+        if x is None:
+            return None
+        return x[:n_periods * self.n_paths].reshape(n_periods, self.n_paths)
+
+    def run(self, max_days):
+        """
+        @return: path counts as a (periods x paths) array for the fewest periods,
+                 or None if it takes more than `max_days`
+        """
+        L = self.period_days
+        max_periods = -(-max_days // L)
+
+        pooled_days = self.get_pooled_days()
+        if pooled_days != pooled_days: # nan
+            return None
+        guess = min(max(1, math.ceil(pooled_days / L - 1e-6)), max_periods)
+
+        # gallop from the guess, down while feasible or up while not, then bisect:
+        # `lo` periods are not enough, `hi` are
+        best = self.solve(guess)
+        step = 1
+        if best is None:
+            lo = guess
+            while best is None:
+                if lo == max_periods:
+                    return None
+                hi = min(lo + step, max_periods)
+                best = self.solve(hi)
+                if best is None:
+                    lo = hi
+                step *= 2
+        else:
+            hi, lo = guess, None
+            while lo is None:
+                t = max(hi - step, 0)
+                x = self.solve(t) if t else None
+                if x is None:
+                    lo = t
+                else:
+                    best, hi = x, t
+                step *= 2
+
+        while hi - lo > 1:
+            mid = (lo + hi) // 2
+            x = self.solve(mid)
+            if x is None:
+                lo = mid
+            else:
+                best, hi = x, mid
+        return best
+
+    def get_period_start(self, t):
+        return self.start + datetime.timedelta(days=t * self.period_days)
+
+    def iter_actions(self, x, min_cnt=0.05):
+        """
+        @yield: (period, path, count) for the paths repeated at least `min_cnt` times in a period,
+                the daily recovery left out
+        """
+        paths = self.paths
+        for t, counts in enumerate(x):
+            for p in np.flatnonzero(counts >= min_cnt):
+                if self.R[self.day_row, p] < 0:
+                    continue
+                yield t, paths[p], float(counts[p])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Schedule the plan day by day (or week by week)")
+    parser.add_argument('config', nargs='?', default='config.yaml')
+    parser.add_argument('--period', choices=('day', 'week'), default='day')
+    parser.add_argument('--horizon', type=int, default=120, help="days, at most")
+    parser.add_argument('--start', type=datetime.date.fromisoformat, help="first day, today by default")
+    parser.add_argument('--csv', help="also write the schedule to this csv file")
+    parser.add_argument(
+        '--full-first-reset', action='store_true',
+        help="the whole caps of the week / month begun at the start are left, not only the share of the days left",
+    )
+    args = parser.parse_args(argv)
+
+    beg = time.perf_counter()
+    schedule = Schedule(
+        Planner().set_to_config(args.config), 7 if args.period == 'week' else 1, args.start, args.full_first_reset,
+    )
+    x = schedule.run(args.horizon)
+    elapsed = time.perf_counter() - beg
+
+    if x is None:
+        print(f"{args.horizon} 天内无法完成（{schedule.n_lps} 次求解，共 {elapsed:.2f}s）")
+        return 1
+
+    by_period = {}
+    for t, path, cnt in schedule.iter_actions(x):
+        by_period.setdefault(t, []).append((path, cnt))
+
+    L = schedule.period_days
+    for t in range(len(x)):
+        day = schedule.get_period_start(t)
+        label = f"第 {t + 1} 天" if L == 1 else f"第 {t + 1} 周"
+        actions = ', '.join(
+            f"{Scheme.get_desc_for_path(path)} x{cnt:.1f}" for path, cnt in by_period.get(t, [])
+        )
+        print(f"{label:>8} {day:%m-%d}  {actions or '-'}")
+
+    n_days = len(x) * L
+    print(
+        f"{n_days} 天完成（至 {schedule.get_period_start(len(x)) - datetime.timedelta(days=1)}），"
+        f"{len(x)} 段 x {schedule.n_paths} 条路径，{schedule.n_lps} 次求解，共 {elapsed:.2f}s"
+    )
+
+    if args.csv:
+        with open(args.csv, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['period', 'date', 'path', 'count'])
+            for t, path, cnt in schedule.iter_actions(x):
+                writer.writerow([t + 1, schedule.get_period_start(t).isoformat(), Scheme.get_desc_for_path(path), cnt])
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,261 @@
+"""
+A local HTTP service planning configs, with the data loaded once
+
+    $ python service.py --port 8000 --jobs 4
+    $ curl --data-binary @config.yaml 'http://127.0.0.1:8000/plan'
+    $ curl --data-binary @config.yaml 'http://127.0.0.1:8000/plan?format=json'
+    $ curl http://127.0.0.1:8000/metrics
+
+Endpoints:
+* POST /plan: the body is a config in YAML (or the same mapping in JSON),
+  `?format=` text (the report, default), json (`Scheme.to_dict`) or csv, see `renderers.py`
+* GET /metrics: requests, queue depth and latency, in JSON
+* GET /healthz: ok
+
+Items, trade paths, officials and the path return matrix are loaded before the worker processes fork,
+the solving runs in the workers, so the event loop only ever parses and answers.
+`--port 0` picks a free port, which is printed on start.
+"""
+import argparse
+import asyncio
+import collections
+import io
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from items import ALL_ITEMS
+from officials import Officials
+from planner import Planner, get_static_path_matrix
+import renderers
+
+MAX_BODY_BYTES = 1024 * 1024
+LATENCY_WINDOW = 1000 # latencies of the last requests kept for the percentiles
+
+CONTENT_TYPES = {
+    'text': 'text/plain; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+    'json': 'application/json; charset=utf-8',
+}
+
+REASONS = {
+    200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+    413: 'Payload Too Large', 422: 'Unprocessable Entity', 500: 'Internal Server Error',
+}
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+def _load_shared_data():
+    Officials.get_all_officials()
+    get_static_path_matrix()
+    import scipy.optimize # noqa: F401, paid once per worker instead of on its first request
+
+##########################
+# Worker
+##########################
+def plan(config, fmt):
+    """
+    Runs in a worker process
+    @return: (status, body)
+    """
+    try:
+        planner = Planner(ALL_ITEMS).set_to_config_string(config)
+    except Exception as e:
+        return 400, f"Invalid config: {type(e).__name__}: {e}"
+
+    planner.deduce()
+    if planner._scheme.path_cnt is None:
+        return 422, "The plan is infeasible"
+
+    out = io.StringIO()
+    renderers.RENDERERS[fmt](planner._scheme.to_dict(), out)
+    return 200, out.getvalue()
+
+##########################
+# Server
+##########################
+class Metrics:
+    def __init__(self):
+        self.started_at = time.time()
+        self.n_requests = collections.Counter() # by path
+        self.n_responses = collections.Counter() # by status
+        self.n_planning = 0 # submitted to the workers, not finished yet
+        self.latencies = collections.deque(maxlen=LATENCY_WINDOW) # of /plan, in seconds
+
+    def to_dict(self, n_workers):
+        latency = {}
+        if self.latencies:
+            for q, v in zip((50, 90, 99), np.percentile(list(self.latencies), [50, 90, 99])):
+                latency[f"p{q}_ms"] = round(v * 1000, 3)
+            latency['max_ms'] = round(max(self.latencies) * 1000, 3)
+        return {
+            'uptime_s': round(time.time() - self.started_at, 3),
+            'requests': dict(self.n_requests),
+            'responses': {str(status): cnt for status, cnt in self.n_responses.items()},
+            'workers': n_workers,
+            'in_flight': self.n_planning,
+            'queue_depth': max(self.n_planning - n_workers, 0),
+            'plan_latency': latency,
+        }
+
+class PlanningService:
+    """
+    e.g.
+        service = PlanningService(n_workers=2)
+        await service.start('127.0.0.1', 0)
+        ... service.port ...
+        await service.close()
+    """
+    def __init__(self, n_workers=None):
+        self.n_workers = n_workers or os.cpu_count() or 1
+        self.metrics = Metrics()
+        self._executor = None
+        self._server = None
+
+    @property
+    def port(self):
+        return self._server.sockets[0].getsockname()[1]
+
+    async def start(self, host='127.0.0.1', port=0):
+        # load before forking, so that the workers share the data instead of loading their own
+        _load_shared_data()
+        self._executor = ProcessPoolExecutor(max_workers=self.n_workers, initializer=_load_shared_data)
+        self._server = await asyncio.start_server(self._handle, host, port)
+        return self
+
+    async def serve_forever(self):
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        self._server.close()
+        await self._server.wait_closed()
+        self._executor.shutdown(wait=True)
+
+    async def _read_request(self, reader):
+        """
+        @return: (method, path, query, body)
+        """
+        request_line = (await reader.readline()).decode('latin-1').strip()
+        try:
+            method, target, _ = request_line.split(' ', 2)
+        except ValueError:
+            raise HttpError(400, f"Malformed request line: {request_line!r}") from None
+
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode('latin-1').strip()
+            if not line:
+                break
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        try:
+            length = int(headers.get('content-length', 0))
+        except ValueError:
+            raise HttpError(400, "Invalid Content-Length") from None
+        if length > MAX_BODY_BYTES:
+            raise HttpError(413, f"Body over {MAX_BODY_BYTES} bytes")
+        body = await reader.readexactly(length) if length else b''
+
+        url = urlsplit(target)
+        return method.upper(), url.path, parse_qs(url.query), body
+
+    async def _route(self, method, path, query, body):
+        """
+        @return: (status, content type, body)
+        """
+        if path == '/healthz':
+            return 200, CONTENT_TYPES['text'], "ok\n"
+
+        if path == '/metrics':
+            if method != 'GET':
+                raise HttpError(405, "Use GET")
+            return 200, CONTENT_TYPES['json'], json.dumps(self.metrics.to_dict(self.n_workers)) + '\n'
+
+        if path == '/plan':
+            if method != 'POST':
+                raise HttpError(405, "Use POST, with the config as the body")
+            fmt = query.get('format', ['text'])[0]
+            if fmt not in renderers.RENDERERS:
+                raise HttpError(400, f"Unknown format {fmt!r}, valid: {', '.join(renderers.RENDERERS)}")
+            try:
+                config = body.decode('utf-8')
+            except UnicodeDecodeError:
+                raise HttpError(400, "The config should be in UTF-8") from None
+
+            beg = time.perf_counter()
+            self.metrics.n_planning += 1
+            try:
+                status, text = await asyncio.get_running_loop().run_in_executor(self._executor, plan, config, fmt)
+            finally:
+                self.metrics.n_planning -= 1
+                self.metrics.latencies.append(time.perf_counter() - beg)
+            if status != 200:
+                raise HttpError(status, text)
+            return status, CONTENT_TYPES[fmt], text
+
+        raise HttpError(404, f"No such path: {path}")
+
+    async def _handle(self, reader, writer):
+        path = None
+        try:
+            method, path, query, body = await self._read_request(reader)
+            self.metrics.n_requests[path] += 1
+            status, content_type, text = await self._route(method, path, query, body)
+        except HttpError as e:
+            status, content_type, text = e.status, CONTENT_TYPES['text'], f"{e}\n"
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+            return
+        except Exception as e:
+            traceback.print_exc()
+            status, content_type, text = 500, CONTENT_TYPES['text'], f"{type(e).__name__}: {e}\n"
+
+        self.metrics.n_responses[status] += 1
+        data = text.encode('utf-8')
+        writer.write(
+            f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(data)}\r\n"
+            "Connection: close\r\n\r\n".encode('latin-1') + data
+        )
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+async def _serve(host, port, n_workers):
+    service = await PlanningService(n_workers).start(host, port)
+    print(f"Serving on http://{host}:{service.port} with {service.n_workers} workers", flush=True)
+    try:
+        await service.serve_forever()
+    finally:
+        await service.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve planning over HTTP")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000, help="0 for any free port")
+    parser.add_argument('-j', '--jobs', type=int, default=None, help="number of worker processes, defaults to #cpu")
+    args = parser.parse_args(argv)
+
+    try:
+        asyncio.run(_serve(args.host, args.port, args.jobs))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,224 @@
+import copy
+
+import numpy as np
+import scipy.linalg
+import scipy.sparse
+import scipy.sparse.linalg
+
+from planner import Audit, Planner, Scheme
+
+class BasisError(Exception):
+    pass
+
+class WarmBasis:
+    """
+    An optimal basis of
+        min c @ x
+        s.t. A_ub @ x <= b_ub
+             lb <= x <= ub
+    recovered from the vertex solution returned by the solver.
+
+    The basis only depends on `c`, `A_ub` and the bounds, so when `b_ub` changes
+    it stays dual feasible, and is still optimal iff it is primal feasible.
+    Checking that costs one LU solve instead of a whole LP.
+    When some entries of `A_ub` change instead, `refactor` re-factorizes the same basis,
+    which is worth trying when the change is small.
+    """
+    TOL = 1e-7
+
+    def __init__(self, c, A_ub, b_ub, bounds, x):
+        tol = self.TOL
+        n = len(c)
+
+        A = scipy.sparse.csc_matrix(A_ub)
+        if isinstance(bounds, tuple):
+            bounds = [bounds] * n
+        lb = np.array([0.0 if l is None else l for l, u in bounds], dtype=float)
+        ub = np.array([np.inf if u is None else u for l, u in bounds], dtype=float)
+
+        slack = b_ub - A @ x
+        at_lb = x <= lb + tol * (1 + abs(lb))
+        at_ub = ~at_lb & (x >= ub - tol * (1 + abs(x)))
+
+        cols = np.flatnonzero(~(at_lb | at_ub)) # basic structural variables
+        binding = np.flatnonzero(slack <= tol * (1 + abs(b_ub)))
+
+        if len(cols) > len(binding):
+            raise BasisError(f"not a vertex: {len(cols)} basic columns, {len(binding)} binding rows")
+
+        # pick as many independent binding rows as basic columns,
+        # slacks of the other binding rows stay basic (at 0, degenerated)
+        if len(cols):
+            _, r, piv = scipy.linalg.qr(
+                A[binding][:, cols].toarray().T, pivoting=True, mode='economic'
+            )
+            diag = abs(np.diag(r))
+            if diag.min() <= tol * diag.max():
+                raise BasisError("singular basis")
+            rows = np.sort(binding[piv[:len(cols)]])
+        else:
+            rows = np.array([], dtype=int)
+
+        self._c = c
+        self._cols = cols
+        self._rows = rows
+        self._lb, self._ub = lb, ub
+        self._at_lb, self._at_ub = at_lb, at_ub
+        self._x_nonbasic = np.where(at_ub, ub, lb)
+        self._x_nonbasic[cols] = 0.0
+        self._factorize(A)
+
+    def _factorize(self, A):
+        """
+        Factorizes the basis of `A`, and checks that it is still dual feasible
+        """
+        tol = self.TOL
+        c, cols, rows = self._c, self._cols, self._rows
+
+        A_rows = A[rows].tocsr()
+        B = A_rows[:, cols].tocsc()
+        try:
+            lu = scipy.sparse.linalg.splu(B) if len(cols) else None
+        except RuntimeError: # exactly singular
+            raise BasisError("singular basis") from None
+
+        # simplex multipliers, zero for rows with a basic slack
+        pi = np.zeros(A.shape[0])
+        if lu is not None:
+            pi[rows] = lu.solve(c[cols], trans='T')
+
+        # dual feasibility: nonbasic slacks need pi <= 0,
+        # nonbasic columns need reduced cost >= 0 at lb and <= 0 at ub
+        dual_tol = tol * (1 + abs(c).max())
+        reduced_cost = c - A.T @ pi
+        if (
+            (pi[rows] > dual_tol).any()
+            or (reduced_cost[self._at_lb & (self._lb < self._ub)] < -dual_tol).any()
+            or (reduced_cost[self._at_ub] > dual_tol).any()
+        ):
+            raise BasisError("basis is not dual feasible")
+
+        self._A = A.tocsr()
+        self._A_rows = A_rows
+        self._lu = lu
+
+    def refactor(self, A_ub):
+        """
+        The same basis over a changed `A_ub` (of the same shape)
+
+        @return: a new WarmBasis, to be `resolve`d
+        @raise: BasisError if the basis is no longer dual feasible, i.e. not optimal for any `b_ub`
+        """
+        basis = copy.copy(self)
+        basis._factorize(scipy.sparse.csc_matrix(A_ub))
+        return basis
+
+    def resolve(self, b_ub):
+        """
+        @return: the optimal x for the new `b_ub`, or None if the basis is no longer primal feasible
+        """
+        tol = self.TOL
+
+        x = self._x_nonbasic.copy()
+        if self._lu is not None:
+            x[self._cols] = self._lu.solve(b_ub[self._rows] - self._A_rows @ x)
+
+        lb, ub = self._lb[self._cols], self._ub[self._cols]
+        x_basic = x[self._cols]
+        if (x_basic < lb - tol * (1 + abs(x_basic))).any() or (x_basic > ub + tol * (1 + abs(x_basic))).any():
+            return None
+        if (b_ub - self._A @ x < -tol * (1 + abs(b_ub))).any():
+            return None
+
+        x[self._cols] = np.clip(x_basic, lb, ub)
+        return x
+
+class PlanningSession:
+    """
+    A long-lived wrapper of `Planner`, keeping the assembled LP.
+
+    Inventory and target changes only move the right-hand side (`b_ub`),
+    so they are re-solved from the previous optimal basis when it is still feasible,
+    and fall back to a full solve (which then gives the next basis) otherwise.
+
+    e.g.
+        session = PlanningSession.from_config('config.yaml')
+        session.solve()
+        session.add_cur_items({'糖聚块': 3}).solve()
+        session.planner.print_report()
+    """
+    def __init__(self, planner: Planner):
+        self.planner = planner
+
+        args = planner.get_linprog_args()
+        self._path_return = args.pop('path_return')
+        self._args = args
+
+        self._basis = None
+        self.n_warm_solves = 0
+        self.n_cold_solves = 0
+
+    @classmethod
+    def from_config(cls, config_file):
+        return cls(Planner().set_to_config(config_file))
+
+    @classmethod
+    def from_config_string(cls, config):
+        return cls(Planner().set_to_config_string(config))
+
+    ##########################
+    # Deltas
+    ##########################
+    def _add_to_rhs(self, items, sign):
+        vec = Audit(items, self.planner._all_items).to_vec()
+        self._args['b_ub'][:len(vec)] += sign * vec
+
+    def add_cur_items(self, items):
+        self.planner.add_cur_items(items) # validates the item names
+        self._add_to_rhs(items, +1)
+        return self
+
+    def add_target_items(self, items):
+        self.planner.add_target_items(items)
+        self._add_to_rhs(items, -1)
+        return self
+
+    def add_plan(self, *plans):
+        for plan in plans:
+            self.planner.plans.append(plan)
+            self.add_target_items(plan.get_required_vec())
+        return self
+
+    ##########################
+    # Solving
+    ##########################
+    def _solve_x(self):
+        if self._basis is not None:
+            x = self._basis.resolve(self._args['b_ub'])
+            if x is not None:
+                self.n_warm_solves += 1
+                return x
+
+        x = self.planner._linear_programming(**self._args)
+        self.n_cold_solves += 1
+        try:
+            self._basis = WarmBasis(x=x, **self._args) if x is not None else None
+        except BasisError:
+            self._basis = None
+        return x
+
+    def solve_days(self):
+        """
+        Solves without building a `Scheme`
+        @return: days of natural recovery the optimal plan takes, nan if infeasible
+        """
+        x = self._solve_x()
+        if x is None:
+            return np.nan
+        day_row = self.planner._all_items.to_id('1d')
+        return float((self._args['A_ub'][day_row] @ x)[0])
+
+    def solve(self):
+        path_cnt = self._solve_x()
+        self.planner._scheme = Scheme(self.planner, path_cnt, self._path_return)
+        return self.planner._scheme
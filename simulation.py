@@ -0,0 +1,240 @@
+"""
+Samples the actual drops of a plan, to see how far luck can push it from the expectation
+
+    $ python simulation.py config.yaml
+    $ python simulation.py config.yaml -n 100000 --jobs 8 --seed 42
+
+The planner only works with the expected drops, quantity / times of `droprates.jl` per run.
+Here the runs of each stage in the plan are kept, and their drops are drawn instead:
+* an item dropping at most once a run on average (quantity <= times) drops like a coin flip each run,
+  i.e. binomially over the runs
+* the others (e.g. several at a time) are drawn as Poisson with the same mean
+
+Everything else of the plan (crafts, shops, daily recovery) goes as planned.
+Each item dropping more or less than expected is worth its value from the duals of the solve
+(see `Planner.get_duals`) in days of the daily recovery: a shortage is made up for with extra days,
+a surplus saves some, so the luck of one item offsets the other.
+This is a first order estimate: the duals hold while the optimal plan keeps the same stages,
+beyond that a re-planned trajectory would take a little longer (the days are convex in the items held).
+The shortfalls are the amounts short of the target, before anything is made up for.
+
+Trajectories are drawn in chunks of `CHUNK_SIZE`, each with its own seed spawned from `--seed`,
+so that the result does not depend on the number of worker processes.
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import items
+from items import ALL_ITEMS
+from planner import Planner, Scheme
+
+CHUNK_SIZE = 2500
+PERCENTILES = (50, 90, 99)
+TOL = 1e-6
+
+class SimulationResult:
+    def __init__(self, planned_days, days, items, shortfalls):
+        self.planned_days = planned_days
+        self.days = days              # (N,) days to complete the plan, per trajectory
+        self.items = items            # names of the items that may run short
+        self.shortfalls = shortfalls  # (N, len(items)) amount short of the target, per trajectory
+
+    @property
+    def n_trials(self):
+        return len(self.days)
+
+    def get_day_percentiles(self, q=PERCENTILES):
+        return dict(zip(q, np.percentile(self.days, q)))
+
+    def get_shortfall_percentiles(self, q=PERCENTILES):
+        """
+        @return: {item: {percentile: amount short}}, for the items short in some of the trajectories
+        """
+        table = np.percentile(self.shortfalls, q, axis=0)
+        return {
+            item: dict(zip(q, table[:, ind]))
+            for ind, item in enumerate(self.items)
+            if self.shortfalls[:, ind].any()
+        }
+
+##########################
+# Model
+##########################
+def _match_drop_stats(path, stats_by_code):
+    """
+    @return: the drop stats the stage path is built from, or None if it is not from `droprates.jl`
+    """
+    dst = path.dst
+    for stats in stats_by_code.get(path.tag, ()):
+        if stats['ap_cost'] == path.src.get('理智') and all(
+            abs(dst.get(item, 0) - quantity / times) <= TOL
+            for item, (quantity, times) in stats['drops'].items()
+        ):
+            return stats
+    return None
+
+def get_stage_drop_stats(paths):
+    """
+    @return: {index of the path: drop stats it is built from}, for the stages of `droprates.jl`
+    """
+    stats_by_code = {}
+    for stats in items.get_drop_stats():
+        stats_by_code.setdefault(stats['code'], []).append(stats)
+
+    stages = {}
+    for ind, path in enumerate(paths):
+        if '理智' in path.src:
+            stats = _match_drop_stats(path, stats_by_code)
+            if stats is not None:
+                stages[ind] = stats
+    return stages
+
+def build_model(scheme: Scheme):
+    """
+    Gathers everything the trajectories need into plain arrays, small enough to be sent to the workers
+    """
+    planner = scheme.planner
+    all_items = planner._all_items
+    if scheme.path_cnt is None:
+        raise ValueError("The plan is infeasible")
+    if scheme.duals is None:
+        raise ValueError("The plan has no item values to make up the shortage with")
+
+    # one entry per (stage, item) pair with random drops
+    runs, means, item_ids = [], [], []
+    for ind, stats in get_stage_drop_stats(planner._all_paths).items():
+        cnt = scheme.path_cnt[ind]
+        if cnt <= TOL:
+            continue
+        for item, (quantity, times) in stats['drops'].items():
+            if quantity > 0 and item in all_items:
+                runs.append(cnt)
+                means.append(quantity / times)
+                item_ids.append(all_items.to_id(item))
+
+    overflow = (
+        planner.cur_items.to_vec() + scheme.get_obtained_items()
+        - scheme.get_consumed_items() - planner.target_items.to_vec()
+    )
+    values = scheme.duals['item_values']
+    day_value = values[all_items.to_id('1d')]
+    if day_value <= 0:
+        day_value = planner.config['ap_recovery_per_day']
+
+    # only the items with random drops deviate from the plan
+    short_ids, pair_item = np.unique(np.array(item_ids, dtype=int), return_inverse=True)
+    return {
+        'planned_days': float(scheme.get_consumed_items()[all_items.to_id('1d')]),
+        'runs': np.array(runs, dtype=float),
+        'means': np.array(means, dtype=float),
+        'pair_item': pair_item,
+        'overflow': overflow[short_ids],
+        'days_per_item': values[short_ids] / day_value,
+        'items': [all_items.to_name(ind) for ind in short_ids],
+    }
+
+##########################
+# Trajectories
+##########################
+def draw_drops(rng, runs, means, n_trials):
+    """
+    @return: (n_trials, len(runs)) drops of each (stage, item) pair
+    """
+    drops = np.empty((n_trials, len(runs)))
+
+    # at most once a run: binomial over the whole runs, plus a coin flip scaled down for the last partial run
+    coin = means <= 1
+    whole = np.floor(runs[coin])
+    drops[:, coin] = (
+        rng.binomial(whole.astype(np.int64), means[coin], size=(n_trials, coin.sum()))
+        + rng.binomial(1, (runs[coin] - whole) * means[coin], size=(n_trials, coin.sum()))
+    )
+    drops[:, ~coin] = rng.poisson(runs[~coin] * means[~coin], size=(n_trials, (~coin).sum()))
+    return drops
+
+def simulate_chunk(model, seed, n_trials):
+    """
+    @return: (days, shortfalls) of `n_trials` trajectories
+    """
+    rng = np.random.default_rng(seed)
+    runs, means = model['runs'], model['means']
+
+    deviation = draw_drops(rng, runs, means, n_trials) - runs * means
+    # deviation of each item, summed over the stages dropping it
+    n_short = len(model['items'])
+    spread = np.zeros((len(runs), n_short))
+    spread[np.arange(len(runs)), model['pair_item']] = 1
+
+    item_deviation = deviation @ spread
+    shortfalls = np.maximum(-(model['overflow'] + item_deviation), 0)
+    shortfalls[shortfalls < TOL] = 0.0
+    days = model['planned_days'] - item_deviation @ model['days_per_item']
+    return days, shortfalls
+
+def simulate(scheme: Scheme, n_trials=10000, seed=None, n_workers=None):
+    """
+    @param: seed: int or None (random), the same seed gives the same result whatever `n_workers` is
+    @param: n_workers: number of worker processes, defaults to #cpu; 1 runs in this process
+    @return: SimulationResult
+    """
+    model = build_model(scheme)
+    sizes = [CHUNK_SIZE] * (n_trials // CHUNK_SIZE)
+    if n_trials % CHUNK_SIZE:
+        sizes.append(n_trials % CHUNK_SIZE)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+
+    n_workers = min(n_workers or os.cpu_count() or 1, len(sizes))
+    if n_workers <= 1:
+        chunks = [simulate_chunk(model, s, size) for s, size in zip(seeds, sizes)]
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            chunks = list(executor.map(simulate_chunk, [model] * len(sizes), seeds, sizes))
+
+    days = np.concatenate([days for days, _ in chunks])
+    shortfalls = np.concatenate([shortfalls for _, shortfalls in chunks])
+    return SimulationResult(model['planned_days'], days, model['items'], shortfalls)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate the drops of the plan of a config")
+    parser.add_argument('config', nargs='?', default='config.yaml')
+    parser.add_argument('-n', '--trials', type=int, default=10000, help="number of trajectories")
+    parser.add_argument('-j', '--jobs', type=int, default=None, help="number of worker processes, defaults to #cpu")
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args(argv)
+    if args.trials <= 0:
+        parser.error("--trials should be positive")
+
+    planner = Planner(ALL_ITEMS).set_to_config(args.config)
+    planner.deduce()
+
+    beg = time.perf_counter()
+    try:
+        result = simulate(planner._scheme, args.trials, args.seed, args.jobs)
+    except ValueError as e:
+        print(f"{args.config}: {e}")
+        return 1
+    elapsed = time.perf_counter() - beg
+
+    q = PERCENTILES
+    header = ' / '.join(f"P{p}" for p in q)
+    print(f"模拟 {result.n_trials} 次掉落，耗时 {elapsed:.2f}s")
+    print(
+        f" 完成天数（按材料价值的一阶估计）: 期望掉率下 {result.planned_days:.2f} 天，平均 {result.days.mean():.2f} 天，"
+        f"{header}: " + ' / '.join(f"{v:.2f}" for v in result.get_day_percentiles(q).values())
+    )
+    print(f" 有 {np.mean(result.days > result.planned_days + TOL) * 100:.1f}% 的情况需要额外的天数")
+
+    shortfalls = result.get_shortfall_percentiles(q)
+    if shortfalls:
+        print(f" 材料缺口 ({header}):")
+        for item, table in sorted(shortfalls.items(), key=lambda kv: -kv[1][q[-1]]):
+            print(f"  {item}: " + ' / '.join(f"{v:.0f}" for v in table.values()))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
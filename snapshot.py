@@ -0,0 +1,65 @@
+"""
+Compiled snapshot of the data parsed from the crawler results
+
+Each section is pickled under `cache/snapshot/`, keyed by the content hash of its sources,
+so it is parsed once, and rebuilt automatically once the crawler output (or the code) changes.
+A source is only read again to hash it when its size or times change, see `util.get_digest`.
+"""
+import hashlib
+import os
+import pickle
+
+from util import ROOT, get_digest
+
+SNAPSHOT_VERSION = 1 # bump it when the layout of any section changes
+SNAPSHOT_DIR = os.path.join(ROOT, 'cache', 'snapshot')
+
+DROPRATE_PATH = os.path.join(ROOT, 'crawlers', 'results', 'droprates.jl')
+OFFICIAL_PATH = os.path.join(ROOT, 'crawlers', 'results', 'officials.jl')
+
+_loaded = {}
+
+def get_source_hash(*sources):
+    sha = hashlib.sha1(f"snapshot-v{SNAPSHOT_VERSION}".encode())
+    for source in sources:
+        sha.update(get_digest(source).encode())
+    return sha.hexdigest()[:16]
+
+def load(section, build, sources):
+    """
+    @param: section: name of the data, e.g. 'droprates'
+    @param: build: a function to compile the data, called when the snapshot is missing or stale
+    @param: sources: files the data is compiled from
+    @return: the compiled data
+    """
+    key = get_source_hash(*sources)
+    if (section, key) in _loaded:
+        return _loaded[section, key]
+
+    path = os.path.join(SNAPSHOT_DIR, f"{section}_{key}.pickle")
+    try:
+        with open(path, 'rb') as f:
+            data = pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        data = build()
+        _dump(section, path, data)
+
+    _loaded[section, key] = data
+    return data
+
+def _dump(section, path, data):
+    try:
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+
+        # write then rename, so that a concurrent reader never sees a partial file
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+        for filename in os.listdir(SNAPSHOT_DIR):
+            stale = os.path.join(SNAPSHOT_DIR, filename)
+            if filename.startswith(f"{section}_") and filename.endswith('.pickle') and stale != path:
+                os.remove(stale)
+    except OSError:
+        pass # e.g. read-only checkout, the snapshot is only an optimization
@@ -0,0 +1,353 @@
+"""
+LP solver backends of the planner
+
+    min c @ x
+    s.t. A_ub @ x <= b_ub
+         lb <= x <= ub
+
+* highs: `scipy.optimize.linprog(method='highs')`, HiGHS picks the algorithm (the default)
+* highs-ds / highs-ipm: HiGHS dual simplex / interior point, through scipy
+* mps: writes the LP as a (free) MPS file, and runs an external solver on it as a subprocess,
+  by default the HiGHS command line (`MPS_COMMAND`), whose solution file is read back
+* auto: the fastest of the in-process backends for the size of the LP,
+  by the timings recorded with `python solvers.py --benchmark` (`BENCHMARK_PATH`),
+  or `DEFAULT_AUTO_BACKEND` when there are none
+
+All of them take a `time_limit` (seconds) and a `tolerance` (feasibility / optimality), None for the defaults.
+
+    $ python solvers.py --benchmark     # records the timings of the backends for `auto`
+    $ python planner.py plan config.yaml --solver highs-ipm
+"""
+import abc
+import argparse
+import json
+import math
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import scipy.sparse
+from scipy import optimize
+
+from util import ROOT
+
+BENCHMARK_PATH = os.path.join(ROOT, 'cache', 'solver_benchmarks.json')
+DEFAULT_AUTO_BACKEND = 'highs-ds' # the fastest on all the scenarios of bench.py when measured
+
+# placeholders: {mps}, {solution}, {time_limit}, {options};
+# the arguments of the time limit / the options file (of the tolerance) are only added when set
+MPS_COMMAND = ['highs', '--model_file', '{mps}', '--solution_file', '{solution}']
+MPS_TIME_LIMIT_ARGS = ['--time_limit', '{time_limit}']
+MPS_OPTIONS_ARGS = ['--options_file', '{options}']
+# model statuses of HiGHS stopped early, whose solution file still holds the best x so far
+MPS_LIMIT_STATUSES = ('Time limit reached', 'Iteration limit reached')
+
+class SolverResult:
+    def __init__(self, x, marginals, backend, elapsed, message='', optimal=None, limited=False):
+        self.x = x                  # None if no feasible solution is found
+        self.marginals = marginals  # of `A_ub`, d(c @ x) / d(b_ub), None if unknown or not optimal
+        self.backend = backend
+        self.elapsed = elapsed      # seconds
+        self.message = message
+        # False for a feasible but not optimal x, e.g. when the time limit is hit
+        self.optimal = x is not None if optimal is None else optimal
+        self.limited = limited      # stopped by the time (or iteration) limit, with or without an x
+
+# for checking an x found before the limit: a bit looser than the default of HiGHS (1e-7),
+# which it applies to the scaled LP
+FEASIBILITY_TOL = 1e-6
+
+def is_feasible(x, A_ub, b_ub, bounds=(0, None), tolerance=None):
+    """
+    @return: whether A_ub @ x <= b_ub and lb <= x <= ub, within `tolerance` (relative to the right-hand sides)
+    """
+    tol = FEASIBILITY_TOL if tolerance is None else tolerance
+    if isinstance(bounds, tuple):
+        bounds = [bounds] * len(x)
+    lb = np.array([-math.inf if l is None else l for l, u in bounds], dtype=float)
+    ub = np.array([math.inf if u is None else u for l, u in bounds], dtype=float)
+    b_ub = np.asarray(b_ub, dtype=float)
+    return bool(
+        (A_ub @ x <= b_ub + tol * (1 + np.abs(b_ub))).all()
+        and (x >= lb - tol * (1 + np.abs(lb))).all()
+        and (x <= ub + tol * (1 + np.abs(ub))).all()
+    )
+
+class Solver(abc.ABC):
+    name = None
+
+    def __init__(self, time_limit=None, tolerance=None):
+        self.time_limit = time_limit
+        self.tolerance = tolerance
+
+    @abc.abstractmethod
+    def solve(self, c, A_ub, b_ub, bounds=(0, None)):
+        """
+        @param: bounds: (lb, ub) for all variables, or a list of (lb, ub) pairs; None for unbounded
+        @return: SolverResult
+        """
+
+class HighsSolver(Solver):
+    def __init__(self, method='highs', time_limit=None, tolerance=None):
+        super().__init__(time_limit, tolerance)
+        self.method = method
+        self.name = method
+
+    def get_options(self):
+        options = {}
+        if self.time_limit is not None:
+            options['time_limit'] = self.time_limit
+        if self.tolerance is not None:
+            options['primal_feasibility_tolerance'] = self.tolerance
+            options['dual_feasibility_tolerance'] = self.tolerance
+            if self.method == 'highs-ipm':
+                options['ipm_optimality_tolerance'] = self.tolerance
+        return options
+
+    def solve(self, c, A_ub, b_ub, bounds=(0, None)):
+        beg = time.perf_counter()
+        options = self.get_options()
+        # no options at all by default, exactly as the planner always called it
+        kwargs = {'options': options} if options else {}
+        ret = optimize.linprog(c=c, A_ub=A_ub, b_ub=b_ub, bounds=bounds, method=self.method, **kwargs)
+        # status 1: the time (or iteration) limit is hit, with the best x so far if any,
+        # which the dual simplex may leave primal infeasible
+        optimal = ret.status == 0
+        x = ret.x if ret.status in (0, 1) else None
+        if not optimal and x is not None and not is_feasible(x, A_ub, b_ub, bounds, self.tolerance):
+            x = None
+        marginals = ret.ineqlin.marginals if optimal else None
+        return SolverResult(x, marginals, self.name, time.perf_counter() - beg, ret.message, optimal, ret.status == 1)
+
+##########################
+# External Solvers
+##########################
+def write_mps(f, c, A_ub, b_ub, bounds, name='PLANNER'):
+    """
+    Writes the LP in free MPS, with columns `x<j>` and rows `r<i>`
+    """
+    A = scipy.sparse.csc_matrix(A_ub)
+    n_rows, n_cols = A.shape
+    if isinstance(bounds, tuple):
+        bounds = [bounds] * n_cols
+
+    f.write(f"NAME {name}\n")
+    f.write("ROWS\n N obj\n")
+    for i in range(n_rows):
+        f.write(f" L r{i}\n")
+
+    f.write("COLUMNS\n")
+    for j in range(n_cols):
+        if c[j] != 0:
+            f.write(f" x{j} obj {float(c[j])!r}\n")
+        for ind in range(A.indptr[j], A.indptr[j + 1]):
+            f.write(f" x{j} r{A.indices[ind]} {float(A.data[ind])!r}\n")
+
+    f.write("RHS\n")
+    for i in range(n_rows):
+        if b_ub[i] != 0:
+            f.write(f" rhs r{i} {float(b_ub[i])!r}\n")
+
+    f.write("BOUNDS\n")
+    for j, (lb, ub) in enumerate(bounds):
+        # None is unbounded, as in `scipy.optimize.linprog`
+        if lb is None or lb == -math.inf:
+            f.write(f" MI bnd x{j}\n")
+        elif lb != 0:
+            f.write(f" LO bnd x{j} {float(lb)!r}\n")
+        if ub is not None and ub != math.inf:
+            f.write(f" UP bnd x{j} {float(ub)!r}\n")
+    f.write("ENDATA\n")
+
+def read_highs_solution(f, n_rows, n_cols):
+    """
+    Reads a solution file of HiGHS in its raw style
+    @return: (model status, x or None, row duals or None)
+    """
+    lines = [line.strip() for line in f]
+    status = lines[lines.index('Model status') + 1] if 'Model status' in lines else 'Unknown'
+
+    def read_section(title, header, n):
+        if title not in lines:
+            return None
+        beg = lines.index(title)
+        for ind in range(beg, len(lines)):
+            if lines[ind].startswith(header):
+                values = np.zeros(n)
+                for line in lines[ind + 1:ind + 1 + n]:
+                    name, value = line.split()[:2]
+                    values[int(name[1:])] = float(value)
+                return values
+        return None
+
+    x = read_section('# Primal solution values', '# Columns', n_cols)
+    duals = read_section('# Dual solution values', '# Rows', n_rows)
+    return status, x, duals
+
+class MpsSolver(Solver):
+    name = 'mps'
+
+    def __init__(self, command=None, time_limit=None, tolerance=None):
+        """
+        @param: command: argv of the external solver with the placeholders of `MPS_COMMAND`,
+                         writing a HiGHS-style solution file
+        """
+        super().__init__(time_limit, tolerance)
+        self.command = command or MPS_COMMAND
+
+    def solve(self, c, A_ub, b_ub, bounds=(0, None)):
+        beg = time.perf_counter()
+        n_rows, n_cols = A_ub.shape
+
+        with tempfile.TemporaryDirectory(prefix='planner_mps_') as tmp_dir:
+            mps_path = os.path.join(tmp_dir, 'problem.mps')
+            solution_path = os.path.join(tmp_dir, 'problem.sol')
+            options_path = os.path.join(tmp_dir, 'options.txt')
+            with open(mps_path, 'w') as f:
+                write_mps(f, c, A_ub, b_ub, bounds)
+
+            command = list(self.command)
+            if self.time_limit is not None:
+                command += MPS_TIME_LIMIT_ARGS
+            if self.tolerance is not None:
+                with open(options_path, 'w') as f:
+                    f.write(f"primal_feasibility_tolerance = {self.tolerance}\n")
+                    f.write(f"dual_feasibility_tolerance = {self.tolerance}\n")
+                command += MPS_OPTIONS_ARGS
+            fields = {
+                'mps': mps_path, 'solution': solution_path, 'options': options_path, 'time_limit': self.time_limit,
+            }
+            command = [arg.format(**fields) for arg in command]
+            if shutil.which(command[0]) is None:
+                raise FileNotFoundError(f"External solver not found: {command[0]}")
+
+            # the solver gets a bit more than its own limit to write the solution
+            timeout = None if self.time_limit is None else self.time_limit + 10
+            proc = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                  universal_newlines=True, timeout=timeout)
+            try:
+                with open(solution_path, 'r') as f:
+                    status, x, duals = read_highs_solution(f, n_rows, n_cols)
+            except OSError:
+                status, x, duals = f"no solution file, exit code {proc.returncode}", None, None
+
+        optimal = status == 'Optimal'
+        if not optimal:
+            duals = None
+            if status not in MPS_LIMIT_STATUSES:
+                x = None
+            elif x is not None and not is_feasible(x, A_ub, b_ub, bounds, self.tolerance):
+                x = None
+        return SolverResult(
+            x, duals, self.name, time.perf_counter() - beg, status, optimal, status in MPS_LIMIT_STATUSES,
+        )
+
+##########################
+# Selection
+##########################
+BACKENDS = {
+    'highs': lambda **kwargs: HighsSolver('highs', **kwargs),
+    'highs-ds': lambda **kwargs: HighsSolver('highs-ds', **kwargs),
+    'highs-ipm': lambda **kwargs: HighsSolver('highs-ipm', **kwargs),
+    'mps': MpsSolver,
+}
+IN_PROCESS_BACKENDS = ('highs', 'highs-ds', 'highs-ipm')
+
+def load_benchmarks(path=BENCHMARK_PATH):
+    """
+    @return: list of {'backend', 'n_rows', 'n_cols', 'nnz', 'ms'}
+    """
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return []
+
+def pick_backend(A_ub, benchmarks=None):
+    """
+    @return: the in-process backend timed the fastest on the recorded LP closest in size (nnz)
+    """
+    if benchmarks is None:
+        benchmarks = load_benchmarks()
+    nnz = max(scipy.sparse.csr_matrix(A_ub).nnz, 1)
+
+    records = [record for record in benchmarks if record['backend'] in IN_PROCESS_BACKENDS]
+    if not records:
+        return DEFAULT_AUTO_BACKEND
+    closest = min(records, key=lambda record: abs(math.log(max(record['nnz'], 1)) - math.log(nnz)))['nnz']
+    return min(
+        (record for record in records if record['nnz'] == closest), key=lambda record: record['ms']
+    )['backend']
+
+class AutoSolver(Solver):
+    name = 'auto'
+
+    def __init__(self, time_limit=None, tolerance=None, benchmarks=None):
+        super().__init__(time_limit, tolerance)
+        self.benchmarks = benchmarks
+
+    def solve(self, c, A_ub, b_ub, bounds=(0, None)):
+        backend = pick_backend(A_ub, self.benchmarks)
+        solver = BACKENDS[backend](time_limit=self.time_limit, tolerance=self.tolerance)
+        return solver.solve(c, A_ub, b_ub, bounds)
+
+BACKENDS['auto'] = AutoSolver
+
+def get_solver(name='highs', time_limit=None, tolerance=None):
+    """
+    @raise: ValueError for an unknown backend
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown solver {name}, valid: {', '.join(BACKENDS)}")
+    return BACKENDS[name](time_limit=time_limit, tolerance=tolerance)
+
+def benchmark(scenarios=None, repeat=3, path=BENCHMARK_PATH):
+    """
+    Times the in-process backends on the scenarios of `bench.py`, and records them for `auto`
+    @return: the records
+    """
+    from bench import SCENARIOS, build_planner
+
+    records = []
+    for scenario in scenarios or SCENARIOS:
+        args = build_planner(**SCENARIOS[scenario]).get_linprog_args()
+        args.pop('path_return')
+        A_ub = args['A_ub']
+        for backend in IN_PROCESS_BACKENDS:
+            solver = get_solver(backend)
+            ms = min(solver.solve(**args).elapsed for _ in range(repeat)) * 1000
+            records.append({
+                'scenario': scenario, 'backend': backend,
+                'n_rows': A_ub.shape[0], 'n_cols': A_ub.shape[1], 'nnz': int(A_ub.nnz), 'ms': round(ms, 3),
+            })
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(records, f, indent=2)
+    return records
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Record the timings of the LP backends for the auto selection")
+    parser.add_argument('--benchmark', action='store_true', help="time the backends and record the results")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    if args.benchmark:
+        benchmark(repeat=args.repeat)
+
+    records = load_benchmarks()
+    if not records:
+        print(f"No timings recorded, auto picks {DEFAULT_AUTO_BACKEND}. Run with --benchmark to record them")
+        return 0
+    print(f"{'scenario':>10} {'rows':>6} {'cols':>6} {'nnz':>8} {'backend':>10} {'ms':>10}")
+    for r in records:
+        print(f"{r.get('scenario', ''):>10} {r['n_rows']:6d} {r['n_cols']:6d} {r['nnz']:8d} {r['backend']:>10} {r['ms']:10.3f}")
+    print(f"Timings: {BENCHMARK_PATH}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
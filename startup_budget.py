@@ -0,0 +1,89 @@
+"""
+Checks the startup cost of the light commands against a budget
+
+    $ python startup_budget.py
+
+Fails (exit code 1) if
+* `import planner`, or the imports of `planner.py --help`, take longer than `IMPORT_BUDGET_US`,
+  as measured by `python -X importtime`
+* `planner.py check` / `planner.py officials` import any of `HEAVY_MODULES`, or fail
+"""
+import subprocess
+import sys
+import time
+
+from util import ROOT
+
+IMPORT_BUDGET_US = 50000
+HEAVY_MODULES = ('numpy', 'scipy')
+N_RUNS = 5
+
+LIGHT_COMMANDS = [
+    ['planner.py', 'officials'],
+    ['planner.py', 'check', 'config.example.yaml'],
+]
+
+def run_with_importtime(args):
+    """
+    @return: (return code, wall time in seconds, {module: cumulative import time in us},
+              import time in us of the script itself, i.e. of its top level imports after the interpreter startup)
+    """
+    beg = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', *args],
+        cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, universal_newlines=True,
+    )
+    wall = time.perf_counter() - beg
+
+    import_times = {}
+    script_us, started = 0, False
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, module = line[len('import time:'):].split('|')
+        import_times.setdefault(module.strip(), int(cumulative))
+        # nested imports are indented, the interpreter startup ends with `site`
+        if started and not module[1:].startswith(' '):
+            script_us += int(cumulative)
+        started = started or module.strip() == 'site'
+
+    return proc.returncode, wall, import_times, script_us
+
+def main():
+    failures = []
+
+    # warm up, so that the bytecode and the data snapshot are not counted
+    for args in LIGHT_COMMANDS:
+        run_with_importtime(args)
+
+    import_us = min(
+        run_with_importtime(['-c', 'import planner'])[2].get('planner', float('inf'))
+        for _ in range(N_RUNS)
+    )
+    print(f"import planner: {import_us / 1000:.1f}ms (budget {IMPORT_BUDGET_US / 1000:.1f}ms)")
+    if import_us > IMPORT_BUDGET_US:
+        failures.append(f"import planner took {import_us}us > {IMPORT_BUDGET_US}us")
+
+    help_us = min(run_with_importtime(['planner.py', '--help'])[3] for _ in range(N_RUNS))
+    print(f"planner.py --help imports: {help_us / 1000:.1f}ms (budget {IMPORT_BUDGET_US / 1000:.1f}ms)")
+    if help_us > IMPORT_BUDGET_US:
+        failures.append(f"the imports of planner.py --help took {help_us}us > {IMPORT_BUDGET_US}us")
+
+    for args in LIGHT_COMMANDS:
+        cmd = ' '.join(args)
+        runs = [run_with_importtime(args) for _ in range(N_RUNS)]
+        print(f"{cmd}: {min(run[1] for run in runs) * 1000:.1f}ms")
+
+        code, _, import_times, _ = runs[0]
+        if code != 0:
+            failures.append(f"{cmd} exited with {code}")
+        heavy = sorted(m for m in import_times if m.split('.')[0] in HEAVY_MODULES)
+        if heavy:
+            failures.append(f"{cmd} imported heavy modules: {', '.join(heavy[:5])}")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,164 @@
+"""
+Plans the same config over a range of settings, e.g. "how many days do 70 more 理智 a day save"
+
+    $ python sweep.py config.yaml --ap 240:330:10
+    $ python sweep.py config.yaml --money 30000:60000:5000 --book 10,20,30 --csv sweep.csv
+
+A range is `start:stop:step` (stop included), or a comma separated list.
+Several settings are swept over their grid (the last one changes the fastest).
+
+Only the daily recovery path changes between the steps, so the LP is assembled once,
+and each step starts from the optimal basis of the previous one.
+"""
+import argparse
+import copy
+import csv
+import itertools
+import sys
+import time
+
+import numpy as np
+import scipy.sparse
+
+import items
+from planner import Planner
+from session import BasisError, WarmBasis
+
+# option: (config key, description)
+SETTINGS = {
+    'ap': ('ap_recovery_per_day', '每日回体'),
+    'money': ('infra_money_per_day', '每日基建龙门币'),
+    'book': ('infra_midexpbook_per_day', '每日基建中级作战录像'),
+}
+
+def parse_range(spec):
+    """
+    @return: list of values, from `start:stop:step` (stop included) or `v1,v2,...`
+    """
+    if ':' in spec:
+        start, stop, step = (float(v) for v in spec.split(':'))
+        if step <= 0:
+            raise ValueError(f"Step of {spec} should be positive")
+        n = int(np.floor((stop - start) / step + 1e-9)) + 1
+        return [start + step * ind for ind in range(n)]
+    return [float(v) for v in spec.split(',')]
+
+class Sweep:
+    def __init__(self, planner: Planner):
+        self.planner = planner
+
+        args = planner.get_linprog_args()
+        args.pop('path_return')
+        self._args = args
+        self._A = args['A_ub'].tocsc()
+
+        # the daily recovery path of the config, in place of the default one, see `PlannerConfig.get_tradepaths`
+        self._col = next(
+            ind for ind, path in enumerate(planner._all_paths) if path.tag == items.DAILY_RECOVERY_TAG
+        )
+
+        all_items = planner._all_items
+        self._day_row = all_items.to_id('1d')
+
+        self._basis = None
+        self.n_warm_solves = 0
+        self.n_cold_solves = 0
+
+    def _get_matrix(self, settings):
+        """
+        @return: `A_ub` with the column of the daily recovery path built from `settings`
+        """
+        config = copy.copy(self.planner.config)
+        config.update(settings)
+        path = config.get_tradepath_for_daily_recovery()
+
+        # the same `1d` a run, so its entries in the rows of the daily caps stay
+        col = scipy.sparse.csc_matrix(-self.planner.build_path_return_matrix([path]))
+        limits = self._A[col.shape[0]:, self._col]
+        col = scipy.sparse.vstack([col, limits], format='csc')
+        return scipy.sparse.hstack([self._A[:, :self._col], col, self._A[:, self._col + 1:]], format='csc')
+
+    def _solve_x(self, A_ub):
+        args = dict(self._args, A_ub=A_ub)
+
+        if self._basis is not None:
+            try:
+                basis = self._basis.refactor(A_ub)
+                x = basis.resolve(args['b_ub'])
+            except BasisError:
+                x = None
+            if x is not None:
+                self._basis = basis
+                self.n_warm_solves += 1
+                return x, A_ub
+
+        x = self.planner._linear_programming(**args)
+        self.n_cold_solves += 1
+        try:
+            self._basis = WarmBasis(x=x, **args) if x is not None else None
+        except BasisError:
+            self._basis = None
+        return x, A_ub
+
+    def solve(self, settings):
+        """
+        @param: settings: {config key: value} of the daily recovery
+        @return: days needed, nan if infeasible
+        """
+        x, A_ub = self._solve_x(self._get_matrix(settings))
+        if x is None:
+            return np.nan
+        return float((A_ub[self._day_row] @ x)[0])
+
+    def run(self, grid):
+        """
+        @param: grid: {config key: list of values}
+        @yield: (settings, days)
+        """
+        keys = list(grid)
+        for values in itertools.product(*grid.values()):
+            settings = dict(zip(keys, values))
+            yield settings, self.solve(settings)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sweep the daily recovery settings of a config")
+    parser.add_argument('config', nargs='?', default='config.yaml')
+    for option, (_, desc) in SETTINGS.items():
+        parser.add_argument(f"--{option}", help=f"range of {desc}, e.g. 240:330:10 or 240,300")
+    parser.add_argument('--csv', help="also write the results to this csv file")
+    args = parser.parse_args(argv)
+
+    grid = {
+        SETTINGS[option][0]: parse_range(getattr(args, option))
+        for option in SETTINGS if getattr(args, option)
+    }
+    if not grid:
+        parser.error("nothing to sweep, give at least one of " + ', '.join(f"--{o}" for o in SETTINGS))
+
+    beg = time.perf_counter()
+    sweep = Sweep(Planner().set_to_config(args.config))
+    results = list(sweep.run(grid))
+    elapsed = time.perf_counter() - beg
+
+    names = {key: desc for key, desc in SETTINGS.values()}
+    base_days = results[0][1]
+    print('  '.join(f"{names[key]:>8}" for key in grid) + "      天数     差值")
+    for settings, days in results:
+        desc = '  '.join(f"{settings[key]:>8g}" for key in grid)
+        print(f"{desc}  {days:8.2f} {days - base_days:+8.2f}")
+    print(
+        f"{len(results)} 组设置，{sweep.n_warm_solves} 组由上一组的最优基直接得出，"
+        f"{sweep.n_cold_solves} 组重新求解，共 {elapsed:.2f}s"
+    )
+
+    if args.csv:
+        with open(args.csv, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow([*grid, 'days'])
+            for settings, days in results:
+                writer.writerow([*settings.values(), days])
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,47 @@
+import datetime
+import os
+
+import numpy as np
+import pytest
+
+from items import RESET_DAYS
+from planner import Planner
+from schedule import Schedule, get_windows
+from util import ROOT
+
+CONFIG_PATH = os.path.join(ROOT, 'config.example.yaml')
+# the day before a month starts, so that the first window of the monthly shops is a single day
+START = datetime.date(2026, 11, 30)
+
+@pytest.fixture(scope='module')
+def schedule():
+    return Schedule(Planner().set_to_config(CONFIG_PATH), 1, START)
+
+@pytest.fixture(scope='module')
+def x(schedule):
+    x = schedule.run(120)
+    assert x is not None
+    return x
+
+def test_first_window_is_prorated():
+    assert get_windows(3, 1, START, 'month') == [([0], 1 / 30), ([1, 2], 1)]
+    assert get_windows(3, 1, START, 'month', full_first_reset=True) == [([0], 1), ([1, 2], 1)]
+    # a Monday is a reset of its own
+    assert get_windows(8, 1, datetime.date(2026, 11, 30), 'week') == [([0, 1, 2, 3, 4, 5, 6], 1), ([7], 1)]
+    assert get_windows(2, 1, START, 'day') == [([0], 1), ([1], 1)]
+
+def test_fewest_periods(schedule, x):
+    assert schedule.solve(len(x)) is not None
+    assert schedule.solve(len(x) - 1) is None
+
+def test_caps_per_window(schedule, x):
+    n_capped = 0
+    for p, path in enumerate(schedule.paths):
+        if path.max_cnt_per_day:
+            cap = path.max_cnt_per_day * RESET_DAYS[path.reset]
+            for periods, n_resets in get_windows(len(x), 1, START, path.reset):
+                assert x[periods, p].sum() <= cap * n_resets + 1e-6 * (1 + cap)
+            n_capped += 1
+        if path.max_cnt:
+            assert x[:, p].sum() <= path.max_cnt + 1e-6 * (1 + path.max_cnt)
+    assert n_capped
@@ -0,0 +1,53 @@
+import asyncio
+import json
+import os
+
+from service import PlanningService
+from util import ROOT
+
+CONFIG_PATH = os.path.join(ROOT, 'config.example.yaml')
+
+async def request(port, method, path, body=b''):
+    """
+    @return: (status, body)
+    """
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nContent-Length: {len(body)}\r\n\r\n".encode('latin-1') + body
+    )
+    await writer.drain()
+
+    # by the length rather than up to the end: the workers forked on the first /plan
+    # inherit the socket of this very process, so it is not closed on the other end
+    status = int((await reader.readline()).split(b' ', 2)[1])
+    headers = {}
+    while True:
+        line = (await reader.readline()).decode('latin-1').strip()
+        if not line:
+            break
+        name, _, value = line.partition(':')
+        headers[name.strip().lower()] = value.strip()
+    data = await reader.readexactly(int(headers['content-length']))
+    writer.close()
+    return status, data.decode('utf-8')
+
+def test_service():
+    with open(CONFIG_PATH, 'rb') as f:
+        config = f.read()
+
+    async def run():
+        service = await PlanningService(n_workers=1).start('127.0.0.1', 0)
+        try:
+            assert await request(service.port, 'GET', '/healthz') == (200, "ok\n")
+
+            status, body = await request(service.port, 'POST', '/plan?format=json', config)
+            assert status == 200
+            assert json.loads(body)['path_cnt']
+
+            status, body = await request(service.port, 'POST', '/plan', b"- [unclosed")
+            assert status == 400
+            assert body.startswith("Invalid config")
+        finally:
+            await service.close()
+
+    asyncio.run(run())
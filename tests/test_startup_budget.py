@@ -0,0 +1,9 @@
+from startup_budget import HEAVY_MODULES, IMPORT_BUDGET_US, run_with_importtime
+
+def test_help_import_time():
+    run_with_importtime(['planner.py', '--help']) # warm up the bytecode
+    runs = [run_with_importtime(['planner.py', '--help']) for _ in range(3)]
+
+    assert all(code == 0 for code, _, _, _ in runs)
+    assert min(script_us for _, _, _, script_us in runs) <= IMPORT_BUDGET_US
+    assert not [module for module in runs[0][2] if module.split('.')[0] in HEAVY_MODULES]
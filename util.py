@@ -1,7 +1,82 @@
+import hashlib
+import importlib
+import json
 import os
 
 ROOT = os.path.dirname(os.path.realpath(__file__))
 
+# content digests of the files hashed before, keyed by their path and `get_fingerprint`
+DIGEST_INDEX_PATH = os.path.join(ROOT, 'cache', 'digests.json')
+
+_digests = None
+
+def get_fingerprint(path):
+    """
+    A cheap stand-in for the content of a file, nothing is read: its size, modification and change times.
+    The change time can not be set back (unlike the modification time, e.g. by `cp -p`),
+    so a rewrite always shows.
+    @return: (size, mtime_ns, ctime_ns) of the file `path` links to
+    @raise: OSError if there is none
+    """
+    st = os.stat(path)
+    return st.st_size, st.st_mtime_ns, st.st_ctime_ns
+
+def get_digest(path):
+    """
+    Content hash of a file, only read again when its `get_fingerprint` changes:
+    the digests are kept in `DIGEST_INDEX_PATH`
+    @return: sha1 hex digest of the file `path` links to
+    @raise: OSError if there is none
+    """
+    global _digests
+    if _digests is None:
+        try:
+            with open(DIGEST_INDEX_PATH, 'r') as f:
+                _digests = json.load(f)
+        except (OSError, ValueError):
+            _digests = {}
+
+    real_path = os.path.realpath(path)
+    fingerprint = list(get_fingerprint(real_path))
+    entry = _digests.get(real_path)
+    if entry is not None and entry[0] == fingerprint:
+        return entry[1]
+
+    sha = hashlib.sha1()
+    with open(real_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha.update(chunk)
+    if list(get_fingerprint(real_path)) != fingerprint: # changed while read, hashed again next time
+        return sha.hexdigest()
+
+    _digests[real_path] = [fingerprint, sha.hexdigest()]
+    try:
+        os.makedirs(os.path.dirname(DIGEST_INDEX_PATH), exist_ok=True)
+        tmp_path = f"{DIGEST_INDEX_PATH}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(_digests, f)
+        os.replace(tmp_path, DIGEST_INDEX_PATH)
+    except OSError:
+        pass # e.g. read-only checkout, it is hashed again next time
+    return sha.hexdigest()
+
+class lazy_import:
+    """
+    A stand-in for module `name`, which is only imported on first attribute access
+        np = lazy_import('numpy')
+    """
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+    def __repr__(self):
+        return f"<lazy module {repr(self._name)}>"
+
 def LeaderBoard(capacity: int = 3):
     import heapq
     class _lb(list): pass